@@ -95,6 +95,115 @@ MEDIA_ROOT = BASE_DIR / 'media'
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 
+# LLM providers (one pooled client per provider and process); timeouts in seconds
+LLM_GEMINI_MODEL = os.getenv('LLM_GEMINI_MODEL', 'gemini-2.5-pro')
+LLM_OPENAI_MODEL = os.getenv('LLM_OPENAI_MODEL', 'gpt-4o')
+LLM_GEMINI_TIMEOUT = float(os.getenv('LLM_GEMINI_TIMEOUT', '120'))
+LLM_OPENAI_TIMEOUT = float(os.getenv('LLM_OPENAI_TIMEOUT', '60'))
+# Max concurrent requests per provider and process (background drafting fans out up to this)
+LLM_GEMINI_MAX_CONCURRENCY = int(os.getenv('LLM_GEMINI_MAX_CONCURRENCY', '8'))
+LLM_OPENAI_MAX_CONCURRENCY = int(os.getenv('LLM_OPENAI_MAX_CONCURRENCY', '4'))
+# LLM resilience: overall deadline per call_llm (s), retries with jittered backoff,
+# circuit breaker (consecutive failures → skip provider for the cooldown), hedging at p95
+LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', '240'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '1.0'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '3'))
+LLM_BREAKER_COOLDOWN = int(os.getenv('LLM_BREAKER_COOLDOWN', '60'))
+LLM_HEDGE = os.getenv('LLM_HEDGE', 'False') == 'True'
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '16'))
+# Opt-in LLM response cache: per-process LRU in front of LLMResponseCacheEntry rows
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True') == 'True'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))       # seconds
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', '256'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '20000'))
+# Optional provider-side context caching of a paper's text across outline/writer calls
+# (Gemini cached contents; other providers get the usual context inline)
+LLM_CONTEXT_CACHE_ENABLED = os.getenv('LLM_CONTEXT_CACHE_ENABLED', 'False') == 'True'
+LLM_CONTEXT_CACHE_TTL = int(os.getenv('LLM_CONTEXT_CACHE_TTL', '3600'))
+LLM_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('LLM_CONTEXT_CACHE_MIN_TOKENS', '4096'))
+LLM_CONTEXT_CACHE_MAX_TOKENS = int(os.getenv('LLM_CONTEXT_CACHE_MAX_TOKENS', '900000'))
+# Register the in-process "stub" LLM provider (tests / offline development)
+LLM_STUB_PROVIDER = os.getenv('LLM_STUB_PROVIDER', 'False') == 'True'
+
+# PDF extraction (process pool; 1 = extract in the calling process)
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(os.cpu_count() or 1, 4))))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv('PDF_EXTRACT_PAGES_PER_TASK', '16'))
+
+# Incremental ingestion: pages committed & indexed per batch
+INGEST_BATCH_PAGES = int(os.getenv('INGEST_BATCH_PAGES', '8'))
+# Page batches buffered between the extract → chunk → embed → index stages
+INGEST_QUEUE_DEPTH = int(os.getenv('INGEST_QUEUE_DEPTH', '4'))
+
+# Background job queue (`manage.py run_ingest_workers`)
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', '2'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_BACKOFF = int(os.getenv('JOB_RETRY_BACKOFF', '30'))          # seconds, doubled per attempt
+JOB_HEARTBEAT_INTERVAL = int(os.getenv('JOB_HEARTBEAT_INTERVAL', '15'))
+JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', '300'))             # no heartbeat → re-queue
+
+# Parse-progress server-sent events
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', '1.0'))
+SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', '60'))    # clients reconnect after this
+
+# Per-process cache of loaded FAISS indexes (LRU, approximate memory budget)
+INDEX_CACHE_MAX_MB = int(os.getenv('INDEX_CACHE_MAX_MB', '512'))
+INDEX_CACHE_MAX_ENTRIES = int(os.getenv('INDEX_CACHE_MAX_ENTRIES', '256'))
+
+# Prepared prompt parts (table markdown, downscaled images) kept in memory per process
+PROMPT_PART_CACHE_MB = int(os.getenv('PROMPT_PART_CACHE_MB', '64'))
+PROMPT_IMAGE_MAX_SIDE = int(os.getenv('PROMPT_IMAGE_MAX_SIDE', '1024'))
+
+# Index type selection (flat → HNSW → IVF-PQ by size); tune with `manage.py benchmark_index`
+INDEX_FLAT_MAX_VECTORS = int(os.getenv('INDEX_FLAT_MAX_VECTORS', '20000'))
+INDEX_MEMORY_BUDGET_MB = int(os.getenv('INDEX_MEMORY_BUDGET_MB', '256'))
+INDEX_HNSW_M = int(os.getenv('INDEX_HNSW_M', '32'))
+INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv('INDEX_HNSW_EF_CONSTRUCTION', '200'))
+INDEX_HNSW_EF_SEARCH = int(os.getenv('INDEX_HNSW_EF_SEARCH', '64'))
+INDEX_IVF_NPROBE = int(os.getenv('INDEX_IVF_NPROBE', '16'))
+
+# Cross-document corpus index (append-only shards, sealed and packed when full)
+CORPUS_SHARD_MAX_VECTORS = int(os.getenv('CORPUS_SHARD_MAX_VECTORS', '200000'))
+CORPUS_SEARCH_THREADS = int(os.getenv('CORPUS_SEARCH_THREADS', '4'))
+
+# Background drafting of all sections once an outline is approved ("draft" jobs),
+# capped by the provider's LLM_*_MAX_CONCURRENCY; the API waits up to
+# DRAFT_WAIT_TIMEOUT seconds for a section the job has not finished
+DRAFT_PARALLEL_SECTIONS = int(os.getenv('DRAFT_PARALLEL_SECTIONS', '6'))
+DRAFT_WAIT_TIMEOUT = int(os.getenv('DRAFT_WAIT_TIMEOUT', '60'))
+
+# Map-reduce digest of long papers (built by a "digest" job after ingestion) used by
+# outline/description prompts: chunk summaries → section summaries → document summary
+DIGEST_MIN_TOKENS = int(os.getenv('DIGEST_MIN_TOKENS', '12000'))       # shorter papers are sent whole
+DIGEST_CHUNK_TOKENS = int(os.getenv('DIGEST_CHUNK_TOKENS', '3000'))
+DIGEST_GROUP_SIZE = int(os.getenv('DIGEST_GROUP_SIZE', '6'))            # chunk summaries per section
+DIGEST_PARALLEL = int(os.getenv('DIGEST_PARALLEL', '6'))
+
+# Prompt context for drafting: whole text for short papers, otherwise the top RAG
+# chunks for each section within a tiktoken budget
+CONTEXT_FULL_TEXT_MAX_TOKENS = int(os.getenv('CONTEXT_FULL_TEXT_MAX_TOKENS', '12000'))
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '6000'))
+CONTEXT_MAX_CHUNKS = int(os.getenv('CONTEXT_MAX_CHUNKS', '40'))
+
+# CLIP embedding client (batched, pooled, bounded concurrency)
+EMBED_TEXT_BATCH_SIZE = int(os.getenv('EMBED_TEXT_BATCH_SIZE', '64'))
+EMBED_IMAGE_BATCH_SIZE = int(os.getenv('EMBED_IMAGE_BATCH_SIZE', '16'))
+EMBED_MAX_IN_FLIGHT = int(os.getenv('EMBED_MAX_IN_FLIGHT', '4'))
+EMBED_TIMEOUT = float(os.getenv('EMBED_TIMEOUT', '30'))
+EMBED_MAX_RETRIES = int(os.getenv('EMBED_MAX_RETRIES', '3'))
+# Chat retrieval: max wait for the query embedding before answering from BM25 alone,
+# and how long to skip embedding after it failed
+RETRIEVE_EMBED_TIMEOUT = float(os.getenv('RETRIEVE_EMBED_TIMEOUT', '2.0'))
+EMBED_DOWN_COOLDOWN = int(os.getenv('EMBED_DOWN_COOLDOWN', '30'))
+# Persistent embedding cache keyed by (model, content hash); change EMBED_MODEL_ID when the model changes
+EMBED_MODEL_ID = os.getenv('EMBED_MODEL_ID') or None
+EMBED_CACHE_ENABLED = os.getenv('EMBED_CACHE_ENABLED', 'True') == 'True'
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv('EMBED_CACHE_MAX_ENTRIES', '100000'))
+
+# OCR fallback (bounded tesseract pool; DPI chosen from page size)
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(os.cpu_count() or 1)))
+OCR_TARGET_PIXELS = int(os.getenv('OCR_TARGET_PIXELS', '8500000'))
+
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 
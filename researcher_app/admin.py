@@ -2,8 +2,9 @@
 
 from django.contrib import admin
 from .models import (
-    UploadedPDF, ExtractedContent, BlogOutline,
-    BlogDraft, ChatMessage, NormalizationRule
+    UploadedPDF, ExtractedContent, ExtractedPage, DocumentDigest, BackgroundJob,
+    EmbeddingCacheEntry, LLMResponseCacheEntry, LLMContextCache, BlogOutline, BlogDraft,
+    ChatMessage, NormalizationRule
 )
 
 
@@ -21,6 +22,45 @@ class ExtractedContentAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
 
 
+@admin.register(ExtractedPage)
+class ExtractedPageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'pdf', 'page_number', 'is_indexed', 'created_at')
+    list_filter  = ('is_indexed',)
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'pdf', 'status', 'stage', 'attempts', 'created_at', 'finished_at')
+    list_filter  = ('kind', 'status')
+    readonly_fields = ('progress', 'timings', 'error', 'locked_by', 'heartbeat_at')
+
+
+@admin.register(DocumentDigest)
+class DocumentDigestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'content', 'version', 'source_tokens', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(EmbeddingCacheEntry)
+class EmbeddingCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('key', 'model', 'hits', 'created_at', 'last_used_at')
+    search_fields = ('key', 'model')
+    exclude = ('vector',)
+
+
+@admin.register(LLMResponseCacheEntry)
+class LLMResponseCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('key', 'provider', 'model', 'hits', 'created_at', 'expires_at')
+    list_filter = ('provider',)
+    search_fields = ('key', 'model')
+
+
+@admin.register(LLMContextCache)
+class LLMContextCacheAdmin(admin.ModelAdmin):
+    list_display = ('name', 'content', 'provider', 'model', 'version', 'tokens', 'expires_at')
+    list_filter = ('provider',)
+
+
 @admin.register(BlogOutline)
 class BlogOutlineAdmin(admin.ModelAdmin):
     list_display = ('id', 'pdf', 'status', 'created_at')
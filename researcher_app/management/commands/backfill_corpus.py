@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from researcher_app.models import UploadedPDF
+from researcher_app.services import corpus, jobs
+
+
+class Command(BaseCommand):
+    help = 'Queues corpus-index jobs for ingested PDFs that are not in the corpus index yet'
+
+    def handle(self, *args, **kwargs):
+        present = set(corpus.documents())
+        missing = (
+            UploadedPDF.objects
+            .filter(content__isnull=False, duplicate_of__isnull=True)
+            .exclude(id__in=present)
+            .exclude(jobs__kind='corpus', jobs__status__in=['queued', 'running'])
+            .distinct()
+        )
+        count = 0
+        for pdf in missing:
+            jobs.enqueue('corpus', pdf=pdf)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'✅ Queued {count} PDF(s) for the corpus index'))
@@ -0,0 +1,111 @@
+from django.core.management.base import BaseCommand, CommandError
+from researcher_app.services import index_factory
+import time
+import numpy as np
+
+IVFPQ_MIN_VECTORS = 256
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks flat / HNSW / IVF-PQ indexes on a PDF\'s vectors or a synthetic '
+        'corpus: recall@k against exact search, p50/p99 latency, build time and size'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdf-id', type=int,
+            help='Use the vectors of this PDF\'s persisted index'
+        )
+        parser.add_argument(
+            '--synthetic', type=int, default=50_000,
+            help='Number of clustered random vectors when no --pdf-id is given'
+        )
+        parser.add_argument('--dim', type=int, default=512, help='Dimension of synthetic vectors')
+        parser.add_argument('--queries', type=int, default=200, help='Held-out query vectors')
+        parser.add_argument('--k', type=int, default=10, help='Neighbours per query (recall@k)')
+        parser.add_argument('--hnsw-m', default='16,32', help='Comma-separated HNSW M values')
+        parser.add_argument('--ef-search', default='32,64,128', help='Comma-separated HNSW efSearch values')
+        parser.add_argument('--nprobe', default='4,16,64', help='Comma-separated IVF nprobe values')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        vectors = self._load_vectors(options)
+        n_queries = min(options['queries'], len(vectors) // 10)
+        if n_queries < 1:
+            raise CommandError(f'Need at least 10 vectors to benchmark, got {len(vectors)}')
+
+        # hold the queries out of the indexed set
+        rng = np.random.default_rng(0)
+        perm = rng.permutation(len(vectors))
+        queries, base = vectors[perm[:n_queries]], vectors[perm[n_queries:]]
+        n, d = base.shape
+
+        self.stdout.write(f'📐 {n} vectors × {d} dims, {n_queries} queries, k={k}')
+        self.stdout.write(f'🤖 choose_params would pick: {index_factory.choose_params(n, d)}')
+
+        flat = index_factory.build(base, index_factory.FLAT)
+        _, truth = flat.search(queries, k)
+
+        candidates = [dict(index_factory.FLAT)]
+        for m in _ints(options['hnsw_m']):
+            for ef in _ints(options['ef_search']):
+                candidates.append({"type": "hnsw", "M": m, "ef_construction": 200, "ef_search": ef})
+        # 8-bit PQ trains 256 centroids per sub-quantizer, so it needs at least that many points
+        if n >= IVFPQ_MIN_VECTORS:
+            for nprobe in _ints(options['nprobe']):
+                candidates.append(index_factory.ivfpq_params(n, d, nprobe))
+        else:
+            self.stdout.write(f'⏭️  Skipping IVF-PQ: needs at least {IVFPQ_MIN_VECTORS} base vectors, got {n}')
+
+        self.stdout.write(
+            f'{"index":<48} {"build s":>8} {"MB":>8} {"recall@k":>9} {"p50 ms":>8} {"p99 ms":>8}'
+        )
+        built = {}
+        for params in candidates:
+            # search-time knobs do not need a rebuild
+            build_key = tuple(sorted((key, v) for key, v in params.items()
+                                     if key not in ("ef_search", "nprobe")))
+            if build_key not in built:
+                t0 = time.perf_counter()
+                index = index_factory.build(base, params)
+                built[build_key] = (index, time.perf_counter() - t0)
+            index, build_s = built[build_key]
+
+            latencies, found = [], []
+            for q in queries:
+                t = time.perf_counter()
+                _, ids = index_factory.search(index, params, q[None, :], k)
+                latencies.append((time.perf_counter() - t) * 1000)
+                found.append(ids[0])
+
+            recall = np.mean([
+                len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)
+            ])
+            size_mb = index_factory.estimate_bytes(params, n, d) / 1024 / 1024
+            label = ", ".join(f"{key}={v}" for key, v in params.items())
+            self.stdout.write(
+                f'{label:<48} {build_s:>8.2f} {size_mb:>8.1f} {recall:>9.3f} '
+                f'{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f}'
+            )
+
+    def _load_vectors(self, options):
+        if options['pdf_id'] is not None:
+            from researcher_app.services.rag_service import RAGService
+
+            svc = RAGService(options['pdf_id'])
+            if not svc.index_exists():
+                raise CommandError(f'PDF {options["pdf_id"]} has no persisted index')
+            svc._load_index(cached=False)
+            return np.ascontiguousarray(index_factory.reconstruct_all(svc.index), dtype='float32')
+
+        # gaussian clusters resemble real embedding distributions better than uniform noise
+        n, d = options['synthetic'], options['dim']
+        rng = np.random.default_rng(42)
+        centers = rng.normal(size=(max(1, n // 500), d)).astype('float32')
+        labels = rng.integers(0, len(centers), size=n)
+        return (centers[labels] + 0.3 * rng.normal(size=(n, d))).astype('float32')
+
+
+def _ints(csv):
+    return [int(x) for x in csv.split(',') if x.strip()]
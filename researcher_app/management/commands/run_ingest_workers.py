@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import close_old_connections
+from researcher_app.services import jobs
+import os
+import signal
+import socket
+import threading
+
+
+class Command(BaseCommand):
+    help = 'Runs background workers that claim and process queued jobs (ingestion, corpus, drafting)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=getattr(settings, 'JOB_WORKER_CONCURRENCY', 2),
+            help='Number of jobs processed at the same time'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds to wait between polls when the queue is empty'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs'
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        stop = threading.Event()
+
+        def _shutdown(signum, frame):
+            self.stdout.write(self.style.WARNING('⏹️ Stopping after the current jobs finish…'))
+            stop.set()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+
+        jobs.requeue_stale()
+
+        workers = [
+            threading.Thread(
+                target=jobs.work_loop,
+                args=(f"{prefix}:{i}", stop, options['poll_interval'], options['burst']),
+                name=f"ingest-worker-{i}",
+            )
+            for i in range(concurrency)
+        ]
+        for t in workers:
+            t.start()
+        self.stdout.write(self.style.SUCCESS(f'✅ Started {concurrency} ingest worker(s) as {prefix}'))
+
+        interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 15)
+        while True:
+            alive = [t for t in workers if t.is_alive()]
+            if not alive:
+                break
+            try:
+                jobs.heartbeat(prefix)
+                jobs.requeue_stale()
+            except Exception as e:
+                self.stderr.write(f'⚠️ Heartbeat failed: {e}')
+            finally:
+                close_old_connections()
+            alive[0].join(timeout=interval)
+
+        self.stdout.write(self.style.SUCCESS('✅ Ingest workers stopped.'))
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0007_create_feedback_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedpdf',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA-256 of the uploaded bytes', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadedpdf',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, help_text='Earlier upload with identical bytes whose extraction and index are reused', on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='researcher_app.uploadedpdf'),
+        ),
+    ]
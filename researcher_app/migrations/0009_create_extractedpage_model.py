@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0008_add_sha256_to_uploadedpdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedpdf',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True, help_text='Number of pages, known once ingestion starts'),
+        ),
+        migrations.CreateModel(
+            name='ExtractedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField(help_text='1-based page number')),
+                ('text', models.TextField(blank=True, default='')),
+                ('is_indexed', models.BooleanField(default=False, help_text="True once this page's chunks are in the FAISS index")),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('pdf', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='pages',
+                    to='researcher_app.uploadedpdf'
+                )),
+            ],
+            options={
+                'ordering': ['page_number'],
+                'unique_together': {('pdf', 'page_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0011_create_embeddingcacheentry_model'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingest PDF'), ('corpus', 'Add PDF to corpus index')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0012_alter_backgroundjob_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedcontent',
+            name='version',
+            field=models.PositiveIntegerField(default=1, help_text='Bumped on every re-extraction; the vector index records the version it reflects'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0013_add_version_to_extractedcontent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedcontent',
+            name='catalog',
+            field=models.JSONField(blank=True, default=dict, help_text='Figure/table captions by number: {"figure": {"3": {...}}, "table": {...}}'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0015_create_llmresponsecacheentry_model'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingest PDF'), ('corpus', 'Add PDF to corpus index'), ('draft', 'Draft blog sections')], max_length=20),
+        ),
+    ]
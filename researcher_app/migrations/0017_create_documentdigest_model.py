@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0016_alter_backgroundjob_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(help_text='ExtractedContent.version this digest summarizes')),
+                ('summary', models.TextField(help_text='Document-level summary')),
+                ('sections', models.JSONField(default=list, help_text='[{"pages": [first, last], "summary": "..."}]')),
+                ('chunks', models.JSONField(default=list, help_text='Per-chunk summaries, same shape as sections')),
+                ('source_tokens', models.PositiveIntegerField(default=0, help_text='Tokens in the summarized text')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='digest', to='researcher_app.extractedcontent')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingest PDF'), ('corpus', 'Add PDF to corpus index'), ('draft', 'Draft blog sections'), ('digest', 'Summarize PDF for prompts')], max_length=20),
+        ),
+    ]
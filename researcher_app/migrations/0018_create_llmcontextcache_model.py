@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('researcher_app', '0017_create_documentdigest_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMContextCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('model', models.CharField(max_length=100)),
+                ('name', models.CharField(help_text="Provider's cached content name", max_length=255)),
+                ('version', models.PositiveIntegerField(help_text='ExtractedContent.version of the cached text')),
+                ('tokens', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_caches', to='researcher_app.extractedcontent')),
+            ],
+            options={
+                'unique_together': {('content', 'provider', 'model')},
+            },
+        ),
+    ]
@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class UploadedPDF(models.Model):
@@ -10,10 +11,38 @@ class UploadedPDF(models.Model):
     """
     file = models.FileField(upload_to='uploads/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text="SHA-256 of the uploaded bytes"
+    )
+    duplicate_of = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='duplicates',
+        help_text="Earlier upload with identical bytes whose extraction and index are reused"
+    )
+
+    page_count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Number of pages, known once ingestion starts"
+    )
 
     def __str__(self):
         return self.file.name
 
+    @property
+    def source_id(self):
+        """
+        Id of the upload that owns the extraction artifacts and FAISS index.
+        """
+        return self.duplicate_of_id or self.id
+
 
 class ExtractedContent(models.Model):
     """
@@ -23,12 +52,169 @@ class ExtractedContent(models.Model):
     text = models.TextField()
     images = models.JSONField(default=list)  # list of image paths/URLs
     tables = models.JSONField(default=list)  # list of table paths/URLs
+    catalog = models.JSONField(
+        default=dict, blank=True,
+        help_text='Figure/table captions by number: {"figure": {"3": {...}}, "table": {...}}'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        help_text="Bumped on every re-extraction; the vector index records the version it reflects"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Extracted content for {self.pdf.file.name}"
 
 
+class DocumentDigest(models.Model):
+    """
+    Hierarchical summary of a long paper, built once after ingestion
+    (map: chunk summaries → reduce: section summaries → document summary)
+    and sent to outline/description prompts instead of the raw text.
+    """
+    content = models.OneToOneField(ExtractedContent, on_delete=models.CASCADE, related_name='digest')
+    version = models.PositiveIntegerField(help_text="ExtractedContent.version this digest summarizes")
+    summary = models.TextField(help_text="Document-level summary")
+    sections = models.JSONField(default=list, help_text='[{"pages": [first, last], "summary": "..."}]')
+    chunks = models.JSONField(default=list, help_text='Per-chunk summaries, same shape as sections')
+    source_tokens = models.PositiveIntegerField(default=0, help_text="Tokens in the summarized text")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Digest of {self.content.pdf.file.name} (v{self.version})"
+
+
+class ExtractedPage(models.Model):
+    """
+    Stores the text of a single PDF page as soon as it has been extracted,
+    so retrieval can start before the whole document is done.
+    """
+    pdf = models.ForeignKey(UploadedPDF, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField(help_text="1-based page number")
+    text = models.TextField(blank=True, default='')
+    is_indexed = models.BooleanField(default=False,
+                                     help_text="True once this page's chunks are in the FAISS index")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['page_number']
+        unique_together = [('pdf', 'page_number')]
+
+    def __str__(self):
+        return f"Page {self.page_number} of {self.pdf.file.name}"
+
+
+class BackgroundJob(models.Model):
+    """
+    Durable queue entry for work that runs outside the web workers
+    (see `manage.py run_ingest_workers`).
+    """
+    KIND_CHOICES = [
+        ('ingest', 'Ingest PDF'),
+        ('corpus', 'Add PDF to corpus index'),
+        ('draft',  'Draft blog sections'),
+        ('digest', 'Summarize PDF for prompts'),
+    ]
+    STATUS_CHOICES = [
+        ('queued',    'Queued'),
+        ('running',   'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed',    'Failed'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    pdf = models.ForeignKey(
+        UploadedPDF,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='jobs'
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    stage = models.CharField(max_length=50, blank=True, default='',
+                             help_text="Current pipeline stage while running")
+    progress = models.JSONField(default=dict, blank=True,
+                                help_text="Counters reported by the running job (pages, chunks, …)")
+    timings = models.JSONField(default=dict, blank=True,
+                               help_text="Seconds spent queued and in each stage")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    error = models.TextField(blank=True, default='')
+    locked_by = models.CharField(max_length=100, blank=True, default='',
+                                 help_text="Worker currently running this job")
+    run_after = models.DateTimeField(default=timezone.now,
+                                     help_text="Not claimed before this time (retry backoff)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')]
+
+    def __str__(self):
+        return f"Job #{self.id} {self.kind} ({self.status})"
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    Persistent embedding cache keyed by (embedding model, content hash), so
+    re-indexing only pays for content the endpoint has never seen.
+    """
+    key = models.CharField(max_length=64, unique=True,
+                           help_text="SHA-256 of model id, input kind and content")
+    model = models.CharField(max_length=255, help_text="Embedding endpoint/model id")
+    vector = models.BinaryField(help_text="float32 vector bytes")
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Embedding {self.key[:12]}… ({self.model})"
+
+
+class LLMResponseCacheEntry(models.Model):
+    """
+    Persistent tier of the LLM response cache (see api_handler.ResponseCache),
+    keyed by provider, model, parameters and prompt hash.
+    """
+    key = models.CharField(max_length=64, unique=True,
+                           help_text="SHA-256 of provider, model, parameters and prompt")
+    provider = models.CharField(max_length=20, help_text="Provider that produced the response")
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"LLM response {self.key[:12]}… ({self.provider}/{self.model})"
+
+
+class LLMContextCache(models.Model):
+    """
+    A provider-side cached context holding a document's text (see
+    context_cache.ContextCacheManager), shared by all workers.
+    """
+    content = models.ForeignKey(ExtractedContent, on_delete=models.CASCADE, related_name='llm_caches')
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    name = models.CharField(max_length=255, help_text="Provider's cached content name")
+    version = models.PositiveIntegerField(help_text="ExtractedContent.version of the cached text")
+    tokens = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = [('content', 'provider', 'model')]
+
+    def __str__(self):
+        return f"{self.provider}/{self.model} cache {self.name} (content {self.content_id})"
+
+
 class BlogOutline(models.Model):
     """
     Stores generated blog outlines linked to an UploadedPDF,
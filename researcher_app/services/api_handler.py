@@ -1,100 +1,746 @@
 # services/api_handler.py
 
 import os
-import openai
-from google import genai
+import json
+import time
+import base64
+import random
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import context_cache
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `threshold` failed calls in a row the circuit opens and the provider
+    is skipped for `cooldown` seconds; then one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit. A call that
+    says nothing about the provider's health (it never got a request slot, or
+    was rejected for its input) releases the trial instead. Thread-safe.
+    """
+    def __init__(self, threshold=3, cooldown=60):
+        self.threshold = max(1, threshold)
+        self.cooldown  = cooldown
+        self.failures  = 0
+        self.opened_at = None
+        self._trial    = False
+        self._lock     = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures, self.opened_at, self._trial = 0, None, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def release(self):
+        # no verdict: a later call may be the half-open trial
+        with self._lock:
+            self._trial = False
+
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if self._trial else "open"
+
+
+class Provider:
+    """
+    One LLM backend with a long-lived SDK client.
+
+    The client (and the HTTP connection pool inside it) is created on first
+    use and shared by every thread of the process; after a fork (gunicorn
+    workers, job workers) it is rebuilt, since sockets must not be shared
+    across processes. Requests time out after `timeout` seconds, and at most
+    `max_concurrency` run at once per process.
+
+    Each provider also keeps a circuit breaker and the latencies of its
+    recent successful calls (for hedging, see call_llm). Providers with
+    `supports_context_cache` can hold a shared prompt prefix server-side
+    (see context_cache).
+    """
+    name = None
+    supports_context_cache = False
+
+    def __init__(self, api_key, default_model, timeout=120, max_concurrency=8):
+        self.api_key         = api_key
+        self.default_model   = default_model
+        self.timeout         = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.slots           = threading.BoundedSemaphore(self.max_concurrency)
+        self.breaker         = CircuitBreaker(
+            threshold=getattr(settings, "LLM_BREAKER_FAILURES", 3),
+            cooldown=getattr(settings, "LLM_BREAKER_COOLDOWN", 60),
+        )
+        self._latencies      = deque(maxlen=200)
+        self._client_obj     = None
+        self._pid            = None
+        self._lock           = threading.Lock()
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def p95(self, min_samples=20):
+        """
+        95th percentile latency (seconds) of recent successful calls, or None
+        until `min_samples` calls have been seen.
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def stats(self):
+        p95 = self.p95()
+        return {
+            "available": self.available,
+            "circuit":   self.breaker.state(),
+            "failures":  self.breaker.failures,
+            "p95_s":     round(p95, 3) if p95 is not None else None,
+        }
+
+    def generate(self, contents, model=None, cached_content=None, **params):
+        """
+        Send `contents` (a prompt string, or a list of strings and inline
+        image parts) and return the response text. `cached_content` names a
+        cached context (from create_context_cache) that precedes the prompt.
+        """
+        raise NotImplementedError
+
+    def create_context_cache(self, model, text, ttl, display_name=None):
+        """
+        Store `text` as cached context for `model` for `ttl` seconds; returns its name.
+        """
+        raise NotImplementedError
+
+    def refresh_context_cache(self, name, ttl):
+        raise NotImplementedError
+
+    def delete_context_cache(self, name):
+        raise NotImplementedError
+
+    def _client(self):
+        if not self.available:
+            raise LLMError(f"{self.name} API key missing")
+        with self._lock:
+            if self._pid != os.getpid():
+                self._client_obj = self._make_client()
+                self._pid = os.getpid()
+            return self._client_obj
+
+    def _make_client(self):
+        raise NotImplementedError
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+    supports_context_cache = True
+
+    def generate(self, contents, model=None, cached_content=None, **params):
+        from google.genai import types
+
+        config = None
+        if params or cached_content:
+            config = types.GenerateContentConfig(
+                temperature=params.get("temperature"),
+                max_output_tokens=params.get("max_tokens"),
+                cached_content=cached_content,
+            )
+        resp = self._client().models.generate_content(
+            model=model or self.default_model,
+            contents=contents,
+            config=config,
+        )
+        return _gemini_text(resp)
+
+    def create_context_cache(self, model, text, ttl, display_name=None):
+        from google.genai import types
+
+        cache = self._client().caches.create(
+            model=model or self.default_model,
+            config=types.CreateCachedContentConfig(
+                contents=[_paper_prefix(text)],
+                display_name=display_name,
+                ttl=f"{int(ttl)}s",
+            ),
+        )
+        return cache.name
+
+    def refresh_context_cache(self, name, ttl):
+        from google.genai import types
+
+        self._client().caches.update(
+            name=name, config=types.UpdateCachedContentConfig(ttl=f"{int(ttl)}s")
+        )
+
+    def delete_context_cache(self, name):
+        self._client().caches.delete(name=name)
+
+    def _make_client(self):
+        from google import genai
+        from google.genai import types
+
+        return genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(timeout=int(self.timeout * 1000)),   # milliseconds
+        )
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def generate(self, contents, model=None, cached_content=None, **params):
+        response = self._client().chat.completions.create(
+            model=model or self.default_model,
+            messages=[{"role": "user", "content": _openai_content(contents)}],
+            max_tokens=params.get("max_tokens", 2048),
+            temperature=params.get("temperature", 0.7),
+        )
+        return response.choices[0].message.content or ""
+
+    def _make_client(self):
+        import openai
+
+        # retries are handled by call_llm
+        return openai.OpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+
+
+class StubProvider(Provider):
+    """
+    Local stand-in provider for tests and offline development, registered
+    as "stub" when LLM_STUB_PROVIDER is set. Answers instantly with a short
+    description of the request, records every call in `calls`, and keeps
+    cached contexts in memory.
+    """
+    name = "stub"
+    supports_context_cache = True
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("api_key", "stub")
+        kwargs.setdefault("default_model", "stub-1")
+        super().__init__(**kwargs)
+        self.calls  = []
+        self.caches = {}    # name -> (text, expires_at epoch)
+        self._cache_ids = 0
+
+    def generate(self, contents, model=None, cached_content=None, **params):
+        prompt = contents if isinstance(contents, str) else "".join(
+            c for c in contents if isinstance(c, str)
+        )
+        cached = ""
+        if cached_content is not None:
+            entry = self.caches.get(cached_content)
+            if entry is None or entry[1] <= time.time():
+                raise LLMError(f"stub: cached content {cached_content} not found")
+            cached = entry[0]
+        with self._lock:
+            self.calls.append({
+                "model": model or self.default_model, "prompt": prompt,
+                "cached_content": cached_content, "params": params,
+            })
+        return (f"[stub:{model or self.default_model}] {len(prompt)} prompt chars, "
+                f"{len(cached)} cached chars")
+
+    def create_context_cache(self, model, text, ttl, display_name=None):
+        with self._lock:
+            self._cache_ids += 1
+            name = f"cachedContents/stub-{self._cache_ids}"     # never reused, like real names
+            self.caches[name] = (_paper_prefix(text), time.time() + ttl)
+        return name
+
+    def refresh_context_cache(self, name, ttl):
+        with self._lock:
+            if name not in self.caches:
+                raise LLMError(f"stub: cached content {name} not found")
+            self.caches[name] = (self.caches[name][0], time.time() + ttl)
+
+    def delete_context_cache(self, name):
+        with self._lock:
+            self.caches.pop(name, None)
+
+    def _make_client(self):
+        return None
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider(
+        api_key=getattr(settings, "GEMINI_API_KEY", None),
+        default_model=getattr(settings, "LLM_GEMINI_MODEL", "gemini-2.5-pro"),
+        timeout=getattr(settings, "LLM_GEMINI_TIMEOUT", 120),
+        max_concurrency=getattr(settings, "LLM_GEMINI_MAX_CONCURRENCY", 8),
+    ),
+    "openai": OpenAIProvider(
+        api_key=getattr(settings, "OPENAI_API_KEY", None),
+        default_model=getattr(settings, "LLM_OPENAI_MODEL", "gpt-4o"),
+        timeout=getattr(settings, "LLM_OPENAI_TIMEOUT", 120),
+        max_concurrency=getattr(settings, "LLM_OPENAI_MAX_CONCURRENCY", 8),
+    ),
+}
+
+if getattr(settings, "LLM_STUB_PROVIDER", False):
+    PROVIDERS["stub"] = StubProvider()
+
+for _name, _provider in PROVIDERS.items():
+    if not _provider.available:
+        logger.warning(f"{_name} API key missing; {_name} calls will fall back")
+
+
+class ResponseCache:
+    """
+    Two-tier LLM response cache: a per-process LRU of `memory_entries` in
+    front of LLMResponseCacheEntry rows (bounded to `max_entries`, oldest
+    use evicted first). Entries expire after their TTL in both tiers.
+    Hit/miss counters are per process. Thread-safe.
+    """
+    def __init__(self, ttl, memory_entries=256, max_entries=20_000):
+        self.ttl            = ttl
+        self.memory_entries = memory_entries
+        self.max_entries    = max_entries
+        self._entries       = OrderedDict()     # key -> (text, expires_at epoch)
+        self._lock          = threading.Lock()
+        self.memory_hits    = 0
+        self.db_hits        = 0
+        self.misses         = 0
+
+    @staticmethod
+    def key(provider, model, params, prompt):
+        h = hashlib.sha256()
+        h.update(f"{provider}\0{model}\0{json.dumps(params, sort_keys=True)}\0".encode("utf-8"))
+        for part in ([prompt] if isinstance(prompt, str) else prompt):
+            if isinstance(part, str):
+                h.update(b"t" + part.encode("utf-8"))
+                continue
+            blob = getattr(part, "inline_data", None)
+            if blob is not None and blob.data:
+                h.update(b"b" + (blob.mime_type or "").encode() + b"\0" + blob.data)
+            else:
+                h.update(b"t" + (getattr(part, "text", None) or "").encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key):
+        from researcher_app.models import LLMResponseCacheEntry
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        now = timezone.now()
+        row = (LLMResponseCacheEntry.objects
+               .filter(key=key, expires_at__gt=now)
+               .values_list("response", "expires_at").first())
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        LLMResponseCacheEntry.objects.filter(key=key).update(hits=F("hits") + 1, last_used_at=now)
+        text, expires_at = row
+        with self._lock:
+            self.db_hits += 1
+            self._remember(key, text, expires_at.timestamp())
+        return text
+
+    def put(self, key, provider, model, text, ttl=None):
+        from researcher_app.models import LLMResponseCacheEntry
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        LLMResponseCacheEntry.objects.update_or_create(key=key, defaults={
+            "provider":     provider,
+            "model":        (model or "")[:100],
+            "response":     text,
+            "expires_at":   expires_at,
+            "last_used_at": timezone.now(),
+        })
+        with self._lock:
+            self._remember(key, text, expires_at.timestamp())
+        self._evict()
+
+    def stats(self):
+        from researcher_app.models import LLMResponseCacheEntry
+
+        with self._lock:
+            memory_hits, db_hits, misses = self.memory_hits, self.db_hits, self.misses
+            memory_entries = len(self._entries)
+        total = memory_hits + db_hits + misses
+        return {
+            "memory_hits":    memory_hits,
+            "db_hits":        db_hits,
+            "misses":         misses,
+            "hit_rate":       round((memory_hits + db_hits) / total, 4) if total else None,
+            "memory_entries": memory_entries,
+            "entries":        LLMResponseCacheEntry.objects.count(),
+            "max_entries":    self.max_entries,
+            "ttl":            self.ttl,
+        }
+
+    def _remember(self, key, text, expires_at):
+        # caller holds the lock
+        self._entries[key] = (text, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.memory_entries:
+            self._entries.popitem(last=False)
+
+    def _evict(self):
+        from researcher_app.models import LLMResponseCacheEntry
+
+        LLMResponseCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+        excess = LLMResponseCacheEntry.objects.count() - self.max_entries
+        if excess <= 0:
+            return
+        stale = list(
+            LLMResponseCacheEntry.objects.order_by("last_used_at", "id")
+            .values_list("id", flat=True)[:excess]
+        )
+        LLMResponseCacheEntry.objects.filter(id__in=stale).delete()
+        logger.debug(f"Evicted {len(stale)} LLM response cache entries")
+
+
+response_cache = (
+    ResponseCache(
+        ttl=getattr(settings, "LLM_CACHE_TTL", 7 * 24 * 3600),
+        memory_entries=getattr(settings, "LLM_CACHE_MEMORY_ENTRIES", 256),
+        max_entries=getattr(settings, "LLM_CACHE_MAX_ENTRIES", 20_000),
+    )
+    if getattr(settings, "LLM_CACHE_ENABLED", True) else None
+)
+
+
+def get_provider(name):
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM provider {name!r}; expected one of {sorted(PROVIDERS)}")
 
-# 🚨 Load API Keys
-OPENAI_API_KEY = getattr(settings, "OPENAI_API_KEY", None)
-GEMINI_API_KEY = getattr(settings, "GEMINI_API_KEY", None)
-
-# ✅ Initialize OpenAI
-if OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
-    print("✅ OpenAI API key loaded.")
-else:
-    print("❌ OpenAI API key missing!")
-
-# ✅ Initialize Gemini
-if GEMINI_API_KEY:
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    print("✅ Gemini API key loaded.")
-else:
-    client = None
-    print("❌ Gemini API key missing!")
 
 # 📜 Unified LLM call function
-def call_llm(prompt, preferred="gemini", model_openai="gpt-4o", model_gemini="gemini-2.5-pro"):
+def call_llm(prompt, preferred="gemini", model_openai=None, model_gemini=None,
+             deadline=None, hedge=None, cache=False, fresh=False, ttl=None, context=None,
+             **params):
     """
-    Calls preferred API (Gemini or OpenAI). Falls back if error occurs.
+    Calls the preferred provider (Gemini or OpenAI), falling back to the other
+    one if it fails.
+
+    - each provider retries transient errors (timeouts, connection errors,
+      429/5xx) with jittered exponential backoff
+    - providers whose circuit breaker is open are skipped
+    - the whole call gives up after `deadline` seconds (LLM_DEADLINE), even if
+      a request is still in flight
+    - with hedge=True, if the preferred provider has not answered within its
+      observed p95 latency the request is also sent to the other provider,
+      and whichever answers first wins
+    - with cache=True, an identical earlier request (same preferred provider,
+      model, parameters and prompt) is answered from the response cache;
+      fresh=True skips the lookup but stores the new response
+    - `context` (a context_cache.PaperContext) is sent ahead of the prompt:
+      as a provider-side cached context where the provider supports it
+      (created once, TTL refreshed on reuse), inline otherwise
 
     Args:
-        prompt (str): Prompt to send
+        prompt (str | list): Prompt text, or Gemini-style contents (strings and
+            inline image parts) for multimodal calls
         preferred (str): "gemini" or "openai"
-        model_openai (str): OpenAI model name (default gpt-4o)
-        model_gemini (str): Gemini model name (default gemini-2.5-pro)
+        model_openai (str): OpenAI model name (default LLM_OPENAI_MODEL)
+        model_gemini (str): Gemini model name (default LLM_GEMINI_MODEL)
+        deadline (float): Overall time limit in seconds
+        hedge (bool): Hedge slow requests (default LLM_HEDGE)
+        cache (bool): Use the response cache (off by default)
+        fresh (bool): Ask for a new sample even if a cached one exists
+        ttl (int): Cache lifetime in seconds (default LLM_CACHE_TTL)
+        context (PaperContext): Paper text shared across calls
+        **params: temperature / max_tokens
 
     Returns:
         str: LLM response content
+
+    Raises:
+        LLMError: every provider failed, was unavailable, or the deadline passed
     """
-    try:
-        if preferred == "gemini":
-            if not GEMINI_API_KEY:
-                raise ValueError("Missing GEMINI_API_KEY")
-        
-            client = genai.Client(api_key=GEMINI_API_KEY)
-            resp = client.models.generate_content(
-                model=model_gemini,
-                contents=prompt
-            )
-        
-            # Always return a STRING
-            if hasattr(resp, "text") and isinstance(resp.text, str) and resp.text.strip():
-                return resp.text
-        
-            # fallback: collect candidates/parts text if needed
-            texts = []
+    get_provider(preferred)     # validates the name
+    if deadline is None:
+        deadline = getattr(settings, "LLM_DEADLINE", 240)
+    if hedge is None:
+        hedge = getattr(settings, "LLM_HEDGE", False)
+    models = {"gemini": model_gemini, "openai": model_openai}
+
+    cache_key = None
+    if cache and response_cache is not None:
+        model     = models.get(preferred) or PROVIDERS[preferred].default_model
+        key_params = {**params, "context": context.key} if context is not None else params
+        cache_key = response_cache.key(preferred, model, key_params, prompt)
+        if not fresh:
+            text = response_cache.get(cache_key)
+            if text is not None:
+                return text
+
+    text, provider = _call_providers(prompt, preferred, models, deadline, hedge, params, context)
+    if cache_key is not None and text:
+        response_cache.put(cache_key, provider.name, models.get(provider.name) or provider.default_model,
+                           text, ttl=ttl)
+    return text
+
+
+def stats():
+    return {name: provider.stats() for name, provider in PROVIDERS.items()}
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _call_providers(prompt, preferred, models, deadline, hedge, params, context=None):
+    """
+    (text, provider) from the first provider to answer; see call_llm.
+    """
+    ends    = time.monotonic() + deadline
+    order   = [preferred] + [name for name in PROVIDERS if name != preferred]
+    waiting = [PROVIDERS[name] for name in order if PROVIDERS[name].available]
+    errors  = [f"{name}: API key missing" for name in order if not PROVIDERS[name].available]
+    pending = {}    # future -> (provider, started)
+
+    def launch():
+        while waiting:
+            provider = waiting.pop(0)
+            if not provider.breaker.allow():
+                errors.append(f"{provider.name}: circuit open")
+                continue
+            model = models.get(provider.name) or provider.default_model
+            logger.info(f"🌟 Using {provider.name} API ({model})")
+            contents, cached = _with_context(provider, model, prompt, context)
+            fut = _executor().submit(_call_with_retry, provider, contents, model, params, ends, cached,
+                                     (lambda: _inline(prompt, context)) if cached else None)
+            pending[fut] = (provider, time.monotonic())
+            return True
+        return False
+
+    launch()
+    while pending:
+        now     = time.monotonic()
+        timeout = ends - now
+        if timeout <= 0:
+            errors.append(f"deadline of {deadline}s exceeded")
+            break
+
+        hedge_at = None
+        if hedge and waiting and len(pending) == 1:
+            provider, started = next(iter(pending.values()))
+            p95 = provider.p95()
+            if p95 is not None:
+                hedge_at = started + p95
+                timeout  = min(timeout, max(0, hedge_at - now))
+
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                logger.info(f"⏱️ {provider.name} slower than its p95 ({p95:.1f}s); hedging")
+                launch()
+            continue
+
+        for fut in done:
+            provider, _ = pending.pop(fut)
             try:
-                for c in getattr(resp, "candidates", []) or []:
-                    content = getattr(c, "content", None)
-                    parts = getattr(content, "parts", None) if content else None
-                    if parts:
-                        for p in parts:
-                            t = getattr(p, "text", None)
-                            if isinstance(t, str) and t.strip():
-                                texts.append(t)
-            except Exception:
-                pass
-        
-            return "\n".join(texts) if texts else ""
-
-        # if preferred == "gemini":
-        #     if not client:
-        #         raise ValueError("Gemini client not initialized.")
-        #     print(f"🌟 Using Gemini API ({model_gemini})...")
-        #     response = client.models.generate_content(
-        #         model=model_gemini,
-        #         contents=prompt
-        #     )
-        #     return response.text
-        
-        elif preferred == "openai":
-            if not OPENAI_API_KEY:
-                raise ValueError("OpenAI API key missing.")
-            print(f"🌟 Using OpenAI API ({model_openai})...")
-            response = openai.chat.completions.create(
-                model=model_openai,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=2048,
-                temperature=0.7
+                return fut.result(), provider
+            except Exception as e:
+                logger.warning(f"⚠️ {provider.name} API failed: {e}")
+                errors.append(f"{provider.name}: {e}")
+        if not pending:
+            launch()
+
+    # requests still in flight finish in the background; their results are dropped
+    raise LLMError("LLM call failed: " + "; ".join(errors))
+
+
+_pool, _pool_pid, _pool_lock = None, None, threading.Lock()
+
+
+def _executor():
+    # thread pools do not survive fork(): rebuild per process
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, "LLM_MAX_IN_FLIGHT", 16),
+                thread_name_prefix="llm",
             )
-            return response.choices[0].message.content
-        else:
-            raise ValueError("Preferred API must be 'gemini' or 'openai'")
-    except Exception as e:
-        print(f"⚠️ {preferred} API failed: {e}")
-        fallback = "openai" if preferred == "gemini" else "gemini"
-        print(f"🔄 Falling back to {fallback} API...")
-        return call_llm(prompt, preferred=fallback, model_openai=model_openai, model_gemini=model_gemini)
+            _pool_pid = os.getpid()
+        return _pool
+
 
+def _call_with_retry(provider, prompt, model, params, ends, cached=None, inline=None):
+    """
+    One provider's attempt: waits for a concurrency slot, retries transient
+    errors with jittered exponential backoff while the deadline allows, and
+    feeds the breaker and latency stats. If the cached context `cached` is
+    rejected, the request is sent once more with `inline()` contents.
+    """
+    if not provider.slots.acquire(timeout=max(0, ends - time.monotonic())):
+        provider.breaker.release()
+        raise LLMError(f"{provider.name}: no free request slot before the deadline")
+    try:
+        return _retry_loop(provider, prompt, model, params, ends, cached, inline)
+    finally:
+        provider.slots.release()
+
+
+def _retry_loop(provider, prompt, model, params, ends, cached=None, inline=None):
+    max_retries = getattr(settings, "LLM_MAX_RETRIES", 2)
+    backoff     = getattr(settings, "LLM_RETRY_BACKOFF", 1.0)
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            if cached:
+                text = provider.generate(prompt, model=model, cached_content=cached, **params)
+            else:
+                text = provider.generate(prompt, model=model, **params)
+        except Exception as e:
+            if cached and not _retryable(e):
+                # the cached context is gone (expired or deleted remotely), not
+                # the provider: replace it next time, answer with the paper inline
+                logger.info(f"{provider.name}: cached context {cached} rejected ({e}); sending inline")
+                context_cache.manager.forget(cached)
+                try:
+                    prompt, cached = inline(), None
+                except Exception:
+                    provider.breaker.release()
+                    raise
+                finally:
+                    connections.close_all()     # the fallback may query from this pool thread
+                continue
+            if not _retryable(e):
+                # the provider answered; the request itself was rejected (4xx)
+                provider.breaker.release()
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            if attempt >= max_retries or time.monotonic() + delay >= ends:
+                provider.breaker.record_failure()
+                raise
+            logger.debug(f"{provider.name} request failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        provider.record_latency(time.monotonic() - started)
+        provider.breaker.record_success()
+        return text
+
+
+def _with_context(provider, model, prompt, context):
+    """
+    (contents, cached context name) for one provider: the prompt alone with
+    a cached context, or the paper text inline ahead of it.
+    """
+    if context is None:
+        return prompt, None
+    if context_cache.manager is not None:
+        cached = context_cache.manager.handle(provider, model, context)
+        if cached:
+            return prompt, cached
+    return _inline(prompt, context), None
+
+
+def _inline(prompt, context):
+    prefix = _paper_prefix(context.inline_text())
+    if isinstance(prompt, str):
+        return prefix + prompt
+    return [prefix] + list(prompt)
+
+
+def _paper_prefix(text):
+    return f'PAPER:\n"""{text}"""\n\n'
+
+
+def _retryable(e):
+    # SDK errors carry an HTTP status (`status_code` in openai, `code` in
+    # google-genai); connection errors and timeouts carry none
+    if isinstance(e, (LLMError, ValueError, TypeError)):
+        return False
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    if isinstance(status, int):
+        return status in RETRY_STATUS
+    return True
+
+
+def _gemini_text(resp):
+    # Always return a STRING
+    if hasattr(resp, "text") and isinstance(resp.text, str) and resp.text.strip():
+        return resp.text
+
+    # fallback: collect candidates/parts text if needed
+    texts = []
+    try:
+        for c in getattr(resp, "candidates", []) or []:
+            content = getattr(c, "content", None)
+            parts = getattr(content, "parts", None) if content else None
+            if parts:
+                for p in parts:
+                    t = getattr(p, "text", None)
+                    if isinstance(t, str) and t.strip():
+                        texts.append(t)
+    except Exception:
+        pass
+
+    return "\n".join(texts) if texts else ""
+
+
+def _openai_content(contents):
+    """
+    Chat message content from a prompt string or Gemini-style contents;
+    inline image parts become data-URL image inputs.
+    """
+    if isinstance(contents, str):
+        return contents
+    out = []
+    for item in contents:
+        if isinstance(item, str):
+            out.append({"type": "text", "text": item})
+            continue
+        blob = getattr(item, "inline_data", None)
+        if blob is not None and blob.data:
+            url = f"data:{blob.mime_type};base64,{base64.b64encode(blob.data).decode()}"
+            out.append({"type": "image_url", "image_url": {"url": url}})
+        elif getattr(item, "text", None):
+            out.append({"type": "text", "text": item.text})
+    return out
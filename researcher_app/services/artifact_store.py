@@ -0,0 +1,113 @@
+# services/artifact_store.py
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+
+from django.conf import settings
+
+# Artifacts live under MEDIA_ROOT/outputs/:
+#   blobs/<h[:2]>/<h>.<ext>            one copy of every distinct blob
+#   docs/<doc_key>/<kind>/<h>.<ext>    per-document hard links into blobs/
+SAVE_DIR  = os.path.join(settings.MEDIA_ROOT, "outputs")
+BLOBS_DIR = os.path.join(SAVE_DIR, "blobs")
+DOCS_DIR  = os.path.join(SAVE_DIR, "docs")
+os.makedirs(BLOBS_DIR, exist_ok=True)
+os.makedirs(DOCS_DIR, exist_ok=True)
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    Streaming SHA-256 of a file on disk.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for extracted images and tables, namespaced by document.
+
+    Every distinct blob is written once to the shared pool; each document gets
+    a hard link under its own namespace, so identical logos across papers cost
+    one write, and parallel ingestion of different PDFs never collides.
+    Writes go through a temp file + os.replace, so concurrent writers of the
+    same blob are safe.
+    """
+    def __init__(self, doc_key):
+        self.doc_key = doc_key
+        self.doc_dir = os.path.join(DOCS_DIR, doc_key)
+        self._xrefs  = {}
+
+    def put(self, data, ext, kind):
+        """
+        Store raw bytes and return the document-scoped path.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        ext    = ext.lower().lstrip(".")
+        blob   = os.path.join(BLOBS_DIR, digest[:2], f"{digest}.{ext}")
+        if not os.path.exists(blob):
+            _atomic_write(blob, data)
+
+        path = os.path.join(self.doc_dir, kind, f"{digest}.{ext}")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(blob, path)
+            except FileExistsError:
+                pass
+            except OSError:
+                # filesystem without hard links: fall back to a real copy
+                logger.debug(f"Hard link failed for {path}; copying blob")
+                _atomic_copy(blob, path)
+        return path
+
+    def put_image(self, doc, xref):
+        """
+        Store the raw bytes of an embedded image exactly as PyMuPDF returns them
+        (no decode/re-encode). Repeated xrefs within a document hit a memo.
+        """
+        if xref not in self._xrefs:
+            base = doc.extract_image(xref)
+            self._xrefs[xref] = self.put(base["image"], base["ext"], "images")
+        return self._xrefs[xref]
+
+    def put_table(self, df):
+        """
+        Store a DataFrame as CSV.
+        """
+        return self.put(df.to_csv(index=False).encode("utf-8"), "csv", "tables")
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _atomic_copy(src, dst):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
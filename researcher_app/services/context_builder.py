@@ -0,0 +1,127 @@
+# services/context_builder.py
+
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from researcher_app.models import ExtractedContent
+from .rag_service import RAGService
+from .tokens import tokenizer
+
+logger = logging.getLogger(__name__)
+
+# full-text token counts by (pdf_id, extraction version): drafting asks for the
+# context of every section, and encoding a long paper each time adds up
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+TOKEN_COUNT_ENTRIES = 1024
+
+
+def build(pdf_id, query, budget=None):
+    """
+    Prompt context for `query` from a PDF's extracted content.
+
+    Documents up to CONTEXT_FULL_TEXT_MAX_TOKENS are returned whole. For
+    longer ones, the top chunks the document's RAG index returns for `query`
+    are taken in rank order until `budget` tokens (CONTEXT_TOKEN_BUDGET,
+    counted with tiktoken) are used, then put back in page order. If
+    retrieval yields nothing, the start of the text is used instead. The
+    full text's token count is computed once per extraction version.
+
+    Returns:
+        str: Context text
+    """
+    if budget is None:
+        budget = getattr(settings, "CONTEXT_TOKEN_BUDGET", 6000)
+    text, n_tokens = _full_text_tokens(pdf_id)
+    if n_tokens <= getattr(settings, "CONTEXT_FULL_TEXT_MAX_TOKENS", 12000):
+        return text if text is not None else _full_text(pdf_id)
+
+    svc = RAGService(pdf_id)
+    try:
+        hits = svc.retrieve(query, k=getattr(settings, "CONTEXT_MAX_CHUNKS", 40))
+    except Exception as e:
+        logger.warning(f"PDF {pdf_id}: retrieval for context failed ({e!r}); using leading text")
+        hits = []
+
+    picked, seen, used = [], set(), 0
+    for rank, hit in enumerate(hits):
+        content = hit.get("content")
+        if not content or content in seen:
+            continue
+        n = len(tokenizer.encode(content))
+        if used + n > budget:
+            continue
+        picked.append((hit.get("page") or 0, rank, content))
+        seen.add(content)
+        used += n
+
+    if not picked:
+        # a token is rarely more than 8 characters: no need to encode the whole paper
+        text = text if text is not None else svc.full_text
+        return tokenizer.decode(tokenizer.encode(text[:budget * 8])[:budget])
+
+    picked.sort()
+    return "\n\n".join(f"[p{page}] {content}" if page else content for page, _, content in picked)
+
+
+def for_section(pdf_id, section):
+    """
+    Context for drafting one outline section (title + description).
+    """
+    query = f"{section.get('title', '')}. {section.get('description', '')}".strip(". ")
+    return build(pdf_id, query)
+
+
+def for_outline(pdf_id, outline_json):
+    """
+    Context for blog-level text (the description): what the outline covers.
+    """
+    sections = (outline_json or {}).get("sections", [])
+    query = " ".join(
+        f"{s.get('title', '')}. {s.get('description', '')}" for s in sections
+    )
+    return build(pdf_id, query)
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _full_text(pdf_id):
+    return (
+        ExtractedContent.objects.filter(pdf__id=pdf_id)
+        .values_list("text", flat=True).first()
+    ) or ""
+
+
+def _full_text_tokens(pdf_id):
+    """
+    (text or None, token count) of a PDF's extracted text. The count is
+    memoized per extraction version; the text is only loaded (and returned)
+    when the count is not known yet.
+    """
+    version = (
+        ExtractedContent.objects.filter(pdf__id=pdf_id)
+        .values_list("version", flat=True).first()
+    )
+    key = (pdf_id, version)
+    with _token_counts_lock:
+        n_tokens = _token_counts.get(key)
+        if n_tokens is not None:
+            _token_counts.move_to_end(key)
+            return None, n_tokens
+
+    # text and version read together, so the count is stored under the right version
+    version, text = (
+        ExtractedContent.objects.filter(pdf__id=pdf_id)
+        .values_list("version", "text").first()
+    ) or (None, "")
+    key = (pdf_id, version)
+    n_tokens = len(tokenizer.encode(text))
+    if version is not None:
+        with _token_counts_lock:
+            _token_counts[key] = n_tokens
+            while len(_token_counts) > TOKEN_COUNT_ENTRIES:
+                _token_counts.popitem(last=False)
+    return text, n_tokens
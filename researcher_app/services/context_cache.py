@@ -0,0 +1,241 @@
+# services/context_cache.py
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .tokens import tokenizer
+
+logger = logging.getLogger(__name__)
+
+# how long a claim on a cache being created blocks other processes from
+# creating it too (a claim left by a crashed process is taken over after this)
+CLAIM_SECONDS = 120
+
+
+class PaperContext:
+    """
+    A paper's text shared by several prompts (call_llm(context=...)).
+
+    Providers with context caching receive it once as provider-side cached
+    content; other providers get `fallback` (a string, or a callable that
+    builds one, e.g. retrieved passages) inline ahead of the prompt. The text
+    and the fallback are only loaded when needed.
+    """
+    def __init__(self, content_id, version, fallback=None):
+        self.content_id = content_id
+        self.version    = version
+        self._fallback  = fallback
+        self._text      = None
+        self._inline    = None
+
+    @property
+    def key(self):
+        return f"content:{self.content_id}:v{self.version}"
+
+    @property
+    def text(self):
+        from researcher_app.models import ExtractedContent
+
+        if self._text is None:
+            self._text = (
+                ExtractedContent.objects.filter(pk=self.content_id)
+                .values_list("text", flat=True).first()
+            ) or ""
+        return self._text
+
+    def inline_text(self):
+        if self._inline is None:
+            fallback = self._fallback() if callable(self._fallback) else self._fallback
+            self._inline = self.text if fallback is None else fallback
+        return self._inline
+
+
+class ContextCacheManager:
+    """
+    Provider-side cached contexts, one per (ExtractedContent version,
+    provider, model), recorded in LLMContextCache rows so every process
+    reuses the same cache. A cache is refreshed to `ttl` once less than half
+    of it is left; texts outside [min_tokens, max_tokens] are never cached.
+
+    Each cache is created once: callers in this process wait on a lock per
+    (content, provider, model), and other processes see the row claimed
+    (no name yet) and send the paper inline until it is ready. Counters are
+    per process. Thread-safe.
+    """
+    def __init__(self, ttl=3600, min_tokens=4096, max_tokens=900_000):
+        self.ttl        = ttl
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self._broken    = set()     # cache names a provider rejected
+        self._lock      = threading.Lock()
+        self._key_locks = {}        # (content_id, provider, model) -> Lock
+        self.created    = 0
+        self.reused     = 0
+        self.refreshed  = 0
+        self.fallbacks  = 0
+
+    def handle(self, provider, model, paper):
+        """
+        Name of a live cached context holding `paper` for `provider`/`model`,
+        created or refreshed as needed; None if the provider cannot cache it
+        (the caller then sends the paper inline).
+        """
+        if not getattr(provider, "supports_context_cache", False):
+            self._count("fallbacks")
+            return None
+
+        key = (paper.content_id, provider.name, model)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            return self._handle(provider, model, paper)
+
+    def _handle(self, provider, model, paper):
+        from researcher_app.models import LLMContextCache
+
+        now = timezone.now()
+        row = LLMContextCache.objects.filter(
+            content_id=paper.content_id, provider=provider.name, model=model
+        ).first()
+        if row is not None and not row.name and row.expires_at > now:
+            self._count("fallbacks")        # being created by another process
+            return None
+        if row is not None:
+            with self._lock:
+                broken = row.name in self._broken
+            if row.version != paper.version or broken or row.expires_at <= now + timedelta(seconds=60):
+                if row.name and row.expires_at > now:
+                    _quietly(provider.delete_context_cache, row.name)
+                row.delete()
+                row = None
+
+        if row is not None:
+            if (row.expires_at - now).total_seconds() < self.ttl / 2:
+                try:
+                    provider.refresh_context_cache(row.name, self.ttl)
+                    row.expires_at = now + timedelta(seconds=self.ttl)
+                    row.save(update_fields=["expires_at"])
+                    self._count("refreshed")
+                except Exception as e:
+                    logger.warning(f"Could not refresh {provider.name} context cache {row.name}: {e}")
+            self._count("reused")
+            return row.name
+
+        tokens = len(tokenizer.encode(paper.text))
+        if not self.min_tokens <= tokens <= self.max_tokens:
+            self._count("fallbacks")
+            return None
+
+        # claim the row before creating, so no other process creates one too
+        try:
+            with transaction.atomic():
+                row, claimed = LLMContextCache.objects.get_or_create(
+                    content_id=paper.content_id, provider=provider.name, model=model,
+                    defaults={
+                        "name":       "",
+                        "version":    paper.version,
+                        "tokens":     tokens,
+                        "expires_at": now + timedelta(seconds=CLAIM_SECONDS),
+                    },
+                )
+        except IntegrityError:
+            claimed = False
+        if not claimed:
+            self._count("fallbacks")
+            return None
+
+        try:
+            name = provider.create_context_cache(
+                model, paper.text, self.ttl, display_name=paper.key
+            )
+        except Exception as e:
+            logger.warning(f"Could not create {provider.name} context cache for {paper.key}: {e}")
+            row.delete()
+            self._count("fallbacks")
+            return None
+
+        row.name       = name
+        row.expires_at = now + timedelta(seconds=self.ttl)
+        row.save(update_fields=["name", "expires_at"])
+        self._count("created")
+        logger.info(f"Created {provider.name} context cache {name} for {paper.key} ({tokens} tokens)")
+        return name
+
+    def forget(self, name):
+        """
+        Mark a cache name the provider rejected (expired or deleted remotely);
+        the next handle() replaces it.
+        """
+        with self._lock:
+            self._broken.add(name)
+
+    def stats(self):
+        from researcher_app.models import LLMContextCache
+
+        with self._lock:
+            counters = {
+                "created":   self.created,
+                "reused":    self.reused,
+                "refreshed": self.refreshed,
+                "fallbacks": self.fallbacks,
+            }
+        return {
+            **counters,
+            "live": LLMContextCache.objects.filter(expires_at__gt=timezone.now()).exclude(name="").count(),
+            "ttl":  self.ttl,
+        }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+def _quietly(fn, *args):
+    try:
+        fn(*args)
+    except Exception as e:
+        logger.debug(f"{fn.__name__} failed: {e}")
+
+
+manager = (
+    ContextCacheManager(
+        ttl=getattr(settings, "LLM_CONTEXT_CACHE_TTL", 3600),
+        min_tokens=getattr(settings, "LLM_CONTEXT_CACHE_MIN_TOKENS", 4096),
+        max_tokens=getattr(settings, "LLM_CONTEXT_CACHE_MAX_TOKENS", 900_000),
+    )
+    if getattr(settings, "LLM_CONTEXT_CACHE_ENABLED", False) else None
+)
+
+
+def for_pdf(pdf_id, fallback):
+    """
+    Paper context for a PDF's LLM calls. With context caching enabled, a
+    PaperContext (duplicate uploads share the original's); otherwise just
+    `fallback` (or what the callable returns), as before.
+    """
+    from researcher_app.models import UploadedPDF, ExtractedContent
+
+    if manager is not None:
+        source_id = UploadedPDF.objects.filter(pk=pdf_id).values_list("duplicate_of_id", flat=True).first()
+        row = (
+            ExtractedContent.objects.filter(pdf_id=source_id or pdf_id)
+            .values_list("id", "version").first()
+        )
+        if row is not None:
+            return PaperContext(row[0], row[1], fallback=fallback)
+    return fallback() if callable(fallback) else fallback
+
+
+def split(context):
+    """
+    (text to put in the prompt, context for call_llm) for a prompt builder
+    given either a context string or a PaperContext.
+    """
+    if isinstance(context, PaperContext):
+        return "(see the PAPER context provided before these instructions)", context
+    return context, None
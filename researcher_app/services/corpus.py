@@ -0,0 +1,256 @@
+# services/corpus.py
+
+import os
+import json
+import fcntl
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import faiss
+from django.conf import settings
+
+from . import embeddings, index_factory
+from .index_cache import index_cache, index_version
+from .meta_store import MetaStore
+
+logger = logging.getLogger(__name__)
+
+# Corpus shards live under MEDIA_ROOT/indices/corpus/:
+#   manifest.json                          shard list + which documents each holds
+#   shard_<n>.faiss / .faiss.meta.sqlite   vectors and metadata (with pdf_id)
+CORPUS_DIR    = os.path.join(settings.MEDIA_ROOT, "indices", "corpus")
+MANIFEST_PATH = os.path.join(CORPUS_DIR, "manifest.json")
+LOCK_PATH     = os.path.join(CORPUS_DIR, ".lock")
+
+
+def add_document(pdf_id):
+    """
+    Append a document's vectors to the open corpus shard. A shard that reaches
+    CORPUS_SHARD_MAX_VECTORS is sealed (packed by index_factory) and the next
+    document starts a new one, so adding never rebuilds existing shards.
+
+    Returns the number of vectors added (0 if already present or not indexed).
+    """
+    with _locked():
+        manifest = _read_manifest()
+        if any(pdf_id in s["pdf_ids"] for s in manifest["shards"]):
+            return 0
+
+        vecs, metas = _document_vectors(pdf_id)
+        if not metas:
+            return 0
+
+        shard = next((s for s in manifest["shards"] if not s["sealed"]), None)
+        if shard is None:
+            shard = {"name": f"shard_{manifest['next_shard']:04d}", "sealed": False,
+                     "count": 0, "pdf_ids": []}
+            manifest["shards"].append(shard)
+            manifest["next_shard"] += 1
+            index, old_metas = None, []
+        else:
+            index, old_metas = _load_shard_for_write(shard["name"])
+
+        if index is None:
+            index = index_factory.build(vecs, index_factory.FLAT)
+        else:
+            index.add(np.ascontiguousarray(vecs, dtype="float32"))
+        all_metas = old_metas + metas
+        params    = dict(index_factory.FLAT)
+
+        if index.ntotal >= getattr(settings, "CORPUS_SHARD_MAX_VECTORS", 200_000):
+            params = index_factory.choose_params(index.ntotal, index.d)
+            if params["type"] != "flat":
+                index = index_factory.build(index_factory.reconstruct_all(index), params)
+            shard["sealed"] = True
+
+        _write_shard(shard["name"], index, all_metas, params)
+        shard["count"] = index.ntotal
+        shard["pdf_ids"].append(pdf_id)
+        _write_manifest(manifest)
+
+    logger.info(f"Added PDF {pdf_id} to corpus {shard['name']} ({len(metas)} vectors)")
+    return len(metas)
+
+
+def remove_document(pdf_id):
+    """
+    Drop a document's vectors from its shard (e.g. before re-adding it after
+    re-extraction). Returns the number of vectors removed.
+    """
+    with _locked():
+        manifest = _read_manifest()
+        shard = next((s for s in manifest["shards"] if pdf_id in s["pdf_ids"]), None)
+        if shard is None:
+            return 0
+        index, metas = _load_shard_for_write(shard["name"])
+        keep    = [i for i, m in enumerate(metas) if m.get("pdf_id") != pdf_id]
+        removed = len(metas) - len(keep)
+        vecs    = index_factory.reconstruct_all(index)
+        if vecs is not None:
+            vecs, metas = vecs[keep], [metas[i] for i in keep]
+        else:
+            # PQ codes are lossy: collect the remaining documents' vectors again
+            parts = [_document_vectors(p) for p in shard["pdf_ids"] if p != pdf_id]
+            parts = [(v, m) for v, m in parts if m]
+            vecs  = np.vstack([v for v, _ in parts]) if parts else None
+            metas = [m for _, ms in parts for m in ms]
+
+        if metas:
+            params = dict(index_factory.FLAT)
+            if shard["sealed"]:
+                params = index_factory.choose_params(len(metas), vecs.shape[1])
+            _write_shard(shard["name"], index_factory.build(vecs, params), metas, params)
+            shard["count"] = len(metas)
+        else:
+            _delete_shard(shard["name"])
+            manifest["shards"].remove(shard)
+        shard["pdf_ids"].remove(pdf_id)
+        _write_manifest(manifest)
+    return removed
+
+
+def documents():
+    """
+    Ids of the documents currently in the corpus.
+    """
+    return sorted(pid for s in _read_manifest()["shards"] for pid in s["pdf_ids"])
+
+
+def search(query, k=5, pdf_ids=None):
+    """
+    Search every shard (or only shards holding `pdf_ids`) in parallel and merge
+    the hits by distance. The query is embedded once.
+
+    Returns:
+        [{"pdf_id", "distance", "type", "page", "content"/"url"/"path", …}]
+    """
+    shards = _read_manifest()["shards"]
+    if pdf_ids is not None:
+        wanted = set(pdf_ids)
+        shards = [s for s in shards if wanted.intersection(s["pdf_ids"])]
+    if not shards:
+        return []
+
+    qv, = embeddings.client.embed_texts([query])
+    q   = np.array([qv], dtype="float32")
+
+    def search_shard(shard):
+        index, store, params = _load_shard_for_read(shard["name"])
+        ids = None
+        if pdf_ids is not None:
+            ids = store.ids_where("pdf_id", [p for p in pdf_ids if p in shard["pdf_ids"]])
+            if not ids:
+                return []
+        D, I = index_factory.search(index, params, q, k, ids=ids)
+        hits  = [(float(d), int(i)) for d, i in zip(D[0], I[0]) if i >= 0]
+        metas = store.get_many([i for _, i in hits])
+        return [
+            {"distance": d, **meta}
+            for (d, _), meta in zip(hits, metas) if meta is not None
+        ]
+
+    workers = min(len(shards), getattr(settings, "CORPUS_SEARCH_THREADS", 4))
+    if workers <= 1:
+        results = [search_shard(s) for s in shards]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(search_shard, shards))
+    merged = [h for hits in results for h in hits]
+    merged.sort(key=lambda h: h["distance"])
+    return merged[:k]
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _document_vectors(pdf_id):
+    """
+    (float32 vectors, metadata tagged with pdf_id) from a document's own index.
+    Duplicate uploads and documents without an index yield nothing.
+    """
+    from .rag_service import RAGService
+
+    svc = RAGService(pdf_id)
+    if svc.source_id != pdf_id:
+        return None, []     # duplicate uploads are searched through their original
+    if not svc.index_exists():
+        logger.warning(f"PDF {pdf_id} has no index; not in the corpus")
+        return None, []
+    svc._load_index(cached=False)     # always a flat, exact copy
+    vecs, ids = index_factory.vectors_and_ids(svc.index)
+    if vecs is None:
+        return None, []
+    return vecs, [{**svc.metadatas[i], "pdf_id": pdf_id} for i in ids]
+
+
+@contextmanager
+def _locked():
+    # one writer at a time across worker threads and processes
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    with open(LOCK_PATH, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"shards": [], "next_shard": 0}
+
+
+def _write_manifest(manifest):
+    fd, tmp = tempfile.mkstemp(dir=CORPUS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def _paths(name):
+    index_path = os.path.join(CORPUS_DIR, f"{name}.faiss")
+    return index_path, index_path + ".meta.sqlite"
+
+
+def _load_shard_for_write(name):
+    index_path, meta_path = _paths(name)
+    store = MetaStore(meta_path)
+    metas = store.all()
+    store.close()
+    return faiss.read_index(index_path), metas
+
+
+def _load_shard_for_read(name):
+    index_path, meta_path = _paths(name)
+    key     = f"corpus:{name}"
+    version = index_version(index_path)
+    hit = index_cache.get(key, version)
+    if hit is not None:
+        index, store = hit
+    else:
+        store  = MetaStore(meta_path)
+        params = store.info().get("index", index_factory.FLAT)
+        index  = faiss.read_index(index_path, index_factory.read_flags(params))
+        index_cache.put(key, version, index, store)
+    return index, store, store.info().get("index", dict(index_factory.FLAT))
+
+
+def _write_shard(name, index, metas, params):
+    # metadata first: a reader never sees vectors without their metadata
+    index_path, meta_path = _paths(name)
+    MetaStore.write(meta_path, metas, info={"index": params})
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    index_cache.invalidate(f"corpus:{name}")
+
+
+def _delete_shard(name):
+    for path in _paths(name):
+        if os.path.exists(path):
+            os.remove(path)
+    index_cache.invalidate(f"corpus:{name}")
@@ -0,0 +1,176 @@
+# services/digest.py
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from researcher_app.models import UploadedPDF, ExtractedContent, ExtractedPage, DocumentDigest
+from .api_handler import call_llm
+from .tokens import tokenizer
+
+logger = logging.getLogger(__name__)
+
+CHUNK_PROMPT = """
+You are summarizing part of a research paper (pages {first}–{last}) so it can
+later be turned into a blog post without the full text.
+
+Summarize the excerpt in 5–10 dense bullet points. Keep the problem, methods,
+key equations (in words), datasets, numbers, results and any Figure/Table
+references. No introduction or commentary.
+
+EXCERPT:
+{text}
+"""
+
+SECTION_PROMPT = """
+Below are summaries of consecutive parts of a research paper (pages {first}–{last}).
+Merge them into one coherent section summary of at most 250 words, keeping
+concrete methods, numbers and results. Return only the summary.
+
+SUMMARIES:
+{text}
+"""
+
+DOCUMENT_PROMPT = """
+Below are section-by-section summaries of a research paper.
+Write a document-level summary of at most 350 words: the problem, the
+approach, the main results (with numbers) and the conclusions. Return only
+the summary.
+
+SECTION SUMMARIES:
+{text}
+"""
+
+
+def build(pdf_id, preferred="gemini", progress=None):
+    """
+    Build (or rebuild) the digest of a PDF's extraction.
+
+    Map: the text is split into page-aligned chunks of DIGEST_CHUNK_TOKENS,
+    summarized in parallel (DIGEST_PARALLEL at once).
+    Reduce: every DIGEST_GROUP_SIZE consecutive chunk summaries become a
+    section summary, and the section summaries a document summary.
+
+    Papers up to DIGEST_MIN_TOKENS get no digest (prompts use their text).
+    Returns the DocumentDigest, or None when none is needed.
+    """
+    progress = progress or (lambda *a, **k: None)
+    content = ExtractedContent.objects.only("id", "text", "version").get(pdf_id=pdf_id)
+    total = len(tokenizer.encode(content.text))
+    if total <= getattr(settings, "DIGEST_MIN_TOKENS", 12000):
+        DocumentDigest.objects.filter(content=content).delete()
+        return None
+
+    chunks = _chunks(pdf_id, content.text)
+    progress("summarizing", chunks_total=len(chunks), chunks_summarized=0)
+    workers = min(len(chunks), getattr(settings, "DIGEST_PARALLEL", 6))
+
+    def summarize(chunk):
+        try:
+            first, last, text = chunk
+            return _summarize(CHUNK_PROMPT, first, last, text, preferred)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="digest") as pool:
+        summaries = []
+        for n, summary in enumerate(pool.map(summarize, chunks), 1):
+            summaries.append(summary)
+            progress("summarizing", chunks_summarized=n)
+    chunk_entries = [
+        {"pages": [first, last], "summary": s}
+        for (first, last, _), s in zip(chunks, summaries)
+    ]
+
+    progress("reducing")
+    group = max(1, getattr(settings, "DIGEST_GROUP_SIZE", 6))
+    groups = [chunk_entries[i:i + group] for i in range(0, len(chunk_entries), group)]
+    with ThreadPoolExecutor(max_workers=min(len(groups), workers), thread_name_prefix="digest") as pool:
+        section_summaries = list(pool.map(lambda g: _reduce(g, preferred), groups))
+    sections = [
+        {"pages": [g[0]["pages"][0], g[-1]["pages"][1]], "summary": s}
+        for g, s in zip(groups, section_summaries)
+    ]
+    summary = _summarize(DOCUMENT_PROMPT, None, None, _join(sections), preferred)
+
+    digest, _ = DocumentDigest.objects.update_or_create(content=content, defaults={
+        "version":       content.version,
+        "summary":       summary,
+        "sections":      sections,
+        "chunks":        chunk_entries,
+        "source_tokens": total,
+    })
+    logger.info(
+        f"PDF {pdf_id}: digest of {total} tokens → {len(chunks)} chunks, {len(sections)} sections"
+    )
+    return digest
+
+
+def text_for(pdf_id):
+    """
+    Prompt text for a PDF: its digest (document summary + section summaries)
+    when one matches the current extraction, otherwise None.
+    Duplicate uploads use the original's digest.
+    """
+    source_id = UploadedPDF.objects.filter(pk=pdf_id).values_list("duplicate_of_id", flat=True).first()
+    digest = (
+        DocumentDigest.objects.select_related("content")
+        .filter(content__pdf_id=source_id or pdf_id).first()
+    )
+    if digest is None or digest.version != digest.content.version:
+        return None
+    return f"DOCUMENT SUMMARY:\n{digest.summary}\n\nSECTION SUMMARIES:\n{_join(digest.sections)}"
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _chunks(pdf_id, text):
+    """
+    [(first_page, last_page, text)] of about DIGEST_CHUNK_TOKENS each, cut at
+    page boundaries (pages longer than a chunk are split by tokens).
+    """
+    limit = getattr(settings, "DIGEST_CHUNK_TOKENS", 3000)
+    pages = list(
+        ExtractedPage.objects.filter(pdf_id=pdf_id).order_by("page_number")
+        .values_list("page_number", "text")
+    ) or [(1, text)]
+
+    out, cur, cur_first, cur_last, cur_tokens = [], [], None, None, 0
+    for number, page_text in pages:
+        toks = tokenizer.encode(page_text or "")
+        for i in range(0, max(len(toks), 1), limit):
+            piece = toks[i:i + limit]
+            if cur and cur_tokens + len(piece) > limit:
+                out.append((cur_first, cur_last, tokenizer.decode(cur)))
+                cur, cur_first, cur_tokens = [], None, 0
+            if cur_first is None:
+                cur_first = number
+            cur.extend(piece)
+            cur_tokens += len(piece)
+            cur_last = number
+    if cur:
+        out.append((cur_first, cur_last, tokenizer.decode(cur)))
+    return out
+
+
+def _summarize(prompt, first, last, text, preferred):
+    return call_llm(
+        prompt.format(first=first, last=last, text=text),
+        preferred=preferred, cache=True, temperature=0.2,
+    ).strip()
+
+
+def _reduce(group, preferred):
+    try:
+        if len(group) == 1:
+            return group[0]["summary"]
+        return _summarize(SECTION_PROMPT, group[0]["pages"][0], group[-1]["pages"][1],
+                          _join(group), preferred)
+    finally:
+        connections.close_all()
+
+
+def _join(entries):
+    return "\n\n".join(f"[pp. {e['pages'][0]}–{e['pages'][1]}]\n{e['summary']}" for e in entries)
@@ -0,0 +1,101 @@
+# services/drafting.py
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from researcher_app.models import BlogOutline, BlogDraft, BackgroundJob
+from . import api_handler, writer, context_builder, context_cache
+
+logger = logging.getLogger(__name__)
+
+
+def draft_outline(outline_id, preferred="openai", progress=None):
+    """
+    Draft every still-empty section of an outline concurrently (the "draft"
+    background job). Sections are submitted in section_order, so earlier
+    sections start first; at most DRAFT_PARALLEL_SECTIONS run at once, and
+    never more than the preferred provider's request slots, so no section
+    times out waiting for a slot its siblings hold. Each result is
+    written to its BlogDraft as soon as it arrives, unless the section got
+    content in the meantime.
+
+    Returns the number of sections drafted; raises if any section failed
+    (the job is retried and only redrafts the sections still empty).
+    """
+    progress = progress or (lambda *a, **k: None)
+    outline_obj = BlogOutline.objects.only("id", "pdf_id", "outline_json").get(pk=outline_id)
+    sections = (outline_obj.outline_json or {}).get("sections", [])
+    pending  = list(BlogDraft.objects.filter(outline_id=outline_id, content="").order_by("section_order"))
+    if not pending:
+        return 0
+
+    progress("drafting", sections_total=len(pending), sections_drafted=0)
+    drafted, errors = 0, []
+    workers = min(
+        len(pending),
+        getattr(settings, "DRAFT_PARALLEL_SECTIONS", 6),
+        api_handler.get_provider(preferred).max_concurrency,
+    )
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="draft") as pool:
+        futures = {
+            pool.submit(_draft_one, outline_obj.pdf_id, draft, sections, preferred): draft
+            for draft in pending
+        }
+        for fut in as_completed(futures):
+            draft = futures[fut]
+            try:
+                fut.result()
+                drafted += 1
+            except Exception as e:
+                logger.exception(f"Outline {outline_id}: drafting section {draft.section_order} failed")
+                errors.append(f"section {draft.section_order}: {e}")
+            progress("drafting", sections_drafted=drafted)
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(pending)} sections failed: " + "; ".join(errors))
+    return drafted
+
+
+def active(outline_id):
+    """
+    True while a draft job for the outline is queued or running.
+    """
+    return BackgroundJob.objects.filter(
+        kind="draft", status__in=("queued", "running"), payload__outline_id=outline_id
+    ).exists()
+
+
+def wait_for(draft, timeout=None):
+    """
+    Wait up to `timeout` seconds (DRAFT_WAIT_TIMEOUT) for the background job
+    to fill `draft`; returns its content ("" if it is still empty, or no job
+    is drafting the outline any more).
+    """
+    if timeout is None:
+        timeout = getattr(settings, "DRAFT_WAIT_TIMEOUT", 60)
+    ends = time.monotonic() + timeout
+    while True:
+        content = BlogDraft.objects.filter(pk=draft.pk).values_list("content", flat=True).first()
+        if content or time.monotonic() >= ends or not active(draft.outline_id):
+            return content or ""
+        time.sleep(1.0)
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _draft_one(pdf_id, draft, sections, preferred):
+    try:
+        try:
+            sec_info = sections[draft.section_order]
+        except (IndexError, TypeError):
+            raise ValueError(f"no outline section for section_order {draft.section_order}")
+        context = context_cache.for_pdf(pdf_id, lambda: context_builder.for_section(pdf_id, sec_info))
+        body    = writer.draft_section(sec_info, context, preferred=preferred)
+        BlogDraft.objects.filter(pk=draft.pk, content="").update(content=body, last_updated=timezone.now())
+    finally:
+        connections.close_all()
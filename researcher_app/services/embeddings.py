@@ -0,0 +1,311 @@
+# services/embeddings.py
+
+import os
+import time
+import base64
+import random
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class EmbeddingError(RuntimeError):
+    pass
+
+
+class EmbeddingClient:
+    """
+    Client for the CLIP text/image embedding endpoints.
+
+    - one pooled keep-alive `requests.Session` per process
+    - inputs split into batches (EMBED_TEXT_BATCH_SIZE / EMBED_IMAGE_BATCH_SIZE)
+    - at most EMBED_MAX_IN_FLIGHT requests in flight at once
+    - per-request timeout, retries with exponential backoff + jitter on
+      connection errors, timeouts, 429 and 5xx
+    - a batch the endpoint rejects for its inputs (4xx other than 429, or the
+      wrong number of embeddings) is bisected, so one bad input only costs
+      itself; transport errors and 5xx that outlast the retries fail at once
+    - optional EmbeddingCache: only content never embedded before hits the network
+    """
+    def __init__(self, text_url, image_url, text_batch=64, image_batch=16,
+                 max_in_flight=4, timeout=30, max_retries=3, backoff=0.5,
+                 cache=None, model_id=None):
+        self.cache         = cache
+        self.model_id      = model_id or f"{text_url}|{image_url}"
+        self.text_url      = text_url
+        self.image_url     = image_url
+        self.text_batch    = max(1, text_batch)
+        self.image_batch   = max(1, image_batch)
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout       = timeout
+        self.max_retries   = max_retries
+        self.backoff       = backoff
+        self._pid          = None
+        self._lock         = threading.Lock()
+
+    # ─── Public API ──────────────────────────────────────────────────────────
+    def embed_texts(self, texts, allow_partial=False):
+        """
+        Embed a list of strings, preserving order.
+
+        With allow_partial=True, inputs that cannot be embedded come back as
+        None instead of failing the whole call.
+        """
+        texts = list(texts)
+        return self._cached(
+            "text",
+            [t.encode("utf-8") for t in texts],
+            texts,
+            lambda items: self._run(self.text_url, "texts", items, self.text_batch, allow_partial),
+        )
+
+    def embed_images(self, sources, allow_partial=False):
+        """
+        Embed images given as local paths or http(s) URLs, preserving order.
+        """
+        raws = []
+        for src in sources:
+            try:
+                raws.append(self._read_image(src))
+            except Exception:
+                if not allow_partial:
+                    raise
+                logger.exception(f"Could not read image {src}")
+                raws.append(None)
+
+        readable = [r for r in raws if r is not None]
+        vecs = iter(self._cached(
+            "image",
+            readable,
+            [base64.b64encode(r).decode() for r in readable],
+            lambda items: self._run(self.image_url, "images", items, self.image_batch, allow_partial),
+        ))
+        return [next(vecs) if r is not None else None for r in raws]
+
+    def stats(self):
+        return self.cache.stats() if self.cache else {}
+
+    # ─── Internals ───────────────────────────────────────────────────────────
+    def _cached(self, kind, contents, payloads, fetch):
+        """
+        Serve what the cache has, fetch each distinct missing input once,
+        and store the new vectors.
+        """
+        if not self.cache or not contents:
+            return fetch(payloads)
+
+        keys  = [self.cache.key(self.model_id, kind, c) for c in contents]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, payload in zip(keys, payloads):
+            if key not in found and key not in missing:
+                missing[key] = payload
+        if missing:
+            vecs = fetch(list(missing.values()))
+            fresh = {k: v for k, v in zip(missing, vecs) if v is not None}
+            self.cache.put_many(self.model_id, fresh)
+            found.update(fresh)
+        return [found.get(k) for k in keys]
+
+    def _run(self, url, field, items, batch_size, allow_partial):
+        if not items:
+            return []
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        session, pool = self._resources()
+        futures = [pool.submit(self._embed_batch, session, url, field, b, allow_partial) for b in batches]
+        out = []
+        for fut in futures:
+            out.extend(fut.result())
+        return out
+
+    def _embed_batch(self, session, url, field, batch, allow_partial):
+        try:
+            return self._post_with_retry(session, url, field, batch)
+        except Exception as e:
+            if not _input_error(e):
+                # the service is failing, not these inputs: splitting would
+                # only multiply requests against it
+                raise EmbeddingError(str(e)) from e
+            if len(batch) > 1:
+                mid = len(batch) // 2
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}); splitting")
+                return (
+                    self._embed_batch(session, url, field, batch[:mid], allow_partial)
+                    + self._embed_batch(session, url, field, batch[mid:], allow_partial)
+                )
+            if allow_partial:
+                logger.error(f"Dropping input that failed to embed: {e}")
+                return [None]
+            raise EmbeddingError(str(e)) from e
+
+    def _post_with_retry(self, session, url, field, batch):
+        attempt = 0
+        while True:
+            try:
+                resp = session.post(url, json={field: batch}, timeout=self.timeout)
+                if resp.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    raise _Retryable(f"HTTP {resp.status_code}")
+                resp.raise_for_status()
+                vecs = resp.json()["embeddings"]
+                if len(vecs) != len(batch):
+                    raise EmbeddingError(f"expected {len(batch)} embeddings, got {len(vecs)}")
+                return vecs
+            except (_Retryable, requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                logger.debug(f"Embedding request failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def _read_image(self, src):
+        if src.startswith("http"):
+            session, _ = self._resources()
+            resp = session.get(src, timeout=self.timeout)
+            resp.raise_for_status()
+            return resp.content
+        with open(src, "rb") as f:
+            return f.read()
+
+    def _resources(self):
+        # sessions and thread pools do not survive fork(): rebuild per process
+        with self._lock:
+            if self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_in_flight)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                self._session = session
+                self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                thread_name_prefix="embed")
+                self._pid = os.getpid()
+            return self._session, self._pool
+
+
+class _Retryable(Exception):
+    pass
+
+
+def _input_error(exc):
+    """
+    True if a failed request was rejected because of its inputs.
+    """
+    if isinstance(exc, EmbeddingError):
+        return True     # wrong number of embeddings back
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        code = exc.response.status_code
+        return 400 <= code < 500 and code != 429
+    return False
+
+
+class EmbeddingCache:
+    """
+    DB-backed (EmbeddingCacheEntry) embedding cache, bounded to `max_entries`
+    with least-recently-used eviction. Hit/miss counters are per process;
+    `hits` on each row accumulates across processes.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits        = 0
+        self.misses      = 0
+        self._lock       = threading.Lock()
+
+    @staticmethod
+    def key(model_id, kind, content):
+        h = hashlib.sha256()
+        h.update(model_id.encode("utf-8"))
+        h.update(b"\0" + kind.encode("utf-8") + b"\0")
+        h.update(content)
+        return h.hexdigest()
+
+    def get_many(self, keys):
+        from researcher_app.models import EmbeddingCacheEntry
+
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), 500):
+            rows = EmbeddingCacheEntry.objects.filter(key__in=unique[i:i + 500]).values_list("key", "vector")
+            for key, vec in rows:
+                found[key] = np.frombuffer(bytes(vec), dtype="float32").tolist()
+        if found:
+            EmbeddingCacheEntry.objects.filter(key__in=list(found)).update(
+                hits=F("hits") + 1, last_used_at=timezone.now()
+            )
+        with self._lock:
+            self.hits   += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, model_id, vectors):
+        from researcher_app.models import EmbeddingCacheEntry
+
+        if not vectors:
+            return
+        EmbeddingCacheEntry.objects.bulk_create([
+            EmbeddingCacheEntry(
+                key=key,
+                model=model_id[:255],
+                vector=np.asarray(vec, dtype="float32").tobytes(),
+            )
+            for key, vec in vectors.items()
+        ], ignore_conflicts=True, batch_size=500)
+        self._evict()
+
+    def stats(self):
+        from researcher_app.models import EmbeddingCacheEntry
+
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits":        hits,
+            "misses":      misses,
+            "hit_rate":    round(hits / total, 4) if total else None,
+            "entries":     EmbeddingCacheEntry.objects.count(),
+            "max_entries": self.max_entries,
+            "total_hits":  EmbeddingCacheEntry.objects.aggregate(n=Sum("hits"))["n"] or 0,
+        }
+
+    def _evict(self):
+        from researcher_app.models import EmbeddingCacheEntry
+
+        excess = EmbeddingCacheEntry.objects.count() - self.max_entries
+        if excess <= 0:
+            return
+        stale = list(
+            EmbeddingCacheEntry.objects.order_by("last_used_at", "id")
+            .values_list("id", flat=True)[:excess]
+        )
+        EmbeddingCacheEntry.objects.filter(id__in=stale).delete()
+        logger.debug(f"Evicted {len(stale)} embedding cache entries")
+
+
+client = EmbeddingClient(
+    text_url=os.environ["CLIP_TEXT_EMBED_URL"],
+    image_url=os.environ["CLIP_IMAGE_EMBED_URL"],
+    text_batch=getattr(settings, "EMBED_TEXT_BATCH_SIZE", 64),
+    image_batch=getattr(settings, "EMBED_IMAGE_BATCH_SIZE", 16),
+    max_in_flight=getattr(settings, "EMBED_MAX_IN_FLIGHT", 4),
+    timeout=getattr(settings, "EMBED_TIMEOUT", 30),
+    max_retries=getattr(settings, "EMBED_MAX_RETRIES", 3),
+    model_id=getattr(settings, "EMBED_MODEL_ID", None),
+    cache=(
+        EmbeddingCache(max_entries=getattr(settings, "EMBED_CACHE_MAX_ENTRIES", 100_000))
+        if getattr(settings, "EMBED_CACHE_ENABLED", True) else None
+    ),
+)
@@ -0,0 +1,108 @@
+# services/index_cache.py
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+import faiss
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def index_version(index_path):
+    """
+    Version token for a persisted index: (mtime_ns, size) of the .faiss file,
+    or None if it does not exist. Every save swaps in a new file, so a rebuild
+    in any process changes the token.
+    """
+    try:
+        st = os.stat(index_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class IndexCache:
+    """
+    Per-process LRU cache of loaded FAISS indexes and their metadata stores,
+    keyed by (pdf_id, index version) and bounded by an approximate private
+    memory budget and an entry count (each entry holds a mapping and an open
+    SQLite handle). Thread-safe; cached objects must be treated as read-only.
+    """
+    def __init__(self, max_bytes, max_entries):
+        self.max_bytes   = max_bytes
+        self.max_entries = max_entries
+        self._entries  = OrderedDict()   # (pdf_id, version) -> (index, meta_store, nbytes)
+        self._bytes    = 0
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+
+    def get(self, pdf_id, version):
+        key = (pdf_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, pdf_id, version, index, meta_store):
+        nbytes = _estimate_private_bytes(index)
+        if nbytes > self.max_bytes:
+            logger.debug(f"Index for PDF {pdf_id} ({nbytes} B) exceeds cache budget; not cached")
+            return
+        with self._lock:
+            self._drop_pdf(pdf_id)
+            self._entries[(pdf_id, version)] = (index, meta_store, nbytes)
+            self._bytes += nbytes
+            while self._entries and (
+                self._bytes > self.max_bytes or len(self._entries) > self.max_entries
+            ):
+                (old_id, _), (_, _, old_bytes) = self._entries.popitem(last=False)
+                self._bytes -= old_bytes
+                logger.debug(f"Evicted index for PDF {old_id} from cache")
+
+    def invalidate(self, pdf_id):
+        with self._lock:
+            self._drop_pdf(pdf_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries":   len(self._entries),
+                "bytes":     self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits":      self.hits,
+                "misses":    self.misses,
+            }
+
+    def _drop_pdf(self, pdf_id):
+        for key in [k for k in self._entries if k[0] == pdf_id]:
+            self._bytes -= self._entries.pop(key)[2]
+
+
+def _estimate_private_bytes(index):
+    """
+    Memory-mapped flat codes are shared page cache, not private memory; other
+    index types (or FAISS builds without zero-copy mmap) hold a private copy.
+    """
+    if type(index).__name__ in MMAP_SHARED_TYPES and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return 64 * 1024
+    if isinstance(index, faiss.IndexHNSW):
+        return index.ntotal * (index.d * 4 + index.hnsw.nb_neighbors(0) * 4)
+    if isinstance(index, faiss.IndexIVF):
+        return index.ntotal * (index.code_size + 8) + index.nlist * index.d * 4
+    return index.ntotal * index.d * 4
+
+
+MMAP_SHARED_TYPES = {"IndexFlatL2", "IndexFlatIP", "IndexFlat"}
+
+index_cache = IndexCache(
+    max_bytes=getattr(settings, "INDEX_CACHE_MAX_MB", 512) * 1024 * 1024,
+    max_entries=getattr(settings, "INDEX_CACHE_MAX_ENTRIES", 256),
+)
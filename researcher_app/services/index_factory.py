@@ -0,0 +1,206 @@
+# services/index_factory.py
+
+import math
+import logging
+
+import numpy as np
+import faiss
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FLAT = {"type": "flat"}
+
+# zero-copy mmap of flat codes needs FAISS ≥ 1.10; older builds fall back to IO_FLAG_MMAP
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def choose_params(n, d, budget_bytes=None):
+    """
+    Pick an index type for `n` vectors of dimension `d`.
+
+    - flat:   exact search; used while the collection is small (INDEX_FLAT_MAX_VECTORS)
+              and its float32 codes fit the memory budget
+    - hnsw:   graph index over full vectors; high recall, ~M*8 bytes/vector extra
+    - ivfpq:  inverted lists of product-quantized codes; `m` bytes/vector, for
+              collections whose full vectors do not fit the budget
+
+    Returns a JSON-serializable parameter dict (persisted with the index).
+    """
+    if budget_bytes is None:
+        budget_bytes = getattr(settings, "INDEX_MEMORY_BUDGET_MB", 256) * 1024 * 1024
+    flat_max = getattr(settings, "INDEX_FLAT_MAX_VECTORS", 20_000)
+
+    if n <= flat_max and estimate_bytes(FLAT, n, d) <= budget_bytes:
+        return dict(FLAT)
+
+    hnsw = {
+        "type":            "hnsw",
+        "M":               getattr(settings, "INDEX_HNSW_M", 32),
+        "ef_construction": getattr(settings, "INDEX_HNSW_EF_CONSTRUCTION", 200),
+        "ef_search":       getattr(settings, "INDEX_HNSW_EF_SEARCH", 64),
+    }
+    if estimate_bytes(hnsw, n, d) <= budget_bytes:
+        return hnsw
+
+    return ivfpq_params(n, d, getattr(settings, "INDEX_IVF_NPROBE", 16))
+
+
+def ivfpq_params(n, d, nprobe):
+    # IVF needs ~39 training points per list; 4·√n lists is the usual start
+    nlist = max(1, min(int(4 * math.sqrt(n)), n // 39))
+    return {
+        "type":   "ivfpq",
+        "nlist":  nlist,
+        "m":      _pq_subquantizers(d),
+        "nbits":  8,
+        "nprobe": min(nlist, nprobe),
+    }
+
+
+def estimate_bytes(params, n, d):
+    """
+    Approximate resident size of an index with `params` holding `n` vectors.
+    """
+    kind = params["type"]
+    if kind == "hnsw":
+        return n * (d * 4 + params["M"] * 2 * 4)
+    if kind == "ivfpq":
+        return n * (params["m"] + 8) + params["nlist"] * d * 4
+    return n * d * 4
+
+
+def build(vectors, params, ids=None):
+    """
+    Build and fill an index of the requested type from an (n, d) float32 array.
+
+    With `ids`, the index is wrapped in an IndexIDMap2 so vectors keep those
+    ids (needed once vectors have been removed from the middle).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, d = vectors.shape
+    kind = params["type"]
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, params["M"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch       = params["ef_search"]
+    elif kind == "ivfpq":
+        quantizer = faiss.IndexFlatL2(d)
+        index = faiss.IndexIVFPQ(quantizer, d, params["nlist"], params["m"], params["nbits"])
+        index.train(_training_sample(vectors, params["nlist"]))
+        index.nprobe = params["nprobe"]
+    else:
+        index = faiss.IndexFlatL2(d)
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    else:
+        index.add(vectors)
+    return index
+
+
+def search(index, params, queries, k, ids=None):
+    """
+    Search with per-call parameters, leaving the (possibly shared, cached)
+    index object untouched. HNSW's efSearch is raised to at least k.
+
+    `ids` restricts the search to those vector ids (FAISS ≥ 1.7.3; older
+    builds over-fetch and filter the results instead).
+    """
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    kind = params.get("type", "flat")
+    if not hasattr(faiss, "SearchParameters"):
+        return _search_filtered(index, queries, k, ids)
+
+    sel = faiss.IDSelectorBatch(np.asarray(ids, dtype="int64")) if ids is not None else None
+    if kind == "hnsw":
+        sp = faiss.SearchParametersHNSW(efSearch=max(params["ef_search"], k))
+    elif kind == "ivfpq":
+        sp = faiss.SearchParametersIVF(nprobe=params["nprobe"])
+    elif sel is not None:
+        sp = faiss.SearchParameters()
+    else:
+        return index.search(queries, k)
+    if sel is not None:
+        sp.sel = sel
+    return index.search(queries, k, params=sp)
+
+
+def read_flags(params):
+    """
+    faiss.read_index flags for readers: flat codes are memory-mapped (shared
+    page cache), other types are read into private memory.
+    """
+    if params.get("type", "flat") == "flat" and not params.get("id_map"):
+        return MMAP_FLAGS
+    return 0
+
+
+def is_id_map(index):
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def is_flat(index):
+    return isinstance(_inner(index), faiss.IndexFlat)
+
+
+def vectors_and_ids(index):
+    """
+    (vectors, ids) held by an index. Ids are positional unless the index is
+    id-mapped; vectors are None where codes are lossy (PQ).
+    """
+    inner = _inner(index)
+    if is_id_map(index):
+        ids = faiss.vector_to_array(index.id_map).astype("int64")
+    else:
+        ids = np.arange(index.ntotal, dtype="int64")
+    if not index.ntotal:
+        return np.empty((0, index.d), dtype="float32"), ids
+    if isinstance(inner, (faiss.IndexFlat, faiss.IndexHNSWFlat)):
+        return inner.reconstruct_n(0, inner.ntotal), ids
+    return None, ids
+
+
+def reconstruct_all(index):
+    """
+    Exact stored vectors for flat and HNSW indexes; None where codes are lossy.
+    """
+    return vectors_and_ids(index)[0]
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _inner(index):
+    return faiss.downcast_index(index.index) if is_id_map(index) else index
+
+
+def _pq_subquantizers(d):
+    # ~8 dimensions per sub-quantizer, and m must divide d
+    for m in range(max(1, d // 8), 0, -1):
+        if d % m == 0:
+            return m
+    return 1
+
+
+def _search_filtered(index, queries, k, ids):
+    if ids is None:
+        return index.search(queries, k)
+    allowed = set(int(i) for i in ids)
+    D, I = index.search(queries, min(index.ntotal, k * 10))
+    out_d = np.full((len(queries), k), np.inf, dtype="float32")
+    out_i = np.full((len(queries), k), -1, dtype="int64")
+    for row, (dists, hits) in enumerate(zip(D, I)):
+        keep = [(d, i) for d, i in zip(dists, hits) if i in allowed][:k]
+        for col, (d, i) in enumerate(keep):
+            out_d[row, col], out_i[row, col] = d, i
+    return out_d, out_i
+
+
+def _training_sample(vectors, nlist, per_list=256):
+    limit = nlist * per_list
+    if len(vectors) <= limit:
+        return vectors
+    rng = np.random.default_rng(0)
+    return vectors[rng.choice(len(vectors), size=limit, replace=False)]
@@ -0,0 +1,277 @@
+# services/ingest.py
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from researcher_app.models import UploadedPDF, ExtractedContent, ExtractedPage
+from . import pdf_extractor, pipeline, prompt_parts
+from .rag_service import RAGService
+
+logger = logging.getLogger(__name__)
+
+
+def ingest_pdf(pdf_id, file_path, progress=None, resume=False):
+    """
+    Extract a PDF page batch by page batch, committing and indexing each batch
+    as it completes so chat can answer over the pages indexed so far.
+
+    Extraction, token chunking and embedding run as concurrent pipeline stages
+    (see services/pipeline.py), so embedding requests for one batch overlap
+    extraction of the next. At most INGEST_QUEUE_DEPTH batches wait between
+    stages, which bounds memory regardless of document size. This thread owns
+    the index and the database writes.
+
+    ExtractedContent (the cleaned full text + artifact lists) is written last;
+    its presence marks the document as fully ingested.
+
+    Args:
+        pdf_id (int): UploadedPDF id
+        file_path (str): path to the PDF on disk
+        progress (callable): optional progress(stage, **counters) hook
+        resume (bool): keep pages already indexed by an interrupted run
+    """
+    report = progress or (lambda stage, **counters: None)
+
+    pdf = UploadedPDF.objects.get(id=pdf_id)
+    page_count = pdf_extractor.get_page_count(file_path)
+    UploadedPDF.objects.filter(id=pdf_id).update(page_count=page_count)
+
+    svc = RAGService(pdf_id)
+    if svc.content_ready:
+        svc.content_version += 1    # a full re-ingest is a new extraction
+    if resume:
+        done, text_pages, images, tables = _resume(pdf, svc)
+    else:
+        ExtractedPage.objects.filter(pdf=pdf).delete()
+        done, text_pages, images, tables = 0, [], [], []
+    if done:
+        logger.info(f"PDF {pdf_id}: resuming after page {done}")
+
+    batch_size = max(1, int(getattr(settings, "INGEST_BATCH_PAGES", 8)))
+    depth      = max(1, int(getattr(settings, "INGEST_QUEUE_DEPTH", 4)))
+    failed     = []
+    indexed    = done
+    extracted  = [done]   # advanced by the extraction stage
+
+    def counters():
+        return {
+            "pages_total":     page_count,
+            "pages_extracted": extracted[0],
+            "pages_indexed":   indexed,
+            "chunks_embedded": svc.index.ntotal if svc.index is not None else 0,
+            "images":          len(images),
+            "tables":          len(tables),
+        }
+
+    def extract():
+        pages = pdf_extractor.iter_pages(file_path, doc_key=pdf.sha256 or None, start_page=done)
+        for batch in _batched(pages, batch_size):
+            extracted[0] += len(batch)
+            yield batch
+
+    def chunk(batches):
+        for batch in batches:
+            yield batch, svc.prepare_pages(_for_chunking(batch))
+
+    def embed(prepared):
+        for batch, items in prepared:
+            try:
+                yield batch, svc.embed_items(*items)
+            except Exception:
+                logger.exception(
+                    f"PDF {pdf_id}: embedding pages {batch[0]['page']}-{batch[-1]['page']} failed"
+                )
+                yield batch, None
+
+    report("extracting", **counters())
+    for batch, embedded in pipeline.stream(extract(), chunk, embed, depth=depth):
+        for page in batch:
+            text_pages.append(page["text"] or f"[Page {page['page']}: no text]")
+            images.extend(page["images"])
+            tables.extend(page["tables"])
+            pdf_extractor.merge_captions(svc.catalog, page.get("captions", []))
+        if _commit_pages(pdf, svc, batch, embedded):
+            indexed += len(batch)
+        else:
+            failed.append(batch)
+        report("extracting", **counters())
+
+    # one more attempt for batches whose embedding failed (e.g. a transient 5xx);
+    # pages that still fail stay is_indexed=False and the document is finished anyway
+    report("indexing", **counters())
+    for batch in failed:
+        try:
+            svc.add_pages(_for_chunking(batch), persist=True)
+        except Exception:
+            logger.exception(
+                f"PDF {pdf_id}: pages {batch[0]['page']}-{batch[-1]['page']} could not be indexed; skipped"
+            )
+            continue
+        _mark_indexed(pdf, batch)
+        indexed += len(batch)
+
+    report("finalizing", **counters())
+    if svc.optimize_index():
+        svc.save_index()
+    prompt_parts.cache.warm(images, tables)
+    ExtractedContent.objects.update_or_create(
+        pdf=pdf,
+        defaults={
+            "text":    pdf_extractor.clean_pages(text_pages),
+            "images":  images,
+            "tables":  tables,
+            "catalog": svc.catalog,
+            "version": svc.content_version,
+        }
+    )
+    report("done", **counters())
+    logger.info(f"Ingested PDF {pdf_id}: {len(text_pages)} pages")
+
+
+def reextract_pdf(pdf_id, file_path):
+    """
+    Re-run extraction for an already ingested PDF and diff-update its index:
+    pages are chunked exactly as during ingestion, so unchanged chunks keep
+    their vectors and only changed ones are re-embedded (RAGService.reindex).
+    The index is saved under the new extraction version before
+    ExtractedContent (and the copies held by duplicate uploads) is updated
+    to it.
+
+    Returns:
+        (ExtractedContent, {"kept", "removed", "added"})
+    """
+    pdf = UploadedPDF.objects.get(id=pdf_id)
+    svc = RAGService(pdf_id)
+    version = svc.content_version + 1 if svc.content_ready else 1
+
+    pages = list(pdf_extractor.iter_pages(file_path, doc_key=pdf.sha256 or None))
+    catalog = {}
+    for p in pages:
+        pdf_extractor.merge_captions(catalog, p.get("captions", []))
+    stats = svc.reindex(*svc.prepare_pages(_for_chunking(pages)), version=version, catalog=catalog)
+    prompt_parts.cache.warm(
+        [i for p in pages for i in p["images"]],
+        [t for p in pages for t in p["tables"]],
+    )
+
+    with transaction.atomic():
+        ExtractedPage.objects.filter(pdf=pdf).delete()
+        ExtractedPage.objects.bulk_create([
+            ExtractedPage(pdf=pdf, page_number=p["page"], text=p["text"], is_indexed=True)
+            for p in pages
+        ])
+        UploadedPDF.objects.filter(id=pdf_id).update(page_count=len(pages))
+        content, _ = ExtractedContent.objects.update_or_create(
+            pdf=pdf,
+            defaults={
+                "text":    pdf_extractor.clean_pages(
+                    [p["text"] or f"[Page {p['page']}: no text]" for p in pages]
+                ),
+                "images":  [i for p in pages for i in p["images"]],
+                "tables":  [t for p in pages for t in p["tables"]],
+                "catalog": catalog,
+                "version": version,
+            }
+        )
+        # duplicate uploads keep a copy of the original's extraction
+        ExtractedContent.objects.filter(pdf__duplicate_of=pdf).update(
+            text=content.text, images=content.images, tables=content.tables,
+            catalog=content.catalog, version=version,
+        )
+    return content, stats
+
+
+def _resume(pdf, svc):
+    """
+    Pick up after a crash: keep the contiguous prefix of pages whose vectors
+    made it into the persisted index and drop anything after it.
+
+    Returns:
+        (pages_done, text_pages, images, tables)
+    """
+    rows = ExtractedPage.objects.filter(pdf=pdf, is_indexed=True).values_list("page_number", "text")
+    done  = 0
+    texts = []
+    for number, text in rows:
+        if number != done + 1:
+            break
+        done = number
+        texts.append(text or f"[Page {number}: no text]")
+
+    if not done or not svc.index_exists():
+        ExtractedPage.objects.filter(pdf=pdf).delete()
+        return 0, [], [], []
+
+    svc._load_index(cached=False)
+    svc.truncate_after_page(done)
+    svc.catalog = {
+        kind: {n: e for n, e in entries.items() if e["page"] <= done}
+        for kind, entries in svc.catalog.items()
+    }
+    ExtractedPage.objects.filter(pdf=pdf, page_number__gt=done).delete()
+
+    images = [
+        {"page": m.get("page"), "path": m["path"]}
+        for m in svc.metadatas if m and m["type"] == "image" and m.get("path")
+    ]
+    tables = [
+        {"page": m.get("page"), "path": m["url"]}
+        for m in svc.metadatas if m and m["type"] == "table" and m.get("url")
+    ]
+    return done, texts, images, tables
+
+
+def _commit_pages(pdf, svc, batch, embedded):
+    """
+    Persist a batch of pages and append its embedded items to the index.
+    Returns False if indexing failed (the page text is still saved).
+    """
+    ExtractedPage.objects.bulk_create([
+        ExtractedPage(pdf=pdf, page_number=p["page"], text=p["text"])
+        for p in batch
+    ], ignore_conflicts=True)
+    if embedded is None:
+        return False
+
+    try:
+        svc.insert(*embedded)
+        if svc.index is not None:
+            svc.save_index()
+    except Exception:
+        logger.exception(
+            f"PDF {pdf.id}: indexing pages {batch[0]['page']}-{batch[-1]['page']} failed"
+        )
+        return False
+    _mark_indexed(pdf, batch)
+    return True
+
+
+def _for_chunking(pages):
+    """
+    Copies of `pages` with hyphenation fixed and whitespace collapsed, the
+    form they are chunked and indexed in. The pages keep the extractor's
+    line breaks, which clean_pages needs to drop running headers/footers.
+    """
+    return [
+        {**p, "text": pdf_extractor.normalize_whitespace(pdf_extractor.fix_hyphenation(p["text"]))}
+        for p in pages
+    ]
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _mark_indexed(pdf, batch):
+    ExtractedPage.objects.filter(
+        pdf=pdf, page_number__in=[p["page"] for p in batch]
+    ).update(is_indexed=True)
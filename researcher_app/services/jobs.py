@@ -0,0 +1,295 @@
+# services/jobs.py
+
+import time
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from researcher_app.models import UploadedPDF, ExtractedContent, BackgroundJob
+from . import ingest, corpus, drafting, digest
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(kind, pdf=None, **payload):
+    """
+    Add a job to the durable queue; `manage.py run_ingest_workers` picks it up.
+    """
+    return BackgroundJob.objects.create(
+        kind=kind,
+        pdf=pdf,
+        payload=payload,
+        max_attempts=getattr(settings, "JOB_MAX_ATTEMPTS", 3),
+    )
+
+
+def claim_next(worker_id):
+    """
+    Atomically claim the oldest runnable job.
+
+    Uses SELECT … FOR UPDATE SKIP LOCKED where the database supports it
+    (Postgres); the conditional UPDATE keeps SQLite single-claim as well.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            BackgroundJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status="queued", run_after__lte=now)
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = BackgroundJob.objects.filter(pk=job.pk, status="queued").update(
+            status="running",
+            locked_by=worker_id,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            heartbeat_at=now,
+            stage="",
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """
+    Run a claimed job, recording stage timings, and mark it succeeded,
+    re-queued with backoff, or failed.
+    """
+    handler  = HANDLERS[job.kind]
+    reporter = _Reporter(job)
+    started  = time.monotonic()
+    try:
+        handler(job, reporter)
+    except Exception as e:
+        reporter.close()
+        _record_failure(job, e, time.monotonic() - started)
+        return False
+
+    reporter.close()
+    job.timings["run"] = round(time.monotonic() - started, 3)
+    BackgroundJob.objects.filter(pk=job.pk).update(
+        status="succeeded",
+        stage="done",
+        error="",
+        timings=job.timings,
+        finished_at=timezone.now(),
+    )
+    logger.info(f"Job {job.id} ({job.kind}) succeeded in {job.timings['run']}s")
+    return True
+
+
+def work_loop(worker_id, stop, poll_interval=2.0, burst=False):
+    """
+    Claim and run jobs until `stop` is set (or, in burst mode, the queue is empty).
+    """
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            job = claim_next(worker_id)
+        except Exception:
+            logger.exception(f"{worker_id}: failed to claim a job")
+            job = None
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        logger.info(f"{worker_id}: running job {job.id} ({job.kind}, attempt {job.attempts})")
+        run_job(job)
+    close_old_connections()
+
+
+def heartbeat(worker_prefix):
+    """
+    Mark this worker's running jobs as alive.
+    """
+    BackgroundJob.objects.filter(
+        status="running", locked_by__startswith=worker_prefix
+    ).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale():
+    """
+    Recover jobs whose worker died (no heartbeat for JOB_STALE_AFTER seconds):
+    re-queue them for a resumed attempt, or fail them once out of attempts.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "JOB_STALE_AFTER", 300))
+    stale  = BackgroundJob.objects.filter(status="running", heartbeat_at__lt=cutoff)
+    for job in stale:
+        if job.attempts < job.max_attempts:
+            updated = BackgroundJob.objects.filter(pk=job.pk, status="running").update(
+                status="queued", locked_by="", run_after=timezone.now(),
+                error="Worker stopped sending heartbeats; re-queued",
+            )
+        else:
+            updated = BackgroundJob.objects.filter(pk=job.pk, status="running").update(
+                status="failed", locked_by="", finished_at=timezone.now(),
+                error="Worker stopped sending heartbeats",
+            )
+        if updated:
+            logger.warning(f"Recovered stale job {job.id} (attempt {job.attempts})")
+
+
+def ingest_status(pdf_id):
+    """
+    Compact parse status for a PDF: stage, percentage and counters only
+    (never the extracted text). Returns None if the PDF does not exist.
+    """
+    pdf = UploadedPDF.objects.filter(pk=pdf_id).only("id", "page_count").first()
+    if pdf is None:
+        return None
+
+    ready = ExtractedContent.objects.filter(pdf_id=pdf_id).exists()
+    job = (
+        BackgroundJob.objects
+        .filter(pdf_id=pdf_id, kind="ingest")
+        .only("status", "stage", "progress", "error", "attempts")
+        .order_by("-id")
+        .first()
+    )
+    progress = dict(job.progress) if job else {}
+    total    = progress.get("pages_total") or pdf.page_count or 0
+    indexed  = progress.get("pages_indexed", 0)
+
+    if ready:
+        stage, pct = "ready", 100
+    elif job is None:
+        stage, pct = "pending", 0
+    elif job.status == "failed":
+        stage, pct = "failed", 0
+    elif job.status == "queued":
+        stage, pct = "queued", 0
+    elif job.stage == "finalizing":
+        stage, pct = job.stage, 95
+    else:
+        # the last 10% is reserved for the indexing/finalizing stages
+        stage = job.stage or "starting"
+        pct   = int(90 * indexed / total) if total else 0
+
+    return {
+        "pdf_id":          pdf_id,
+        "stage":           stage,
+        "progress":        pct,
+        "ready":           ready,
+        "page_count":      total or None,
+        "pages_extracted": progress.get("pages_extracted", total if ready else 0),
+        "pages_indexed":   indexed if not ready else max(indexed, total),
+        "chunks_embedded": progress.get("chunks_embedded", 0),
+        "images":          progress.get("images", 0),
+        "tables":          progress.get("tables", 0),
+        "attempts":        job.attempts if job else 0,
+        "error":           (job.error.strip().splitlines() or [""])[-1] if job and job.status == "failed" else "",
+    }
+
+
+# ─────── Handlers ─────────────────────────────────────────────────────────────
+
+def _run_ingest(job, report):
+    # later attempts resume from the pages an interrupted run already indexed
+    ingest.ingest_pdf(job.pdf_id, job.pdf.file.path, progress=report, resume=job.attempts > 1)
+    # corpus search picks the document up once it is fully indexed;
+    # outline/description prompts use the digest once it is built
+    enqueue("corpus", pdf=job.pdf)
+    enqueue("digest", pdf=job.pdf)
+
+
+def _run_corpus_add(job, report):
+    report("indexing")
+    if job.payload.get("replace"):
+        # re-extraction: drop the stale copy first (a no-op on retries)
+        corpus.remove_document(job.pdf_id)
+    added = corpus.add_document(job.pdf_id)
+    report("done", chunks_embedded=added)
+
+
+def _run_digest(job, report):
+    digest.build(job.pdf_id, progress=report)
+    report("done")
+
+
+def _run_draft(job, report):
+    drafting.draft_outline(
+        job.payload["outline_id"],
+        preferred=job.payload.get("preferred", "openai"),
+        progress=report,
+    )
+    report("done")
+
+
+HANDLERS = {
+    "ingest": _run_ingest,
+    "corpus": _run_corpus_add,
+    "draft":  _run_draft,
+    "digest": _run_digest,
+}
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+class _Reporter:
+    """
+    progress(stage, **counters) hook handed to job handlers; persists the
+    current stage, counters and per-stage durations on the job row.
+    """
+    def __init__(self, job):
+        self.job         = job
+        self.stage       = None
+        self.stage_start = None
+        job.timings = dict(job.timings or {})
+        job.timings["queued"] = round((job.started_at - job.created_at).total_seconds(), 3)
+
+    def __call__(self, stage, **counters):
+        self._close_stage()
+        self.stage       = stage
+        self.stage_start = time.monotonic()
+        self.job.progress = {**(self.job.progress or {}), **counters}
+        BackgroundJob.objects.filter(pk=self.job.pk).update(
+            stage=stage,
+            progress=self.job.progress,
+            timings=self.job.timings,
+            heartbeat_at=timezone.now(),
+        )
+
+    def close(self):
+        self._close_stage()
+
+    def _close_stage(self):
+        if self.stage is not None and self.stage_start is not None:
+            elapsed = time.monotonic() - self.stage_start
+            key = f"stage:{self.stage}"
+            self.job.timings[key] = round(self.job.timings.get(key, 0) + elapsed, 3)
+            self.stage_start = None
+
+
+def _record_failure(job, exc, elapsed):
+    err = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))[-4000:]
+    job.timings["run"] = round(elapsed, 3)
+    if job.attempts < job.max_attempts:
+        delay = getattr(settings, "JOB_RETRY_BACKOFF", 30) * 2 ** (job.attempts - 1)
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status="queued",
+            locked_by="",
+            error=err,
+            timings=job.timings,
+            run_after=timezone.now() + timedelta(seconds=delay),
+        )
+        logger.warning(f"Job {job.id} failed (attempt {job.attempts}); retrying in {delay}s: {exc}")
+    else:
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status="failed",
+            locked_by="",
+            error=err,
+            timings=job.timings,
+            finished_at=timezone.now(),
+        )
+        logger.error(f"Job {job.id} failed permanently after {job.attempts} attempts: {exc}")
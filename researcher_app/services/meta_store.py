@@ -0,0 +1,211 @@
+# services/meta_store.py
+
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    id    INTEGER PRIMARY KEY,   -- FAISS vector id
+    type  TEXT NOT NULL,
+    page  INTEGER,
+    data  TEXT NOT NULL          -- full metadata dict as JSON
+);
+CREATE TABLE IF NOT EXISTS refs (
+    kind   TEXT NOT NULL,        -- "figure" | "table"
+    number INTEGER NOT NULL,
+    id     INTEGER NOT NULL      -- vector id of a chunk mentioning it
+);
+CREATE INDEX IF NOT EXISTS refs_kind_number ON refs (kind, number);
+CREATE TABLE IF NOT EXISTS info (
+    key   TEXT PRIMARY KEY,      -- e.g. "index": type and parameters of the .faiss file
+    value TEXT NOT NULL          -- JSON
+);
+"""
+
+# BM25 inverted index over text/table chunks; rowid = vector id
+LEXICAL_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS lex USING fts5(content, tokenize='porter unicode61');
+"""
+
+MAX_QUERY_TERMS = 32
+
+
+class MetaStore:
+    """
+    SQLite sidecar holding one metadata row per vector id, next to the .faiss
+    file. Looking up the k hits of a search is an indexed O(k) query instead of
+    parsing the whole metadata list, and the file pages are shared between
+    gunicorn workers through the OS page cache.
+    """
+    def __init__(self, path):
+        self.path  = path
+        self._lock = threading.Lock()
+        self._info = None
+        self._conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    @staticmethod
+    def write(path, metadatas, info=None):
+        """
+        Write a complete store to a temp file and atomically swap it in.
+        A list position is the vector id; None marks a removed vector.
+        `info` is a dict of JSON-serializable values stored alongside, plus
+        "next_id" (the length of the list, removed ids included).
+        """
+        tmp = path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.executescript(SCHEMA)
+            conn.executemany(
+                "INSERT INTO meta (id, type, page, data) VALUES (?, ?, ?, ?)",
+                (
+                    (i, m.get("type"), m.get("page"), json.dumps(m))
+                    for i, m in enumerate(metadatas) if m is not None
+                )
+            )
+            conn.executemany(
+                "INSERT INTO refs (kind, number, id) VALUES (?, ?, ?)",
+                (
+                    (kind, n, i)
+                    for i, m in enumerate(metadatas) if m is not None
+                    for kind, numbers in (m.get("refs") or {}).items()
+                    for n in numbers
+                )
+            )
+            conn.executemany(
+                "INSERT INTO info (key, value) VALUES (?, ?)",
+                ((k, json.dumps(v)) for k, v in {**(info or {}), "next_id": len(metadatas)}.items())
+            )
+            try:
+                conn.executescript(LEXICAL_SCHEMA)
+                conn.executemany(
+                    "INSERT INTO lex (rowid, content) VALUES (?, ?)",
+                    (
+                        (i, m["content"])
+                        for i, m in enumerate(metadatas)
+                        if m is not None and m.get("content")
+                    )
+                )
+            except sqlite3.OperationalError:
+                logger.warning("SQLite was built without FTS5; lexical search disabled")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, path)
+
+    @classmethod
+    def from_legacy_json(cls, path, json_path):
+        """
+        One-off conversion of an old `.meta` JSON list into a store.
+        """
+        with open(json_path) as f:
+            metadatas = json.load(f)
+        cls.write(path, metadatas)
+        logger.info(f"Converted {json_path} to {path}")
+        return cls(path)
+
+    def get_many(self, ids):
+        """
+        Metadata dicts for `ids`, in the same order (None for unknown ids).
+        """
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, data FROM meta WHERE id IN ({placeholders})", list(ids)
+            ).fetchall()
+        found = {i: json.loads(data) for i, data in rows}
+        return [found.get(i) for i in ids]
+
+    def search_text(self, query, limit=20):
+        """
+        BM25-ranked vector ids for a free-text query (any term may match).
+
+        Returns:
+            [(id, score)], best first (FTS5 bm25 scores: lower is better)
+        """
+        terms = re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+        with self._lock:
+            try:
+                return self._conn.execute(
+                    "SELECT rowid, bm25(lex) FROM lex WHERE lex MATCH ? ORDER BY bm25(lex) LIMIT ?",
+                    (match, limit)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                # store written before the lexical index existed, or no FTS5
+                return []
+
+    def ids_referencing(self, kind, number):
+        """
+        Ids of chunks that mention figure/table `number`, in document order.
+        """
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    "SELECT id FROM refs WHERE kind = ? AND number = ? ORDER BY id",
+                    (kind, number)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [i for (i,) in rows]
+
+    def ids_where(self, field, values):
+        """
+        Vector ids whose metadata `field` is one of `values`.
+        """
+        if not values:
+            return []
+        placeholders = ",".join("?" * len(values))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM meta WHERE json_extract(data, '$.' || ?) IN ({placeholders})",
+                [field, *values]
+            ).fetchall()
+        return [i for (i,) in rows]
+
+    def all(self):
+        """
+        Metadata list indexed by vector id (None where a vector was removed),
+        as long as the list that was written, so removed trailing ids still
+        occupy their slots.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM meta ORDER BY id").fetchall()
+        size = max(self.info().get("next_id", 0), rows[-1][0] + 1 if rows else 0)
+        out  = [None] * size
+        for i, data in rows:
+            out[i] = json.loads(data)
+        return out
+
+    def info(self):
+        # a store is never modified after it is written, so this is memoized
+        if self._info is None:
+            with self._lock:
+                try:
+                    rows = self._conn.execute("SELECT key, value FROM info").fetchall()
+                except sqlite3.OperationalError:
+                    # stores written before the info table existed
+                    rows = []
+            self._info = {k: json.loads(v) for k, v in rows}
+        return self._info
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
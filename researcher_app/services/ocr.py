@@ -0,0 +1,145 @@
+# services/ocr.py
+
+import os
+import math
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz                       # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from django.conf import settings
+
+# One tesseract process per page is already parallel; keep each one single-threaded
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# OCR text cache under MEDIA_ROOT/ocr_cache/, keyed by rendered-page hash
+CACHE_DIR = os.path.join(settings.MEDIA_ROOT, "ocr_cache")
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+MIN_DPI = 150
+MAX_DPI = 400
+
+logger = logging.getLogger(__name__)
+
+_pool      = None
+_pool_lock = threading.Lock()
+
+
+def ocr_pages(pdf_path, page_numbers) -> dict:
+    """
+    OCR a batch of (text-less) pages.
+
+    All pages are rasterized in a single pass over one PyMuPDF document; each
+    raster is handed to a bounded tesseract pool as soon as it is rendered.
+    Results are cached by the hash of the rendered page, so re-extracting an
+    unchanged document never re-runs tesseract.
+
+    Args:
+        pdf_path (str): path to the PDF
+        page_numbers (list[int]): 1-based page numbers to OCR
+
+    Returns:
+        dict: {page_number: text}
+    """
+    results = {}
+    if not page_numbers:
+        return results
+
+    futures = {}
+    try:
+        with fitz.open(pdf_path) as doc:
+            for page_num in page_numbers:
+                try:
+                    page = doc.load_page(page_num - 1)
+                    dpi  = adaptive_dpi(page.rect)
+                    pix  = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+                except Exception:
+                    logger.exception(f"Page {page_num}: rasterization failed")
+                    continue
+
+                key    = hashlib.sha256(pix.samples).hexdigest()
+                cached = _cache_get(key)
+                if cached is not None:
+                    logger.debug(f"Page {page_num}: OCR cache hit")
+                    results[page_num] = cached
+                    continue
+
+                img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+                futures[page_num] = (key, _get_pool().submit(_run_tesseract, img))
+                logger.debug(f"Page {page_num}: queued for OCR at {dpi} DPI")
+    except Exception:
+        logger.exception("OCR rasterization pass failed")
+
+    for page_num, (key, fut) in futures.items():
+        try:
+            text = fut.result()
+            _cache_put(key, text)
+            results[page_num] = text
+            logger.debug(f"Page {page_num}: OCR extracted {len(text)} chars")
+        except Exception:
+            logger.exception(f"Page {page_num}: OCR extraction failed")
+
+    return results
+
+
+def adaptive_dpi(rect):
+    """
+    Pick a DPI that renders the page to roughly settings.OCR_TARGET_PIXELS,
+    clamped to [MIN_DPI, MAX_DPI]. A US-letter page lands near 300 DPI while
+    posters and slides are rendered at a lower resolution.
+    """
+    target  = getattr(settings, "OCR_TARGET_PIXELS", 8_500_000)
+    area_in = (rect.width / 72.0) * (rect.height / 72.0)
+    if area_in <= 0:
+        return 300
+    dpi = int(math.sqrt(target / area_in))
+    return max(MIN_DPI, min(MAX_DPI, dpi))
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = getattr(settings, "OCR_WORKERS", os.cpu_count() or 1)
+            _pool = ThreadPoolExecutor(max_workers=max(1, int(workers)),
+                                       thread_name_prefix="ocr")
+        return _pool
+
+
+def _run_tesseract(img):
+    return pytesseract.image_to_string(img).strip()
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.txt")
+
+
+def _cache_get(key):
+    path = _cache_path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.exception(f"Failed to read OCR cache entry {path}")
+        return None
+
+
+def _cache_put(key, text):
+    path = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except Exception:
+        logger.exception(f"Failed to write OCR cache entry {path}")
@@ -3,6 +3,7 @@
 import json
 import re
 from .api_handler import call_llm
+from . import context_cache
 
 def _response_to_text(resp) -> str:
     """
@@ -36,21 +37,26 @@ def _response_to_text(resp) -> str:
     except Exception:
         return ""
 
-def generate_outline(full_text, preferred="gemini"):
+def generate_outline(full_text, preferred="gemini", fresh=False):
     """
     Generates a professional blog outline from extracted text.
 
     Args:
-        full_text (str): Cleaned text extracted from a PDF.
+        full_text (str | PaperContext): Cleaned text extracted from a PDF, or
+            its digest (services.digest) for long papers; or a
+            context_cache.PaperContext sent ahead of the prompt.
         preferred (str): "gemini" or "openai" (default Gemini).
+        fresh (bool): Ask for a new outline instead of a cached one.
 
     Returns:
         dict: Outline JSON with sections and descriptions.
     """
+    full_text, paper = context_cache.split(full_text)
     prompt = f"""
 You are a technical blog writing assistant.
 
-Given the following text extracted from a PDF, generate a professional blog outline.
+Given the following text extracted from a PDF (or, for long papers, a digest
+summarizing it section by section), generate a professional blog outline.
 The outline should include 5–10 sections with concise titles and 1–2 sentence descriptions.
 Add subheadings if appropriate. Return the result as JSON:
 {{
@@ -62,11 +68,11 @@ Add subheadings if appropriate. Return the result as JSON:
 TEXT:
 {full_text}
 """
-    response = call_llm(prompt, preferred=preferred)
+    response = call_llm(prompt, preferred=preferred, cache=True, fresh=fresh, context=paper)
     return _parse_llm_response(response)
 
 
-def refine_outline(outline_json, user_changes, preferred="gemini"):
+def refine_outline(outline_json, user_changes, preferred="gemini", paper_digest=None):
     """
     Applies user-requested changes to an existing outline using an LLM.
 
@@ -74,10 +80,15 @@ def refine_outline(outline_json, user_changes, preferred="gemini"):
         outline_json (dict): Current outline JSON.
         user_changes (str): User freeform edit instructions.
         preferred (str): "gemini" or "openai" (default Gemini).
+        paper_digest (str): Digest of the paper, so edits can draw on its content.
 
     Returns:
         dict: Updated outline JSON.
     """
+    paper_section = ""
+    if paper_digest:
+        paper_section = f"For reference, a digest of the paper:\n{paper_digest}\n\n"
+
     edit_prompt = f"""
 You are an AI assistant refining a blog outline.
 
@@ -87,7 +98,7 @@ Here is the current outline:
 The user provided these edit instructions:
 \"\"\"{user_changes}\"\"\"
 
-Apply these changes to the outline and return updated JSON:
+{paper_section}Apply these changes to the outline and return updated JSON:
 {{
   "sections": [
     {{"title": "...", "description": "..."}}
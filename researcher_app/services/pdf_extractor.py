@@ -1,37 +1,40 @@
 # services/pdf_extractor.py
 
 import os
-import io
 import tempfile
 import logging
-from collections import Counter
+import multiprocessing
+from collections import Counter, deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 
 import fitz                       # PyMuPDF
 import pdfplumber
-import pytesseract
-from pdf2image import convert_from_path
-from PIL import Image
 import pandas as pd
 import re
 
 from django.conf import settings
 
-# Output directories under MEDIA_ROOT/outputs/
-SAVE_DIR    = os.path.join(settings.MEDIA_ROOT, "outputs")
-IMAGES_DIR  = os.path.join(SAVE_DIR, "extracted_images")
-TABLES_DIR  = os.path.join(SAVE_DIR, "extracted_tables")
-os.makedirs(IMAGES_DIR, exist_ok=True)
-os.makedirs(TABLES_DIR, exist_ok=True)
+from . import ocr
+from .artifact_store import ArtifactStore, file_sha256
 
 logger = logging.getLogger(__name__)
 
 
-def extract_pdf(file_or_path) -> dict:
+def extract_pdf(file_or_path, workers=None, doc_key=None) -> dict:
     """
     Extract text (with MuPDF/pdfplumber/OCR fallback), images, and tables from a PDF.
 
+    Large documents are sharded into page ranges and extracted in a process
+    pool; each worker opens its own fitz/pdfplumber handles and the results
+    are merged back in page order. Text-less pages are OCR'd in batches
+    (see services/ocr.py).
+
     Args:
         file_or_path: path to PDF (str) or file-like object with .read()
+        workers (int): number of extraction processes
+                       (default settings.PDF_EXTRACT_WORKERS; 1 = in-process)
+        doc_key (str): artifact namespace (default: SHA-256 of the PDF bytes)
 
     Returns:
         {
@@ -62,23 +65,152 @@ def extract_pdf(file_or_path) -> dict:
     text_pages = []
     images = []
     tables = []
+    catalog = {}
+
+    try:
+        # 2. Extract every page (text, images, tables), merged in page order
+        for page in iter_pages(pdf_path, workers=workers, doc_key=doc_key):
+            text_pages.append(page["text"] or f"[Page {page['page']}: no text]")
+            images.extend(page["images"])
+            tables.extend(page["tables"])
+            merge_captions(catalog, page.get("captions", []))
+        logger.debug(
+            f"Extracted {len(text_pages)} pages, {len(images)} images, {len(tables)} tables"
+        )
+
+        # 3. Clean the full text
+        cleaned_text = clean_pages(text_pages)
+        logger.debug(f"Cleaned text length = {len(cleaned_text)}")
+
+        return {
+            "text":    cleaned_text,
+            "images":  images,
+            "tables":  tables,
+            "catalog": catalog,
+        }
+
+    finally:
+        if cleanup_temp and os.path.exists(pdf_path):
+            try:
+                os.remove(pdf_path)
+                logger.debug(f"Deleted temp PDF {pdf_path}")
+            except Exception:
+                logger.exception(f"Failed to delete temp PDF {pdf_path}")
+
+
+def iter_pages(pdf_path, workers=None, pages_per_task=None, doc_key=None, start_page=0):
+    """
+    Yield per-page extraction results in page order.
+
+    Page ranges are sharded across a process pool when the document is large
+    enough to amortize worker start-up; otherwise pages are extracted in-process.
+    Images and tables are written to the document's ArtifactStore namespace.
+    `start_page` (0-based) skips pages already handled, e.g. when resuming.
+
+    Yields:
+        {"page": int, "text": str, "images": [...], "tables": [...]}
+    """
+    page_count = get_page_count(pdf_path)
+    if not page_count:
+        return
+    if doc_key is None:
+        doc_key = file_sha256(pdf_path)
 
+    if workers is None:
+        workers = getattr(settings, "PDF_EXTRACT_WORKERS", 1)
+    if pages_per_task is None:
+        pages_per_task = getattr(settings, "PDF_EXTRACT_PAGES_PER_TASK", 16)
+    workers        = max(1, int(workers or 1))
+    pages_per_task = max(1, int(pages_per_task))
+
+    if start_page >= page_count:
+        return
+
+    ranges = [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(start_page, page_count, pages_per_task)
+    ]
+
+    if workers == 1 or len(ranges) == 1:
+        for start, stop in ranges:
+            yield from _ocr_empty_pages(pdf_path, _extract_page_range(pdf_path, start, stop, doc_key))
+        return
+
+    # "spawn" keeps workers independent of the parent's threads and open handles
+    ctx = multiprocessing.get_context("spawn")
+    workers = min(workers, len(ranges))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # keep a bounded window of ranges in flight so finished-but-unconsumed
+        # results cannot pile up when the consumer is slower than extraction
+        pending = deque()
+        todo    = iter(ranges)
+        for start, stop in islice(todo, 2 * workers):
+            pending.append((start, stop, pool.submit(_extract_page_range, pdf_path, start, stop, doc_key)))
+        while pending:
+            start, stop, fut = pending.popleft()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append((*nxt, pool.submit(_extract_page_range, pdf_path, *nxt, doc_key)))
+            try:
+                pages = fut.result()
+            except Exception:
+                logger.exception(f"Pages {start + 1}-{stop}: worker failed, retrying in-process")
+                pages = _extract_page_range(pdf_path, start, stop, doc_key)
+            yield from _ocr_empty_pages(pdf_path, pages)
+
+
+def _ocr_empty_pages(pdf_path, pages):
+    """
+    Fill in text for pages that MuPDF and pdfplumber left empty, using one
+    batched OCR pass per page range.
+    """
+    empty = [p["page"] for p in pages if not p["text"]]
+    if empty:
+        ocr_text = ocr.ocr_pages(pdf_path, empty)
+        for p in pages:
+            if not p["text"]:
+                p["text"] = ocr_text.get(p["page"], "")
+    return pages
+
+
+def get_page_count(pdf_path):
+    """
+    Number of pages according to PyMuPDF (0 if the file cannot be opened).
+    """
     try:
-        # 2. Open with PyMuPDF
-        try:
-            doc = fitz.open(pdf_path)
+        with fitz.open(pdf_path) as doc:
             page_count = doc.page_count
-            logger.debug(f"Opened PDF with {page_count} pages via PyMuPDF")
-        except Exception:
-            logger.exception("Failed to open PDF with PyMuPDF")
-            page_count = 0
-
-        # 3. Extract text per page
-        for i in range(page_count):
-            page_num = i + 1
+        logger.debug(f"Opened PDF with {page_count} pages via PyMuPDF")
+        return page_count
+    except Exception:
+        logger.exception("Failed to open PDF with PyMuPDF")
+        return 0
+
+
+def _extract_page_range(pdf_path, start, stop, doc_key):
+    """
+    Extract pages [start, stop) (0-based). Runs inside pool workers, so it opens
+    its own document handles and returns plain picklable data.
+    """
+    results = []
+    store   = ArtifactStore(doc_key)
+    pl      = None
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception:
+        logger.exception(f"Pages {start + 1}-{stop}: failed to open PDF with PyMuPDF")
+        return [{"page": i + 1, "text": "", "images": [], "tables": [], "captions": []}
+                for i in range(start, stop)]
+
+    try:
+        for i in range(start, stop):
+            page_num  = i + 1
             page_text = ""
+            images    = []
+            tables    = []
+            captions  = []
 
-            # 3.1) MuPDF text
+            # 1) MuPDF text
             try:
                 page = doc.load_page(i)
                 page_text = page.get_text().strip()
@@ -86,86 +218,177 @@ def extract_pdf(file_or_path) -> dict:
             except Exception:
                 logger.exception(f"Page {page_num}: MuPDF text extraction failed")
 
-            # 3.2) pdfplumber fallback
-            if not page_text:
+            # 2) pdfplumber handle is shared by the text fallback and the table pass
+            if pl is None:
                 try:
-                    with pdfplumber.open(pdf_path) as pl:
-                        pl_page = pl.pages[i]
-                        page_text = (pl_page.extract_text() or "").strip()
-                    logger.debug(f"Page {page_num}: pdfplumber extracted {len(page_text)} chars")
+                    pl = pdfplumber.open(pdf_path)
                 except Exception:
-                    logger.exception(f"Page {page_num}: pdfplumber extraction failed")
+                    logger.exception(f"Pages {start + 1}-{stop}: pdfplumber open failed")
+                    pl = False
+            pl_page = pl.pages[i] if pl else None
 
-            # 3.3) OCR fallback at 300 DPI
-            if not page_text:
+            # 2.1) pdfplumber text fallback
+            if not page_text and pl_page is not None:
                 try:
-                    img = convert_from_path(
-                        pdf_path, dpi=300,
-                        first_page=page_num, last_page=page_num
-                    )[0]
-                    page_text = pytesseract.image_to_string(img).strip()
-                    logger.debug(f"Page {page_num}: OCR extracted {len(page_text)} chars")
+                    page_text = (pl_page.extract_text() or "").strip()
+                    logger.debug(f"Page {page_num}: pdfplumber extracted {len(page_text)} chars")
                 except Exception:
-                    logger.exception(f"Page {page_num}: OCR extraction failed")
-
-            text_pages.append(page_text or f"[Page {page_num}: no text]")
+                    logger.exception(f"Page {page_num}: pdfplumber extraction failed")
 
-        # 4. Clean the full text
-        #    remove common headers/footers, fix hyphens, normalize whitespace
-        cleaned_str  = remove_headers_footers(text_pages)
-        cleaned_str  = fix_hyphenation(cleaned_str)
-        cleaned_text = normalize_whitespace(cleaned_str)
-        logger.debug(f"Cleaned text length = {len(cleaned_text)}")
+            # (pages still empty here are OCR'd in a batch by iter_pages)
 
-        # 5. Extract images (PyMuPDF)
-        for i in range(page_count):
-            page_num = i + 1
+            # 3) Images (PyMuPDF raw bytes, content-addressed)
             try:
-                for img_index, img in enumerate(doc[i].get_images(full=True), start=1):
-                    xref       = img[0]
-                    base       = doc.extract_image(xref)
-                    img_bytes  = base["image"]
-                    ext        = base["ext"]
-                    pil_img    = Image.open(io.BytesIO(img_bytes))
-                    filename   = f"page{page_num}_img{img_index}.{ext}"
-                    path       = os.path.join(IMAGES_DIR, filename)
-                    pil_img.save(path)
-                    images.append({"page": page_num, "path": path})
-                logger.debug(f"Page {page_num}: total images so far = {len(images)}")
+                seen = set()
+                for img in doc[i].get_images(full=True):
+                    path = store.put_image(doc, img[0])
+                    if path not in seen:
+                        seen.add(path)
+                        rects = doc[i].get_image_rects(img[0])
+                        images.append({
+                            "page": page_num,
+                            "path": path,
+                            "bbox": _bbox(rects[0]) if rects else None,
+                        })
+                logger.debug(f"Page {page_num}: {len(images)} images")
             except Exception:
                 logger.exception(f"Page {page_num}: image extraction failed")
 
-        # 6. Extract tables (pdfplumber)
-        try:
-            with pdfplumber.open(pdf_path) as pl:
-                for i, pl_page in enumerate(pl.pages):
-                    for tbl_idx, table in enumerate(pl_page.extract_tables() or [], start=1):
-                        df = pd.DataFrame(table[1:], columns=table[0])
-                        filename = f"table_p{i+1}_{tbl_idx}.csv"
-                        path     = os.path.join(TABLES_DIR, filename)
-                        df.to_csv(path, index=False)
-                        tables.append({"page": i + 1, "path": path})
-                logger.debug(f"Extracted {len(tables)} tables in total")
-        except Exception:
-            logger.exception("Table extraction via pdfplumber failed")
-
-        return {
-            "text":   cleaned_text,
-            "images": images,
-            "tables": tables,
-        }
+            # 4) Tables (pdfplumber)
+            if pl_page is not None:
+                try:
+                    for found in pl_page.find_tables():
+                        table = found.extract()
+                        if not table:
+                            continue
+                        df   = pd.DataFrame(table[1:], columns=table[0])
+                        path = store.put_table(df)
+                        tables.append({"page": page_num, "path": path, "bbox": _bbox(found.bbox)})
+                except Exception:
+                    logger.exception(f"Page {page_num}: table extraction failed")
 
-    finally:
-        if cleanup_temp and os.path.exists(pdf_path):
+            # 5) Figure/table captions, tied to the nearest artifact on the page
             try:
-                os.remove(pdf_path)
-                logger.debug(f"Deleted temp PDF {pdf_path}")
+                captions = find_captions(doc[i], page_num, images, tables)
             except Exception:
-                logger.exception(f"Failed to delete temp PDF {pdf_path}")
+                logger.exception(f"Page {page_num}: caption detection failed")
+
+            results.append({
+                "page":     page_num,
+                "text":     page_text,
+                "images":   images,
+                "tables":   tables,
+                "captions": captions,
+            })
+    finally:
+        doc.close()
+        if pl:
+            pl.close()
+
+    return results
+
+
+# ─────── Figure / table catalog ───────────────────────────────────────────────
+
+# "Figure 3: …", "Fig. 3. …", "Table 2 | …"; body text such as "Figure 3 shows"
+# has no punctuation after the number and only counts next to an artifact
+CAPTION_RE = re.compile(r"^\s*(fig(?:ure)?|tab(?:le)?)\.?\s*(\d+)\s*([:.|\u2013\u2014-])?", re.I)
+REF_RE = {
+    "figure": re.compile(r"\bfig(?:ure)?s?\.?\s*(\d+)\b", re.I),
+    "table":  re.compile(r"\btables?\.?\s*(\d+)\b", re.I),
+}
+
+
+def find_captions(page, page_num, images, tables):
+    """
+    Detect figure/table captions among the page's text blocks and match each
+    to the closest image (figures) or table (tables) on the same page.
+
+    Returns:
+        [{"kind", "number", "caption", "page", "bbox", "path"}]  (path None if
+        no artifact is close enough, e.g. vector-drawn figures)
+    """
+    max_gap  = page.rect.height / 3
+    captions = []
+    used     = set()
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+        if block_type != 0:
+            continue
+        m = CAPTION_RE.match(text)
+        if not m:
+            continue
+        kind      = "figure" if m.group(1).lower().startswith("fig") else "table"
+        bbox      = [x0, y0, x1, y1]
+        artifacts = images if kind == "figure" else tables
+        near = min(
+            (a for a in artifacts if a.get("bbox") and a["path"] not in used),
+            key=lambda a: _vertical_gap(a["bbox"], bbox),
+            default=None,
+        )
+        if near is not None and _vertical_gap(near["bbox"], bbox) > max_gap:
+            near = None
+        if near is None and not m.group(3):
+            continue
+        if near is not None:
+            used.add(near["path"])
+        captions.append({
+            "kind":    kind,
+            "number":  int(m.group(2)),
+            "caption": " ".join(text.split())[:500],
+            "page":    page_num,
+            "bbox":    _bbox(bbox),
+            "path":    near["path"] if near else None,
+        })
+    return captions
+
+
+def merge_captions(catalog, captions):
+    """
+    Add captions to a catalog {"figure": {"3": entry}, "table": {...}} (JSON
+    keys). The first caption per number wins, unless a later one has an
+    artifact and the first did not.
+    """
+    for c in captions:
+        slot = catalog.setdefault(c["kind"], {})
+        old  = slot.get(str(c["number"]))
+        if old is None or (old.get("path") is None and c.get("path")):
+            slot[str(c["number"])] = c
+    return catalog
+
+
+def find_refs(text):
+    """
+    Figure/table numbers mentioned in a chunk: {"figure": [1, 3], "table": [2]}.
+    """
+    refs = {}
+    for kind, pattern in REF_RE.items():
+        numbers = sorted({int(n) for n in pattern.findall(text)})
+        if numbers:
+            refs[kind] = numbers
+    return refs
+
+
+def _vertical_gap(a, b):
+    return max(0.0, b[1] - a[3], a[1] - b[3])
+
+
+def _bbox(rect):
+    return [round(float(v), 1) for v in rect]
 
 
 # ─────── Helpers ──────────────────────────────────────────────────────────────
 
+def clean_pages(text_pages):
+    """
+    Remove common headers/footers, fix hyphens, normalize whitespace.
+    """
+    if not text_pages:
+        return ""
+    cleaned_str = remove_headers_footers(text_pages)
+    cleaned_str = fix_hyphenation(cleaned_str)
+    return normalize_whitespace(cleaned_str)
+
+
 def remove_headers_footers(pages, threshold=0.5):
     """
     Removes lines common to most pages (headers/footers).
@@ -0,0 +1,89 @@
+# services/pipeline.py
+
+import queue
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def stream(source, *stages, depth=4):
+    """
+    Run a chain of generator stages concurrently.
+
+    `source` is an iterable; each stage is a callable taking an iterable and
+    returning an iterable (usually a generator expression). The source and
+    every stage run in their own thread, connected by queues holding at most
+    `depth` items, so a slow consumer stalls its producers instead of letting
+    results pile up. Results of the last stage are yielded in order in the
+    calling thread; an exception in any stage is re-raised here.
+
+        for result in stream(pages, chunk, embed, depth=4):
+            insert(result)
+    """
+    stop = threading.Event()
+    it   = _background(source, depth, stop, "pipeline-source")
+    for n, stage in enumerate(stages, 1):
+        it = _background(stage(it), depth, stop, f"pipeline-stage-{n}")
+    try:
+        yield from it
+    finally:
+        stop.set()
+
+
+def _background(iterable, depth, stop, name):
+    """
+    Drive `iterable` in a daemon thread; return a generator over its items.
+    """
+    q = queue.Queue(maxsize=max(1, depth))
+
+    def run():
+        try:
+            for item in iterable:
+                if not _put(q, (None, item), stop):
+                    return
+        except BaseException as e:
+            _put(q, (e, None), stop)
+            return
+        finally:
+            # stops an abandoned upstream generator (and any pool it owns)
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    logger.debug(f"{name}: error closing upstream", exc_info=True)
+            connections.close_all()
+        _put(q, (None, _END), stop)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+
+    def consume():
+        while True:
+            try:
+                exc, item = q.get(timeout=0.5)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if exc is not None:
+                raise exc
+            if item is _END:
+                return
+            yield item
+
+    return consume()
+
+
+def _put(q, entry, stop):
+    while not stop.is_set():
+        try:
+            q.put(entry, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
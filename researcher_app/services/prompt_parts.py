@@ -0,0 +1,186 @@
+# services/prompt_parts.py
+
+import io
+import os
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+import pandas as pd
+from PIL import Image
+from django.conf import settings
+
+from .artifact_store import SAVE_DIR, _atomic_write
+
+# Prepared parts live under MEDIA_ROOT/outputs/parts/<h[:2]>/<h>.<ext>, keyed by
+# the content hash of the source artifact (table → .md, image → .png/.jpg)
+PARTS_DIR = os.path.join(SAVE_DIR, "parts")
+
+MIME_TYPES = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp"}
+HEX64 = re.compile(r"^[0-9a-f]{64}$")
+
+logger = logging.getLogger(__name__)
+
+
+class PromptPartCache:
+    """
+    Ready-to-send prompt parts for tables and images.
+
+    Parts are prepared once per artifact (at ingest, see warm()) and written
+    next to the artifact store: tables as pre-rendered markdown, images
+    downscaled to PROMPT_IMAGE_MAX_SIDE with their real MIME type. Each
+    process keeps an LRU of parts in memory, bounded by PROMPT_PART_CACHE_MB,
+    so a follow-up question about the same figure costs a dict lookup.
+    Thread-safe.
+    """
+    def __init__(self, max_bytes, image_max_side=1024, table_rows=5):
+        self.max_bytes      = max_bytes
+        self.image_max_side = image_max_side
+        self.table_rows     = table_rows
+        self._entries = OrderedDict()     # (kind, source) -> (value, nbytes)
+        self._bytes   = 0
+        self._lock    = threading.Lock()
+        self.hits     = 0
+        self.misses   = 0
+
+    # ─── Public API ──────────────────────────────────────────────────────────
+    def table(self, source):
+        """
+        Markdown for the first rows of a table CSV.
+        """
+        return self._get("table", source, self._load_table)
+
+    def image(self, source):
+        """
+        (bytes, mime_type) for an image path or http(s) URL.
+        """
+        return self._get("image", source, self._load_image)
+
+    def warm(self, images=(), tables=()):
+        """
+        Prepare the on-disk parts for a document's artifacts (run at ingest).
+        Does not fill this process's memory cache.
+        """
+        for item in tables:
+            path = item.get("path")
+            if path:
+                try:
+                    self._load_table(path)
+                except Exception:
+                    logger.exception(f"Could not prepare table part for {path}")
+        for item in images:
+            path = item.get("path")
+            if path:
+                try:
+                    self._load_image(path)
+                except Exception:
+                    logger.exception(f"Could not prepare image part for {path}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries":   len(self._entries),
+                "bytes":     self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits":      self.hits,
+                "misses":    self.misses,
+            }
+
+    # ─── Internals ───────────────────────────────────────────────────────────
+    def _get(self, kind, source, load):
+        key = (kind, source)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value  = load(source)
+        nbytes = len(value[0]) if kind == "image" else len(value.encode("utf-8"))
+        if nbytes <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (value, nbytes)
+                    self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, (_, old_bytes) = self._entries.popitem(last=False)
+                    self._bytes -= old_bytes
+        return value
+
+    def _load_table(self, source):
+        derived = _derived_path(source, "md")
+        if derived and os.path.exists(derived):
+            with open(derived, encoding="utf-8") as f:
+                return f.read()
+
+        df = pd.read_csv(source).head(self.table_rows)
+        try:
+            md = df.to_markdown(index=False)
+        except ImportError:
+            md = df.to_csv(index=False)
+        if derived:
+            _atomic_write(derived, md.encode("utf-8"))
+        return md
+
+    def _load_image(self, source):
+        if source.startswith("http"):
+            return self._downscale(requests.get(source, timeout=30).content)
+
+        for ext in ("jpg", "png"):
+            derived = _derived_path(source, ext)
+            if derived and os.path.exists(derived):
+                with open(derived, "rb") as f:
+                    return f.read(), MIME_TYPES[ext]
+
+        with open(source, "rb") as f:
+            data, mime = self._downscale(f.read())
+        derived = _derived_path(source, "png" if mime == "image/png" else "jpg")
+        if derived and mime in ("image/png", "image/jpeg"):
+            _atomic_write(derived, data)
+        return data, mime
+
+    def _downscale(self, raw):
+        """
+        Shrink to image_max_side; keep PNG for images with transparency,
+        JPEG otherwise. Small images in a supported format pass through.
+        """
+        img = Image.open(io.BytesIO(raw))
+        fmt = (img.format or "").lower()
+        if max(img.size) <= self.image_max_side and fmt in MIME_TYPES:
+            return raw, MIME_TYPES[fmt]
+
+        img.thumbnail((self.image_max_side, self.image_max_side))
+        out = io.BytesIO()
+        if img.mode in ("RGBA", "LA", "P"):
+            img.save(out, format="PNG", optimize=True)
+            return out.getvalue(), "image/png"
+        img.convert("RGB").save(out, format="JPEG", quality=85)
+        return out.getvalue(), "image/jpeg"
+
+
+# ─────── Helpers ──────────────────────────────────────────────────────────────
+
+def _derived_path(source, ext):
+    """
+    Path of a prepared part. Artifact-store files are named by their content
+    hash; other files are keyed by path and modification time.
+    """
+    stem = os.path.splitext(os.path.basename(source))[0]
+    if not HEX64.match(stem):
+        try:
+            st = os.stat(source)
+        except OSError:
+            return None
+        stem = hashlib.sha256(f"{os.path.abspath(source)}:{st.st_mtime_ns}".encode()).hexdigest()
+    return os.path.join(PARTS_DIR, stem[:2], f"{stem}.{ext}")
+
+
+cache = PromptPartCache(
+    max_bytes=getattr(settings, "PROMPT_PART_CACHE_MB", 64) * 1024 * 1024,
+    image_max_side=getattr(settings, "PROMPT_IMAGE_MAX_SIDE", 1024),
+)
@@ -4,28 +4,28 @@ import os
 import io
 import re
 import json
-import base64
-import requests
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import faiss
-import tiktoken
 
 from django.conf import settings
-from researcher_app.models import ExtractedContent
-from google import genai
+from researcher_app.models import UploadedPDF, ExtractedContent, ExtractedPage
+from .index_cache import index_cache, index_version
+from .meta_store import MetaStore
+from . import embeddings, pipeline, index_factory, pdf_extractor, prompt_parts
+from .api_handler import call_llm
+from .tokens import tokenizer
 from google.genai import types
 
-# ─── CONFIG & CLIENTS ─────────────────────────────────────────────────────────
-TEXT_EMBED_URL  = os.environ["CLIP_TEXT_EMBED_URL"]
-IMAGE_EMBED_URL = os.environ["CLIP_IMAGE_EMBED_URL"]
-GEMINI_API_KEY  = os.environ["GEMINI_API_KEY"]
+logger = logging.getLogger(__name__)
 
-EMBED_HEADERS   = {"Content-Type": "application/json"}
-gemini_client   = genai.Client(api_key=GEMINI_API_KEY)
-
-# ─── TOKENIZER & CHUNKING ─────────────────────────────────────────────────────
-tokenizer = tiktoken.get_encoding("cl100k_base")
+# ─── CHUNKING ─────────────────────────────────────────────────────────────────
 def chunk_text(txt, max_toks=500, overlap=100):
     toks = tokenizer.encode(txt)
     return [
@@ -34,21 +34,64 @@ def chunk_text(txt, max_toks=500, overlap=100):
     ]
 
 # ─── EMBEDDING HELPERS ────────────────────────────────────────────────────────
-def embed_text_chunks(chunks):
-    resp = requests.post(TEXT_EMBED_URL, json={"texts": chunks}, headers=EMBED_HEADERS)
-    resp.raise_for_status()
-    return resp.json()["embeddings"]
+def embed_text_chunks(chunks, allow_partial=False):
+    return embeddings.client.embed_texts(chunks, allow_partial=allow_partial)
 
 def embed_image(path_or_url):
-    if path_or_url.startswith("http"):
-        bts = requests.get(path_or_url).content
+    return embeddings.client.embed_images([path_or_url])[0]
+
+def _table_chunk(tbl):
+    path = tbl.get("url") or tbl.get("path")
+    if path:
+        df = pd.read_csv(path)
     else:
-        with open(path_or_url, "rb") as f:
-            bts = f.read()
-    b64 = base64.b64encode(bts).decode()
-    resp = requests.post(IMAGE_EMBED_URL, json={"images": [b64]}, headers=EMBED_HEADERS)
-    resp.raise_for_status()
-    return resp.json()["embeddings"][0]
+        raw = tbl.get("data") or tbl.get("csv")
+        df = pd.read_csv(io.StringIO(raw)) if raw else pd.DataFrame()
+
+    snippet = (
+        df.head(5).to_json(orient="records")
+        if not df.empty
+        else json.dumps({"columns": list(df.columns)})
+    )
+    return {
+        "type":    "table",
+        "content": f"Table p{tbl.get('page','?')}: {snippet}",
+        "page":    tbl.get("page"),
+        "url":     path
+    }
+
+def _item_key(meta):
+    # identity of an indexed item across extractions (artifact paths are content-addressed)
+    ident = {k: meta.get(k) for k in ("type", "content", "page", "url", "path")}
+    return hashlib.sha256(json.dumps(ident, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _take(counter, meta):
+    key = _item_key(meta)
+    if counter[key] > 0:
+        counter[key] -= 1
+        return True
+    return False
+
+# ─── QUERY EMBEDDING (deadline + cool-down) ───────────────────────────────────
+RRF_K = 60                 # reciprocal-rank fusion constant
+_query_pool_state = {"pid": None, "pool": None}
+_embed_down_until = 0.0
+_query_lock = threading.Lock()
+
+def _query_pool():
+    # thread pools do not survive fork(): rebuild per process
+    with _query_lock:
+        if _query_pool_state["pid"] != os.getpid():
+            _query_pool_state["pool"] = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-query")
+            _query_pool_state["pid"]  = os.getpid()
+        return _query_pool_state["pool"]
+
+def _embedding_up():
+    return time.monotonic() >= _embed_down_until
+
+def _mark_embedding_down():
+    global _embed_down_until
+    _embed_down_until = time.monotonic() + getattr(settings, "EMBED_DOWN_COOLDOWN", 30)
 
 # ─── MODALITY DETECTION ───────────────────────────────────────────────────────
 def detect_modality(query):
@@ -61,135 +104,480 @@ def detect_modality(query):
 # ─── RAG SERVICE ───────────────────────────────────────────────────────────────
 class RAGService:
     def __init__(self, pdf_id):
-        ec = ExtractedContent.objects.get(pdf__id=pdf_id)
-        self.full_text   = ec.text
-        self.table_items = ec.tables
-        self.image_items = ec.images
+        # one small query; the extracted text/artifact lists are loaded lazily
+        # because retrieval over a persisted index never needs them
+        duplicate_of_id, content_id, content_version = (
+            UploadedPDF.objects.filter(id=pdf_id)
+            .values_list("duplicate_of_id", "content__id", "content__version").get()
+        )
+        self.pdf_id    = pdf_id
+        self.source_id = duplicate_of_id or pdf_id
+
+        # extraction may still be running: only pages indexed so far are searchable
+        self.content_ready = content_id is not None
+        self._content      = None
 
-        # persistence directory and paths
+        # extraction version the index should reflect (persisted with the index)
+        self.content_version = content_version or 1
+
+        # persistence directory and paths (duplicate uploads share the original's index)
         idx_dir = os.path.join(settings.MEDIA_ROOT, "indices")
         os.makedirs(idx_dir, exist_ok=True)
-        self.index_path = os.path.join(idx_dir, f"pdf_{pdf_id}.faiss")
+        self.index_path = os.path.join(idx_dir, f"pdf_{self.source_id}.faiss")
+        self.meta_path  = self.index_path + ".meta.sqlite"
 
-        self.index     = None
-        self.metadatas = None
+        # writers hold the full metadata list; readers look hits up in the store
+        self.index        = None
+        self.index_params = dict(index_factory.FLAT)
+        self.metadatas    = None
+        self.meta_store   = None
+        self.catalog      = {}      # figure/table captions (writers; readers use the store)
+
+    @property
+    def full_text(self):
+        return self._load_content()["text"]
+
+    @property
+    def table_items(self):
+        return self._load_content()["tables"]
+
+    @property
+    def image_items(self):
+        return self._load_content()["images"]
+
+    def _load_content(self):
+        if self._content is None:
+            self._content = (
+                ExtractedContent.objects.filter(pdf__id=self.pdf_id)
+                .values("text", "images", "tables", "catalog").first()
+            ) or {"text": "", "images": [], "tables": [], "catalog": {}}
+        return self._content
 
     def index_exists(self):
         return os.path.isfile(self.index_path)
 
+    def coverage(self):
+        """
+        How much of the document is searchable right now.
+        """
+        if self.content_ready:
+            return {"pages_indexed": None, "page_count": None, "complete": True}
+        page_count = (
+            UploadedPDF.objects.filter(id=self.source_id)
+            .values_list("page_count", flat=True).first()
+        )
+        pages_indexed = ExtractedPage.objects.filter(
+            pdf_id=self.source_id, is_indexed=True
+        ).count()
+        return {
+            "pages_indexed": pages_indexed,
+            "page_count":    page_count,
+            "complete":      self.content_ready,
+        }
+
     def build_index(self, persist=False):
-        # ─── Text chunks ─────────────────────────────────────────────
-        text_chunks = chunk_text(self.full_text)
-        text_vecs   = embed_text_chunks(text_chunks)
-
-        # ─── Table chunks ────────────────────────────────────────────
-        table_chunks = []
-        for tbl in self.table_items:
-            path = tbl.get("url") or tbl.get("path")
-            if path:
-                df = pd.read_csv(path)
-            else:
-                raw = tbl.get("data") or tbl.get("csv")
-                df = pd.read_csv(io.StringIO(raw)) if raw else pd.DataFrame()
+        """
+        (Re)build the index from the stored full text and artifact lists.
+        Chunk groups are embedded in a background stage while earlier groups
+        are inserted, with at most INGEST_QUEUE_DEPTH groups in flight.
+        """
+        self.index     = None
+        self.metadatas = []
+        self.catalog   = self._load_content()["catalog"] or {}
+        group  = embeddings.client.text_batch * embeddings.client.max_in_flight
+        chunks = chunk_text(self.full_text)
+        work   = [
+            ([{"type": "text", "content": c} for c in chunks[i:i + group]], [], [])
+            for i in range(0, len(chunks), group)
+        ]
+        work.append(([], self.table_items, self.image_items))
 
-            snippet = (
-                df.head(5).to_json(orient="records")
-                if not df.empty
-                else json.dumps({"columns": list(df.columns)})
-            )
-            table_chunks.append({
-                "content": f"Table p{tbl.get('page','?')}: {snippet}",
-                "page":    tbl.get("page"),
-                "url":     path
-            })
-
-        table_vecs = (
-            embed_text_chunks([t["content"] for t in table_chunks])
-            if table_chunks else []
+        embedded = pipeline.stream(
+            work,
+            lambda items: (self.embed_items(*self.prepare(*w)) for w in items),
+            depth=getattr(settings, "INGEST_QUEUE_DEPTH", 4),
         )
+        for metas, vecs in embedded:
+            self.insert(metas, vecs)
+        self.optimize_index()
+        if persist and self.index is not None:
+            self.save_index()
 
-        # ─── Image chunks ────────────────────────────────────────────
-        image_vecs = [
-            embed_image(img.get("url") or img.get("path"))
-            for img in self.image_items
-            if img.get("url") or img.get("path")
+    def add_pages(self, pages, persist=False):
+        """
+        Chunk, embed and append a batch of freshly extracted pages.
+
+        Args:
+            pages: [{"page": int, "text": str, "images": [...], "tables": [...]}]
+        """
+        self.insert(*self.embed_items(*self.prepare_pages(pages)))
+        if persist and self.index is not None:
+            self.save_index()
+
+    # The three steps below are split so a pipeline can run them in separate
+    # threads: prepare (CPU) → embed_items (network) → insert (index owner only).
+    def prepare_pages(self, pages):
+        """
+        Token-chunk a batch of pages; returns (text_like_metas, image_metas).
+        """
+        text_metas = [
+            {"type": "text", "content": c, "page": p["page"]}
+            for p in pages if p.get("text")
+            for c in chunk_text(p["text"])
         ]
+        tables = [t for p in pages for t in p.get("tables", [])]
+        images = [i for p in pages for i in p.get("images", [])]
+        return self.prepare(text_metas, tables, images)
 
-        # ─── Assemble metadata & vectors ────────────────────────────
-        self.metadatas = []
-        for c in text_chunks:
-            self.metadatas.append({"type":"text", "content":c})
-        for t in table_chunks:
-            self.metadatas.append({
-                "type":"table",
-                "content":t["content"],
-                "page":   t["page"],
-                "url":    t["url"]
-            })
-        for img in self.image_items:
-            self.metadatas.append({
-                "type":"image",
+    def prepare(self, text_metas, table_items, image_items):
+        table_metas = [_table_chunk(tbl) for tbl in table_items]
+        # figure/table numbers each chunk mentions (looked up by retrieve)
+        for m in text_metas + table_metas:
+            refs = pdf_extractor.find_refs(m["content"])
+            if refs:
+                m["refs"] = refs
+        image_metas = [
+            {
+                "type": "image",
                 "page": img.get("page"),
-                "url":  img.get("url")
-            })
+                "url":  img.get("url"),
+                "path": img.get("path"),
+            }
+            for img in image_items if img.get("url") or img.get("path")
+        ]
+        return text_metas + table_metas, image_metas
 
-        all_vecs = np.vstack([
-            np.array(text_vecs,  dtype="float32"),
-            np.array(table_vecs, dtype="float32") if table_vecs else np.empty((0, len(text_vecs[0]))),
-            np.array(image_vecs, dtype="float32") if image_vecs else np.empty((0, len(text_vecs[0])))
-        ])
+    def embed_items(self, text_like, image_metas):
+        """
+        Embed prepared items; returns (metas, float32 vectors) for the inputs
+        that could be embedded. Does not touch the index.
+        """
+        # ─── Text + table chunks (one batched pass) ──────────────────
+        text_vecs = embed_text_chunks([m["content"] for m in text_like], allow_partial=True)
 
-        idx = faiss.IndexFlatL2(all_vecs.shape[1])
-        idx.add(all_vecs)
-        self.index = idx
+        # ─── Image chunks ────────────────────────────────────────────
+        image_vecs = embeddings.client.embed_images(
+            [m["url"] or m["path"] for m in image_metas], allow_partial=True
+        )
 
-        if persist:
-            faiss.write_index(idx, self.index_path)
-            with open(self.index_path + ".meta", "w") as f:
-                json.dump(self.metadatas, f)
+        # ─── Assemble metadata & vectors (skip inputs that failed) ───
+        pairs = [
+            (m, v)
+            for m, v in zip(text_like + image_metas, text_vecs + image_vecs)
+            if v is not None
+        ]
+        dropped = len(text_like) + len(image_metas) - len(pairs)
+        if dropped and not pairs:
+            raise embeddings.EmbeddingError(f"none of {dropped} items could be embedded")
+        if dropped:
+            logger.warning(f"PDF {self.source_id}: {dropped} items could not be embedded")
+        return [m for m, _ in pairs], np.array([v for _, v in pairs], dtype="float32")
 
-    def _load_index(self):
-        self.index = faiss.read_index(self.index_path)
-        with open(self.index_path + ".meta") as f:
-            self.metadatas = json.load(f)
+    def insert(self, metas, vecs):
+        if self.metadatas is None:
+            self.metadatas = []
+        if not metas:
+            return
+        if self.index is None:
+            self.index = faiss.IndexFlatL2(vecs.shape[1])
+        if index_factory.is_id_map(self.index):
+            start = len(self.metadatas)
+            self.index.add_with_ids(vecs, np.arange(start, start + len(metas), dtype="int64"))
+        else:
+            self.index.add(vecs)
+        self.metadatas.extend(metas)
+
+    def remove(self, ids):
+        """
+        Remove vectors by id. The index becomes id-mapped (IndexIDMap2) so the
+        remaining vectors keep their ids: a reader holding the previous index
+        with the new metadata only ever finds removed ids missing, never
+        pointing at the wrong chunk.
+        """
+        if not ids:
+            return
+        if not index_factory.is_id_map(self.index):
+            vecs, live = index_factory.vectors_and_ids(self.index)
+            self.index = index_factory.build(vecs, index_factory.FLAT, ids=live)
+        self.index.remove_ids(np.asarray(ids, dtype="int64"))
+        for i in ids:
+            self.metadatas[i] = None
+
+    def reindex(self, text_like, image_metas, version, catalog=None):
+        """
+        Bring the index in line with a new extraction (`version`): chunks whose
+        content is unchanged keep their vectors, stale ones are removed, and
+        only new ones are embedded. The result is saved as one new version.
+
+        Args:
+            text_like, image_metas: output of prepare() / prepare_pages()
+            catalog: figure/table catalog of the new extraction
+
+        Returns:
+            {"kept": int, "removed": int, "added": int}
+        """
+        if self.index_exists():
+            self._load_index(cached=False)
+        else:
+            self.index, self.metadatas = None, []
+        if catalog is not None:
+            self.catalog = catalog
+
+        wanted = Counter(_item_key(m) for m in text_like + image_metas)
+        stale  = []
+        for i, m in enumerate(self.metadatas):
+            if m is None:
+                continue
+            key = _item_key(m)
+            if wanted[key] > 0:
+                wanted[key] -= 1
+            else:
+                stale.append(i)
+        fresh_text  = [m for m in text_like   if _take(wanted, m)]
+        fresh_image = [m for m in image_metas if _take(wanted, m)]
+
+        self.remove(stale)
+        added = 0
+        if fresh_text or fresh_image:
+            metas, vecs = self.embed_items(fresh_text, fresh_image)
+            self.insert(metas, vecs)
+            added = len(metas)
+        self.content_version = version
+        self.optimize_index()
+        self.save_index()
+
+        stats = {
+            "kept":    sum(m is not None for m in self.metadatas) - added,
+            "removed": len(stale),
+            "added":   added,
+        }
+        logger.info(f"PDF {self.source_id}: re-indexed as version {version}: {stats}")
+        return stats
+
+    def optimize_index(self):
+        """
+        Re-pack a completed flat index into the type index_factory picks for
+        its size (HNSW / IVF-PQ for large documents). Appends always go to a
+        flat index; call this once the document is fully indexed.
+        Returns True if the index was replaced.
+        """
+        if self.index is None or not index_factory.is_flat(self.index):
+            return False
+        params = index_factory.choose_params(self.index.ntotal, self.index.d)
+        if params["type"] == self.index_params["type"]:
+            return False
+        vecs, ids = index_factory.vectors_and_ids(self.index)
+        self.index        = index_factory.build(vecs, params, ids if index_factory.is_id_map(self.index) else None)
+        self.index_params = params
+        logger.info(f"PDF {self.source_id}: {self.index.ntotal} vectors packed as {params}")
+        return True
+
+    def _make_mutable(self):
+        """
+        Turn a loaded HNSW / IVF-PQ index back into a flat one so it can be
+        appended to and truncated. HNSW stores exact vectors; PQ codes are
+        lossy, so those items are re-embedded (served by the embedding cache).
+        """
+        if index_factory.is_flat(self.index):
+            return
+        vecs, ids = index_factory.vectors_and_ids(self.index)
+        if vecs is None:
+            live = [m for m in self.metadatas if m is not None]
+            pos  = {id(m): i for i, m in enumerate(self.metadatas) if m is not None}
+            metas, vecs = self.embed_items(
+                [m for m in live if m["type"] != "image"],
+                [m for m in live if m["type"] == "image"],
+            )
+            ids = np.array([pos[id(m)] for m in metas], dtype="int64")
+            for i in set(pos.values()) - set(ids.tolist()):
+                self.metadatas[i] = None     # could not be re-embedded
+        mapped = index_factory.is_id_map(self.index) or len(ids) != len(self.metadatas)
+        self.index        = index_factory.build(vecs, index_factory.FLAT, ids if mapped else None)
+        self.index_params = dict(index_factory.FLAT)
+
+    def truncate_after_page(self, page):
+        """
+        Drop everything appended for pages after `page` (used when resuming an
+        interrupted ingest; vectors are appended in page order).
+        """
+        keep = len(self.metadatas)
+        for i, m in enumerate(self.metadatas):
+            if m is not None and (m.get("page") or 0) > page:
+                keep = i
+                break
+        if keep < len(self.metadatas):
+            self.index.remove_ids(np.arange(keep, len(self.metadatas), dtype="int64"))
+        self.metadatas = self.metadatas[:keep]
+
+    def save_index(self):
+        """
+        Persist index + metadata. Each file is swapped in atomically, metadata
+        first, so a concurrent reader never sees vectors without metadata.
+        """
+        params = {**self.index_params, "id_map": index_factory.is_id_map(self.index)}
+        MetaStore.write(self.meta_path, self.metadatas, info={
+            "index":           params,
+            "content_version": self.content_version,
+            "catalog":         self.catalog,
+        })
+        faiss.write_index(self.index, self.index_path + ".tmp")
+        os.replace(self.index_path + ".tmp", self.index_path)
+        index_cache.invalidate(self.source_id)
+        self.meta_store = None      # a reader store opened earlier is now out of date
+
+    def _load_index(self, cached=True):
+        """
+        Load the persisted index.
+
+        Readers (cached=True) memory-map flat indexes and open the SQLite
+        metadata store, so vectors and metadata live in the shared OS page
+        cache, and keep both in the process-wide cache while the on-disk
+        version is unchanged. Writers (cached=False) get a private, mutable
+        flat copy and the full metadata list.
+        """
+        version = index_version(self.index_path)
+        if not cached:
+            store = self._open_meta_store()
+            self.metadatas    = store.all()
+            self.index_params = store.info().get("index", dict(index_factory.FLAT))
+            self.catalog      = store.info().get("catalog", {})
+            store.close()
+            self.index = faiss.read_index(self.index_path)
+            self._make_mutable()
+            return
+
+        hit = index_cache.get(self.source_id, version)
+        if hit is not None:
+            self.index, self.meta_store = hit
+        else:
+            self.meta_store = self._open_meta_store()
+            params = self.meta_store.info().get("index", index_factory.FLAT)
+            self.index = faiss.read_index(self.index_path, index_factory.read_flags(params))
+            index_cache.put(self.source_id, version, self.index, self.meta_store)
+        self.index_params = self.meta_store.info().get("index", dict(index_factory.FLAT))
+
+    def index_is_stale(self):
+        """
+        True if the loaded index was built from an older extraction than the
+        current ExtractedContent.
+        """
+        store = self.meta_store
+        if store is None:
+            return False
+        return store.info().get("content_version", 1) < self.content_version
+
+    def refresh_index(self):
+        """
+        Diff-update a stale index from the stored extraction (see reindex()).
+        """
+        chunks = [{"type": "text", "content": c} for c in chunk_text(self.full_text)]
+        return self.reindex(
+            *self.prepare(chunks, self.table_items, self.image_items),
+            version=self.content_version,
+            catalog=self._load_content()["catalog"] or {},
+        )
+
+    def _open_meta_store(self):
+        legacy = self.index_path + ".meta"
+        if not os.path.exists(self.meta_path) and os.path.exists(legacy):
+            return MetaStore.from_legacy_json(self.meta_path, legacy)
+        return MetaStore(self.meta_path)
+
+    def _lookup(self, ids):
+        if self.metadatas is not None:
+            return [self.metadatas[i] if i < len(self.metadatas) else None for i in ids]
+        return self.meta_store.get_many(ids)
 
     def retrieve(self, query, k=3):
         if self.index is None:
-            if self.index_exists():
+            if index_version(self.index_path) is not None:
                 self._load_index()
-            else:
+                if self.content_ready and self.index_is_stale():
+                    self.refresh_index()
+            elif self.content_ready:
                 self.build_index(persist=True)
+            else:
+                return []
+
+        mode, num = detect_modality(query)
+        if mode in ("figure", "table"):
+            hits = self._reference_hits(mode, num, k)
+            if hits:
+                return hits
 
-        qv, = embed_text_chunks([query])
-        D, I = self.index.search(np.array([qv], dtype="float32"), k*5)
+        return self._hybrid_search(query, k)
 
-        raw = []
-        for dist, idx in zip(D[0], I[0]):
-            if idx < len(self.metadatas):
-                raw.append({"distance": float(dist), **self.metadatas[idx]})
+    def _reference_hits(self, kind, number, k):
+        """
+        "Figure N" / "Table N" questions: the caption and artifact from the
+        catalog built at ingest, plus the first k chunks that mention it.
+        Index lookups only; no search.
+        """
+        if self.metadatas is not None:
+            catalog = self.catalog
+            ids = [
+                i for i, m in enumerate(self.metadatas)
+                if m is not None and number in (m.get("refs") or {}).get(kind, [])
+            ]
+        else:
+            catalog = self.meta_store.info().get("catalog", {})
+            ids = self.meta_store.ids_referencing(kind, number)
 
-        mode, num = detect_modality(query)
-        if mode == "figure":
-            hits = [
-                h for h in raw
-                if h["type"]=="text" and re.search(fr'\bfig(?:ure)?\.?\s*{num}\b', h["content"], re.I)
-            ][:k]
-            if 1 <= num <= len(self.image_items):
-                img = self.image_items[num-1]
-                hits.append({"type":"image","page":img.get("page"),"url":img.get("url")})
-            return hits
-
-        if mode == "table":
-            hits = [
-                h for h in raw
-                if h["type"]=="text" and re.search(fr'\btable\.?\s*{num}\b', h["content"], re.I)
-            ][:k]
-            if 1 <= num <= len(self.table_items):
-                tbl = self.table_items[num-1]
-                hits.append({"type":"table","page":tbl.get("page"),"url":tbl.get("url")})
-            return hits
-
-        return raw[:k]
+        hits = [m for m in self._lookup(ids[:k]) if m is not None]
+        entry = catalog.get(kind, {}).get(str(number))
+        if entry:
+            hits.insert(0, {"type": "text", "page": entry["page"], "content": entry["caption"]})
+            if entry.get("path"):
+                hits.append({
+                    "type":    "image" if kind == "figure" else "table",
+                    "page":    entry["page"],
+                    "path":    entry["path"],
+                    "caption": entry["caption"],
+                })
+        return hits
+
+    def _hybrid_search(self, query, n):
+        """
+        Top `n` items by reciprocal-rank fusion of BM25 (SQLite FTS5 in the
+        metadata sidecar) and vector hits. The query is embedded in the
+        background under RETRIEVE_EMBED_TIMEOUT while the lexical search runs;
+        if the embedding service is slow or down, results are lexical-only
+        (and embedding is skipped for EMBED_DOWN_COOLDOWN seconds).
+        """
+        fut = _query_pool().submit(embed_text_chunks, [query]) if _embedding_up() else None
+
+        store = self.meta_store
+        local = store is None and os.path.exists(self.meta_path)
+        if local:
+            store = MetaStore(self.meta_path)
+        try:
+            lexical = [i for i, _ in store.search_text(query, n)] if store else []
+        finally:
+            if local:
+                store.close()
+
+        distances = {}
+        if fut is not None:
+            try:
+                qv, = fut.result(timeout=getattr(settings, "RETRIEVE_EMBED_TIMEOUT", 2.0))
+                D, I = index_factory.search(
+                    self.index, self.index_params, np.array([qv], dtype="float32"), n
+                )
+                distances = {int(i): float(d) for d, i in zip(D[0], I[0]) if i >= 0}
+            except Exception as e:
+                _mark_embedding_down()
+                logger.warning(f"PDF {self.source_id}: query embedding failed ({e!r}); lexical-only results")
+
+        scores = Counter()
+        for ranked in (list(distances), lexical):
+            for rank, i in enumerate(ranked):
+                scores[i] += 1.0 / (RRF_K + rank + 1)
+        ids   = [i for i, _ in scores.most_common(n)]
+        metas = self._lookup(ids)
+        return [
+            {"distance": distances.get(i), "score": round(scores[i], 6), **meta}
+            for i, meta in zip(ids, metas) if meta is not None
+        ]
 
     def ask_gemini(self, hits, question):
         contents = ["You are a precise multimodal research assistant.\n"]
@@ -197,22 +585,15 @@ class RAGService:
             if h["type"] == "text":
                 contents.append(f"[Text] {h['content']}\n")
             elif h["type"] == "table":
-                if h.get("url"):
-                    df = pd.read_csv(h["url"])
-                    try:
-                        md = df.head(5).to_markdown(index=False)
-                    except ImportError:
-                        md = df.head(5).to_csv(index=False)
+                source = h.get("path") or h.get("url")
+                if source:
+                    md = prompt_parts.cache.table(source)
                     contents.append(f"Table (p{h['page']}):\n{md}\n")
             elif h["type"] == "image":
-                if h.get("url"):
-                    resp = requests.get(h["url"])
-                    contents.append(types.Part.from_bytes(
-                        data=resp.content, mime_type="image/png"
-                    ))
+                source = h.get("path") or h.get("url")
+                if source:
+                    data, mime = prompt_parts.cache.image(source)
+                    contents.append(types.Part.from_bytes(data=data, mime_type=mime))
         contents.append(f"QUESTION: {question}")
 
-        resp = gemini_client.models.generate_content(
-            model="gemini-2.0-flash", contents=contents
-        )
-        return resp.text
+        return call_llm(contents, preferred="gemini", model_gemini="gemini-2.0-flash")
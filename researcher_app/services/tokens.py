@@ -0,0 +1,7 @@
+# services/tokens.py
+
+import tiktoken
+
+# Shared tokenizer for chunking and prompt budgets. Kept free of app imports so
+# any service (including the LLM layer) can use it without an import cycle.
+tokenizer = tiktoken.get_encoding("cl100k_base")
@@ -3,9 +3,11 @@
 import re
 import json
 from .api_handler import call_llm
+from . import context_cache
 
-def draft_section(section, full_context, preferred="openai"):
-    # … your existing code unchanged …
+def draft_section(section, full_context, preferred="openai", fresh=False):
+    # full_context: context text, or a context_cache.PaperContext sent ahead of the prompt
+    full_context, paper = context_cache.split(full_context)
     prompt = f"""
 You are a technical blog writing assistant.
 
@@ -14,7 +16,7 @@ Write a detailed, professional blog section based on the following details.
 Section Title: {section['title']}
 Section Description: {section['description']}
 
-Here is the full extracted context for reference:
+Here is the extracted context for reference (the paper, or its passages most relevant to this section):
 \"\"\"{full_context}\"\"\"
 
 Requirements:
@@ -24,7 +26,7 @@ Requirements:
 
 Return ONLY the drafted section body (no JSON or extra text).
 """
-    response = call_llm(prompt, preferred=preferred)
+    response = call_llm(prompt, preferred=preferred, cache=True, fresh=fresh, context=paper)
     return _clean_llm_output(response)
 
 
@@ -46,24 +48,26 @@ Apply the requested changes and return the updated section body in Markdown form
     return _clean_llm_output(response)
 
 
-def generate_description(outline, full_context, preferred="openai"):
+def generate_description(outline, full_context, preferred="openai", fresh=False):
     """
     Generates a concise blog description (1–2 sentences).
+    Identical requests are served from the LLM response cache unless `fresh`.
     """
+    full_context, paper = context_cache.split(full_context)
     prompt = f"""
 You are a technical blog writing assistant.
 
 Given the blog outline (JSON):
 {json.dumps(outline.outline_json, indent=2)}
 
-and the full extracted context:
+and the extracted context (the paper, a digest of it, or its passages most relevant to the outline):
 \"\"\"{full_context}\"\"\"
 
 Write a concise description (1–2 sentences) summarizing the blog.
 
 Return ONLY the description text, no JSON or extra commentary.
 """
-    response = call_llm(prompt, preferred=preferred)
+    response = call_llm(prompt, preferred=preferred, cache=True, fresh=fresh, context=paper)
     return _clean_llm_output(response)
 
 
@@ -71,6 +75,7 @@ def refine_description(outline, user_feedback, full_context, preferred="openai")
     """
     Refines an existing description based on user feedback.
     """
+    full_context, paper = context_cache.split(full_context)
     prompt = f"""
 You are an AI writing assistant refining a blog description.
 
@@ -88,7 +93,7 @@ User feedback:
 
 Apply the user's feedback and return ONLY the updated description text.
 """
-    response = call_llm(prompt, preferred=preferred)
+    response = call_llm(prompt, preferred=preferred, context=paper)
     return _clean_llm_output(response)
 
 
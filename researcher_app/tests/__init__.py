@@ -0,0 +1 @@
+# researcher_app/tests/__init__.py
@@ -0,0 +1,107 @@
+# researcher_app/tests/helpers.py
+
+import os
+import hashlib
+import tempfile
+from unittest import mock
+
+import fitz                       # PyMuPDF
+from django.test import override_settings
+
+
+def make_pdf(path, pages):
+    """
+    Write a PDF with one page per entry of `pages` ("" leaves a page blank).
+    """
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+class TempMediaMixin:
+    """
+    Point MEDIA_ROOT, and the directories services resolve from it at import
+    time, at a fresh temporary directory for each test.
+    """
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = tmp.name
+
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        from researcher_app.services import artifact_store, corpus, ocr, prompt_parts
+        outputs = os.path.join(self.media, "outputs")
+        corpus_dir = os.path.join(self.media, "indices", "corpus")
+        for patcher in (
+            mock.patch.multiple(
+                artifact_store,
+                SAVE_DIR=outputs,
+                BLOBS_DIR=os.path.join(outputs, "blobs"),
+                DOCS_DIR=os.path.join(outputs, "docs"),
+            ),
+            mock.patch.object(ocr, "CACHE_DIR", os.path.join(self.media, "ocr_cache")),
+            mock.patch.object(prompt_parts, "PARTS_DIR", os.path.join(outputs, "parts")),
+            mock.patch.multiple(
+                corpus,
+                CORPUS_DIR=corpus_dir,
+                MANIFEST_PATH=os.path.join(corpus_dir, "manifest.json"),
+                LOCK_PATH=os.path.join(corpus_dir, ".lock"),
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+def fake_vector(text, dim=8):
+    """
+    Deterministic stand-in for a CLIP embedding of `text`.
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [b / 255.0 for b in digest[:dim]]
+
+
+class FakeEmbeddings:
+    """
+    Patch the CLIP client so inputs embed locally (fake_vector). Inputs
+    containing `fail_on` raise EmbeddingError; `calls` records every input
+    that reached the "endpoint".
+    """
+    def __init__(self, dim=8, fail_on=None):
+        self.dim     = dim
+        self.fail_on = fail_on
+        self.calls   = []
+
+    def embed_texts(self, texts, allow_partial=False):
+        return [self._embed(t) for t in list(texts)]
+
+    def embed_images(self, sources, allow_partial=False):
+        return [self._embed(f"image:{s}") for s in list(sources)]
+
+    def _embed(self, text):
+        from researcher_app.services.embeddings import EmbeddingError
+
+        if self.fail_on and self.fail_on in text:
+            raise EmbeddingError(f"cannot embed {text[:20]!r}")
+        self.calls.append(text)
+        return fake_vector(text, self.dim)
+
+    def __enter__(self):
+        from researcher_app.services import embeddings
+
+        self._patcher = mock.patch.multiple(
+            embeddings.client, embed_texts=self.embed_texts, embed_images=self.embed_images
+        )
+        self._patcher.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._patcher.stop()
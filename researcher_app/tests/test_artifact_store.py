@@ -0,0 +1,48 @@
+# researcher_app/tests/test_artifact_store.py
+
+import os
+from unittest import mock
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from researcher_app.services import artifact_store
+from researcher_app.services.artifact_store import ArtifactStore
+from .helpers import TempMediaMixin
+
+
+class ArtifactStoreTests(TempMediaMixin, SimpleTestCase):
+    def test_identical_blobs_are_stored_once_per_pool(self):
+        a = ArtifactStore("doc-a").put(b"logo", "PNG", "images")
+        b = ArtifactStore("doc-b").put(b"logo", ".png", "images")
+
+        self.assertNotEqual(a, b)
+        self.assertTrue(a.startswith(os.path.join(artifact_store.DOCS_DIR, "doc-a", "images")))
+        self.assertTrue(a.endswith(".png"))
+        blobs = [f for _, _, files in os.walk(artifact_store.BLOBS_DIR) for f in files]
+        self.assertEqual(len(blobs), 1)
+        self.assertTrue(os.path.samefile(a, b))
+
+    def test_rewriting_the_same_artifact_is_a_no_op(self):
+        store = ArtifactStore("doc")
+        first = store.put(b"data", "bin", "images")
+        with mock.patch.object(artifact_store, "_atomic_write") as write:
+            self.assertEqual(store.put(b"data", "bin", "images"), first)
+        write.assert_not_called()
+
+    def test_falls_back_to_a_copy_without_hard_links(self):
+        with mock.patch.object(artifact_store.os, "link", side_effect=OSError("EXDEV")):
+            path = ArtifactStore("doc").put(b"payload", "bin", "images")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"payload")
+        self.assertFalse(os.path.islink(path))
+
+    def test_tables_are_csv_and_images_memoized_by_xref(self):
+        store = ArtifactStore("doc")
+        path  = store.put_table(pd.DataFrame([[1, 2]], columns=["a", "b"]))
+        self.assertEqual(pd.read_csv(path).to_dict("records"), [{"a": 1, "b": 2}])
+
+        doc = mock.Mock()
+        doc.extract_image.return_value = {"image": b"jpeg bytes", "ext": "jpeg"}
+        self.assertEqual(store.put_image(doc, 7), store.put_image(doc, 7))
+        doc.extract_image.assert_called_once_with(7)
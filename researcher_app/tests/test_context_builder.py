@@ -0,0 +1,77 @@
+# researcher_app/tests/test_context_builder.py
+
+from collections import OrderedDict
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from researcher_app.models import UploadedPDF, ExtractedContent
+from researcher_app.services import context_builder
+from researcher_app.services.rag_service import RAGService
+from researcher_app.services.tokens import tokenizer
+
+LONG_TEXT = " ".join(f"sentence {n} of the paper." for n in range(200))
+
+
+@override_settings(CONTEXT_FULL_TEXT_MAX_TOKENS=100, CONTEXT_TOKEN_BUDGET=30)
+class ContextBuilderTests(TestCase):
+    def setUp(self):
+        self.pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        patcher = mock.patch.object(context_builder, "_token_counts", OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _content(self, text, version=1):
+        ExtractedContent.objects.update_or_create(pdf=self.pdf, defaults={"text": text, "version": version})
+
+    def _retrieve(self, hits=None, error=None):
+        return mock.patch.object(RAGService, "retrieve", return_value=hits, side_effect=error)
+
+    def test_short_papers_are_returned_whole_and_counted_once(self):
+        self._content("a short paper about sparse attention")
+        with mock.patch.object(context_builder, "tokenizer", wraps=tokenizer) as tok, \
+             self._retrieve([]) as retrieve:
+            for _ in range(3):
+                self.assertEqual(context_builder.build(self.pdf.id, "attention"),
+                                 "a short paper about sparse attention")
+        self.assertEqual(tok.encode.call_count, 1)
+        retrieve.assert_not_called()
+
+    def test_new_extraction_version_is_counted_again(self):
+        self._content("a short paper")
+        context_builder.build(self.pdf.id, "q")
+        self._content(LONG_TEXT, version=2)
+        with self._retrieve([{"content": "sentence 7 of the paper.", "page": 2}]):
+            self.assertEqual(context_builder.build(self.pdf.id, "q"), "[p2] sentence 7 of the paper.")
+
+    def test_long_papers_use_top_chunks_within_budget_in_page_order(self):
+        self._content(LONG_TEXT)
+        hits = [
+            {"content": "results on the third page", "page": 3},
+            {"content": "method on the first page", "page": 1},
+            {"content": "results on the third page", "page": 3},         # duplicate
+            {"content": "word " * 40, "page": 2},                        # over budget
+            {"type": "image", "page": 4, "path": "fig.png"},             # no text
+            {"content": "closing remarks", "page": 9},
+        ]
+        with self._retrieve(hits):
+            context = context_builder.build(self.pdf.id, "results")
+
+        self.assertEqual(context, "[p1] method on the first page\n\n"
+                                  "[p3] results on the third page\n\n"
+                                  "[p9] closing remarks")
+        picked = ["method on the first page", "results on the third page", "closing remarks"]
+        self.assertLessEqual(sum(len(tokenizer.encode(c)) for c in picked), 30)
+
+    def test_failed_retrieval_falls_back_to_the_leading_text(self):
+        self._content(LONG_TEXT)
+        with self._retrieve(error=RuntimeError("index missing")), \
+             self.assertLogs(context_builder.logger, "WARNING"):
+            context = context_builder.build(self.pdf.id, "anything")
+
+        self.assertTrue(LONG_TEXT.startswith(context))
+        self.assertEqual(len(tokenizer.encode(context)), 30)
+
+    def test_missing_content_gives_empty_context(self):
+        self.assertEqual(context_builder.build(self.pdf.id, "q"), "")
+        self.assertEqual(len(context_builder._token_counts), 0)
@@ -0,0 +1,174 @@
+# researcher_app/tests/test_context_cache.py
+
+import time
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from researcher_app.models import UploadedPDF, ExtractedContent, LLMContextCache
+from researcher_app.services import api_handler, context_cache
+from researcher_app.services.api_handler import CircuitBreaker, StubProvider
+from researcher_app.services.context_cache import ContextCacheManager, PaperContext
+
+PAPER = " ".join(f"sentence {n} of the paper." for n in range(50))
+
+
+class InlineStub(StubProvider):
+    name = "inline"
+    supports_context_cache = False
+
+
+class BackupStub(StubProvider):
+    name = "backup"
+
+
+class ContextCacheTests(TestCase):
+    def setUp(self):
+        pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        self.content = ExtractedContent.objects.create(pdf=pdf, text=PAPER)
+        self.stub, self.backup = StubProvider(), BackupStub()
+        self.manager = ContextCacheManager(ttl=600, min_tokens=10)
+        for patcher in (
+            mock.patch.dict(api_handler.PROVIDERS, {"stub": self.stub, "backup": self.backup}, clear=True),
+            mock.patch.object(context_cache, "manager", self.manager),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _paper(self, version=1):
+        return PaperContext(self.content.id, version, fallback="retrieved passages")
+
+    def _ask(self, paper=None, preferred="stub"):
+        return api_handler.call_llm("Summarize.", preferred=preferred, context=paper or self._paper())
+
+    def test_cache_is_created_once_then_reused(self):
+        for _ in range(3):
+            self._ask()
+
+        self.assertEqual(len(self.stub.caches), 1)
+        name = LLMContextCache.objects.get().name
+        self.assertEqual([c["cached_content"] for c in self.stub.calls], [name] * 3)
+        self.assertEqual([c["prompt"] for c in self.stub.calls], ["Summarize."] * 3)
+        stats = self.manager.stats()
+        self.assertEqual((stats["created"], stats["reused"], stats["live"]), (1, 2, 1))
+
+    def test_cache_is_refreshed_below_half_its_ttl(self):
+        self._ask()
+        row = LLMContextCache.objects.get()
+        LLMContextCache.objects.filter(pk=row.pk).update(expires_at=timezone.now() + timedelta(seconds=200))
+
+        self._ask()
+        row.refresh_from_db()
+        self.assertGreater(row.expires_at, timezone.now() + timedelta(seconds=590))
+        self.assertEqual((self.manager.refreshed, self.manager.created), (1, 1))
+
+    def test_new_version_replaces_the_cache(self):
+        self._ask()
+        old = LLMContextCache.objects.get().name
+
+        self._ask(self._paper(version=2))
+        row = LLMContextCache.objects.get()
+        self.assertNotEqual(row.name, old)
+        self.assertEqual(row.version, 2)
+        self.assertEqual(list(self.stub.caches), [row.name])       # old one deleted
+
+    def test_providers_without_caching_get_the_paper_inline(self):
+        inline = InlineStub()
+        with mock.patch.dict(api_handler.PROVIDERS, {"inline": inline}, clear=True):
+            self._ask(preferred="inline")
+
+        self.assertEqual(inline.calls[0]["prompt"], 'PAPER:\n"""retrieved passages"""\n\nSummarize.')
+        self.assertIsNone(inline.calls[0]["cached_content"])
+        self.assertEqual(self.manager.fallbacks, 1)
+        self.assertFalse(LLMContextCache.objects.exists())
+
+    def test_short_texts_are_not_cached(self):
+        ExtractedContent.objects.filter(pk=self.content.pk).update(text="too short")
+        self._ask()
+        self.assertEqual(self.stub.caches, {})
+        self.assertTrue(self.stub.calls[0]["prompt"].startswith("PAPER:"))
+
+    def test_rejected_cache_is_forgotten_and_answered_inline(self):
+        self._ask()
+        rejected = LLMContextCache.objects.get().name
+        self.stub.caches.clear()                                  # expired on the provider's side
+        self.stub.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        self.stub.breaker.record_failure()                        # the next call is the half-open trial
+
+        with self.assertLogs(api_handler.logger, "INFO") as logs:
+            self._ask()
+
+        self.assertIn("rejected", "\n".join(logs.output))
+        self.assertEqual(self.backup.calls, [])                   # no failover
+        self.assertIsNone(self.stub.calls[-1]["cached_content"])
+        self.assertTrue(self.stub.calls[-1]["prompt"].startswith('PAPER:\n"""retrieved passages"""'))
+        self.assertEqual((self.stub.breaker.state(), self.stub.breaker.failures), ("closed", 0))
+
+        self._ask()                                               # replaced on the next call
+        row = LLMContextCache.objects.get()
+        self.assertNotEqual(row.name, rejected)
+        self.assertEqual(self.stub.calls[-1]["cached_content"], row.name)
+        self.assertEqual(self.manager.created, 2)
+
+    def test_split_passes_plain_strings_through(self):
+        paper = self._paper()
+        self.assertEqual(context_cache.split("some passages"), ("some passages", None))
+        self.assertIs(context_cache.split(paper)[1], paper)
+
+
+class ConcurrentCreateTests(TransactionTestCase):
+    def setUp(self):
+        pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        self.content = ExtractedContent.objects.create(pdf=pdf, text=PAPER)
+        self.stub = StubProvider()
+        self.manager = ContextCacheManager(ttl=600, min_tokens=10)
+        self.paper = PaperContext(self.content.id, 1, fallback="retrieved passages")
+
+    def test_concurrent_calls_create_one_cache(self):
+        real = self.stub.create_context_cache
+
+        def slow_create(*args, **kwargs):
+            time.sleep(0.1)
+            return real(*args, **kwargs)
+
+        names = []
+
+        def handle():
+            try:
+                names.append(self.manager.handle(self.stub, "stub-1", self.paper))
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(self.stub, "create_context_cache", side_effect=slow_create) as create:
+            threads = [threading.Thread(target=handle) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(len(self.stub.caches), 1)
+        self.assertEqual(set(names), {LLMContextCache.objects.get().name})
+        self.assertEqual((self.manager.created, self.manager.reused), (1, 3))
+
+    def test_a_claim_held_elsewhere_means_inline(self):
+        LLMContextCache.objects.create(
+            content=self.content, provider="stub", model="stub-1", name="", version=1,
+            expires_at=timezone.now() + timedelta(seconds=context_cache.CLAIM_SECONDS),
+        )
+        self.assertIsNone(self.manager.handle(self.stub, "stub-1", self.paper))
+        self.assertEqual((self.stub.caches, self.manager.fallbacks), ({}, 1))
+        self.assertEqual(self.manager.stats()["live"], 0)
+
+    def test_a_stale_claim_is_taken_over(self):
+        LLMContextCache.objects.create(
+            content=self.content, provider="stub", model="stub-1", name="", version=1,
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        name = self.manager.handle(self.stub, "stub-1", self.paper)
+        self.assertEqual(LLMContextCache.objects.get().name, name)
+        self.assertEqual(list(self.stub.caches), [name])
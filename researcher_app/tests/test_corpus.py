@@ -0,0 +1,105 @@
+# researcher_app/tests/test_corpus.py
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from researcher_app.models import UploadedPDF, ExtractedContent, BackgroundJob
+from researcher_app.services import corpus, jobs
+from researcher_app.services.rag_service import RAGService
+from .helpers import TempMediaMixin, FakeEmbeddings
+
+TEXTS = {
+    "attention": "sparse attention lowers the memory cost of long sequences",
+    "vision":    "convolutional features transfer across image datasets",
+    "speech":    "speech recognition benefits from self supervised pretraining",
+}
+
+
+class CorpusTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake = FakeEmbeddings()
+        self.fake.__enter__()
+        self.addCleanup(self.fake.__exit__)
+        self.pdfs = {name: self._indexed_pdf(text) for name, text in TEXTS.items()}
+
+    def _indexed_pdf(self, text):
+        pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        ExtractedContent.objects.create(pdf=pdf, text=text)
+        RAGService(pdf.id).build_index(persist=True)
+        return pdf
+
+    def test_search_spans_documents_and_filters_by_pdf(self):
+        for pdf in self.pdfs.values():
+            self.assertGreater(corpus.add_document(pdf.id), 0)
+        self.assertEqual(corpus.add_document(self.pdfs["vision"].id), 0)     # already present
+        self.assertEqual(corpus.documents(), sorted(p.id for p in self.pdfs.values()))
+
+        top = corpus.search(TEXTS["vision"], k=1)
+        self.assertEqual(top[0]["pdf_id"], self.pdfs["vision"].id)
+        self.assertEqual(top[0]["distance"], 0.0)
+
+        only = corpus.search(TEXTS["vision"], k=5, pdf_ids=[self.pdfs["speech"].id])
+        self.assertTrue(only)
+        self.assertEqual({h["pdf_id"] for h in only}, {self.pdfs["speech"].id})
+
+    @override_settings(CORPUS_SHARD_MAX_VECTORS=1)
+    def test_full_shards_are_sealed_and_never_rebuilt(self):
+        corpus.add_document(self.pdfs["attention"].id)
+        with mock.patch.object(corpus, "_load_shard_for_write") as load:
+            corpus.add_document(self.pdfs["vision"].id)
+        load.assert_not_called()
+
+        shards = corpus._read_manifest()["shards"]
+        self.assertEqual([s["sealed"] for s in shards], [True, True])
+        self.assertEqual(len(corpus.search(TEXTS["attention"], k=5)), 2)
+
+    def test_removed_documents_disappear_from_search(self):
+        for pdf in self.pdfs.values():
+            corpus.add_document(pdf.id)
+        self.assertGreater(corpus.remove_document(self.pdfs["vision"].id), 0)
+        self.assertEqual(corpus.remove_document(self.pdfs["vision"].id), 0)
+
+        hits = corpus.search(TEXTS["vision"], k=5)
+        self.assertNotIn(self.pdfs["vision"].id, {h["pdf_id"] for h in hits})
+
+        corpus.remove_document(self.pdfs["attention"].id)
+        corpus.remove_document(self.pdfs["speech"].id)
+        self.assertEqual(corpus._read_manifest()["shards"], [])
+        self.assertEqual(corpus.search("anything"), [])
+
+    def test_unindexed_documents_are_not_added(self):
+        pdf = UploadedPDF.objects.create(file="uploads/other.pdf")
+        with self.assertLogs(corpus.logger, "WARNING"):
+            self.assertEqual(corpus.add_document(pdf.id), 0)
+        self.assertEqual(corpus.documents(), [])
+
+    def test_replace_job_swaps_in_the_new_copy(self):
+        pdf = self.pdfs["attention"]
+        corpus.add_document(pdf.id)
+        ExtractedContent.objects.filter(pdf=pdf).update(text="a rewritten abstract about pruning")
+        RAGService(pdf.id).build_index(persist=True)
+
+        jobs.enqueue("corpus", pdf=pdf, replace=True)
+        self.assertTrue(jobs.run_job(jobs.claim_next("w")))
+        contents = [h["content"] for h in corpus.search("pruning", k=5)]
+        self.assertIn("a rewritten abstract about pruning", contents)
+        self.assertNotIn(TEXTS["attention"], contents)
+
+
+class ReextractViewTests(TestCase):
+    def test_corpus_replacement_is_left_to_the_job(self):
+        pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        content = ExtractedContent.objects.create(pdf=pdf, text="text")
+
+        with mock.patch("researcher_app.services.ingest.reextract_pdf", return_value=(content, {"kept": 1})), \
+             mock.patch.object(corpus, "remove_document") as remove:
+            resp = APIClient().post(reverse("extract-pdf", args=[pdf.id]))
+
+        self.assertEqual(resp.status_code, 200)
+        remove.assert_not_called()
+        job = BackgroundJob.objects.get(kind="corpus", pdf=pdf)
+        self.assertEqual(job.payload, {"replace": True})
@@ -0,0 +1,92 @@
+# researcher_app/tests/test_digest.py
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from researcher_app.models import UploadedPDF, ExtractedContent, ExtractedPage, DocumentDigest
+from researcher_app.services import digest
+from researcher_app.services.api_handler import LLMError
+from researcher_app.services.tokens import tokenizer
+
+
+def _words(n, word="token"):
+    # " token" is a single cl100k token
+    return (" " + word) * n
+
+
+@override_settings(DIGEST_CHUNK_TOKENS=10, DIGEST_MIN_TOKENS=5, DIGEST_GROUP_SIZE=2, DIGEST_PARALLEL=2)
+class DigestTests(TestCase):
+    def setUp(self):
+        self.pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+
+    def _pages(self, *sizes):
+        for number, size in enumerate(sizes, 1):
+            ExtractedPage.objects.create(pdf=self.pdf, page_number=number, text=_words(size))
+        return ExtractedContent.objects.create(pdf=self.pdf, text=_words(sum(sizes)))
+
+    def _llm(self, error=None):
+        def answer(prompt, **kwargs):
+            if error:
+                raise error
+            return f"summary of {len(prompt)} chars\n"
+        return mock.patch.object(digest, "call_llm", side_effect=answer)
+
+    def test_chunks_follow_pages_up_to_the_token_limit(self):
+        self._pages(4, 5, 3, 25)
+        chunks = digest._chunks(self.pdf.id, "")
+
+        self.assertEqual([(first, last) for first, last, _ in chunks],
+                         [(1, 2), (3, 3), (4, 4), (4, 4), (4, 4)])
+        self.assertTrue(all(len(tokenizer.encode(text)) <= 10 for _, _, text in chunks))
+        self.assertEqual(sum(len(tokenizer.encode(text)) for _, _, text in chunks), 37)
+
+    def test_text_without_pages_is_one_page(self):
+        chunks = digest._chunks(self.pdf.id, _words(15))
+        self.assertEqual([(first, last) for first, last, _ in chunks], [(1, 1), (1, 1)])
+
+    def test_build_maps_chunks_and_reduces_them(self):
+        content = self._pages(8, 8, 8, 8, 8)
+        stages = []
+        with self._llm() as llm:
+            result = digest.build(self.pdf.id, progress=lambda stage, **kw: stages.append(stage))
+
+        self.assertEqual(len(result.chunks), 5)
+        self.assertEqual([s["pages"] for s in result.sections], [[1, 2], [3, 4], [5, 5]])
+        self.assertEqual(result.sections[2]["summary"], result.chunks[4]["summary"])     # single-chunk group
+        self.assertEqual(llm.call_count, 5 + 2 + 1)
+        self.assertEqual((result.version, result.source_tokens), (content.version, 40))
+        self.assertEqual(stages[0], "summarizing")
+        self.assertIn("reducing", stages)
+
+        text = digest.text_for(self.pdf.id)
+        self.assertTrue(text.startswith("DOCUMENT SUMMARY:\nsummary of"))
+        self.assertIn("[pp. 3–4]", text)
+
+    def test_stale_digest_is_not_used_and_duplicates_share_it(self):
+        self._pages(8, 8)
+        with self._llm():
+            digest.build(self.pdf.id)
+        dup = UploadedPDF.objects.create(file="uploads/copy.pdf", duplicate_of=self.pdf)
+        self.assertEqual(digest.text_for(dup.id), digest.text_for(self.pdf.id))
+
+        ExtractedContent.objects.filter(pdf=self.pdf).update(version=2)
+        self.assertIsNone(digest.text_for(self.pdf.id))
+
+    def test_short_papers_get_no_digest(self):
+        content = self._pages(8, 8)
+        with self._llm():
+            digest.build(self.pdf.id)
+        ExtractedContent.objects.filter(pk=content.pk).update(text=_words(3))
+
+        with self._llm() as llm:
+            self.assertIsNone(digest.build(self.pdf.id))
+        llm.assert_not_called()
+        self.assertFalse(DocumentDigest.objects.exists())
+
+    def test_failed_summaries_store_nothing(self):
+        self._pages(8, 8, 8)
+        with self._llm(error=LLMError("down")), self.assertRaises(LLMError):
+            digest.build(self.pdf.id)
+        self.assertFalse(DocumentDigest.objects.exists())
+        self.assertIsNone(digest.text_for(self.pdf.id))
@@ -0,0 +1,142 @@
+# researcher_app/tests/test_drafting.py
+
+import time
+import threading
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from researcher_app import views
+from researcher_app.models import UploadedPDF, ExtractedContent, BlogOutline, BlogDraft
+from researcher_app.services import api_handler, drafting, jobs
+from researcher_app.services.api_handler import StubProvider
+
+
+def _outline(n_sections):
+    pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+    sections = [{"title": f"Section {i}", "description": f"about {i}"} for i in range(n_sections)]
+    outline = BlogOutline.objects.create(pdf=pdf, outline_json={"sections": sections})
+    for i, sec in enumerate(sections):
+        BlogDraft.objects.create(outline=outline, section_order=i, section_title=sec["title"], content="")
+    return outline
+
+
+@override_settings(DRAFT_PARALLEL_SECTIONS=6)
+class DraftOutlineTests(TransactionTestCase):
+    def setUp(self):
+        self.provider = StubProvider(max_concurrency=2)
+        self.running, self.peak = 0, 0
+        self.lock = threading.Lock()
+        for patcher in (
+            mock.patch.dict(api_handler.PROVIDERS, {"stub": self.provider}, clear=True),
+            mock.patch.object(drafting.context_cache, "for_pdf", return_value="ctx"),
+            mock.patch.object(drafting.writer, "draft_section", side_effect=self._draft),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _draft(self, section, context, preferred="openai"):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if section["title"] == "Section 3":
+            raise api_handler.LLMError("provider down")
+        return f"body of {section['title']}"
+
+    def test_empty_sections_are_drafted_within_the_provider_cap(self):
+        outline = _outline(3)
+        BlogDraft.objects.filter(outline=outline, section_order=1).update(content="edited by hand")
+        updates = []
+
+        drafted = drafting.draft_outline(outline.id, preferred="stub",
+                                         progress=lambda stage, **kw: updates.append(kw))
+
+        self.assertEqual(drafted, 2)
+        self.assertEqual(
+            list(BlogDraft.objects.filter(outline=outline).values_list("content", flat=True)),
+            ["body of Section 0", "edited by hand", "body of Section 2"],
+        )
+        self.assertEqual(updates[0], {"sections_total": 2, "sections_drafted": 0})
+        self.assertEqual(updates[-1], {"sections_drafted": 2})
+        self.assertLessEqual(self.peak, 2)
+
+    def test_many_sections_never_exceed_the_request_slots(self):
+        outline = _outline(6)
+        with self.assertRaises(RuntimeError), self.assertLogs(drafting.logger, "ERROR"):
+            drafting.draft_outline(outline.id, preferred="stub")
+        self.assertLessEqual(self.peak, 2)
+
+    def test_failed_sections_fail_the_job_and_stay_empty(self):
+        outline = _outline(5)
+        with self.assertLogs(drafting.logger, "ERROR"):
+            with self.assertRaisesRegex(RuntimeError, "1 of 5 sections failed: section 3"):
+                drafting.draft_outline(outline.id, preferred="stub")
+
+        empty = BlogDraft.objects.filter(outline=outline, content="").values_list("section_order", flat=True)
+        self.assertEqual(list(empty), [3])
+
+
+class WaitForDraftTests(TestCase):
+    def setUp(self):
+        self.outline = _outline(1)
+        self.draft = self.outline.drafts.get()
+
+    def test_active_follows_the_draft_job(self):
+        self.assertFalse(drafting.active(self.outline.id))
+        job = jobs.enqueue("draft", pdf=self.outline.pdf, outline_id=self.outline.id)
+        self.assertTrue(drafting.active(self.outline.id))
+        job.status = "succeeded"
+        job.save()
+        self.assertFalse(drafting.active(self.outline.id))
+
+    def test_wait_returns_content_or_gives_up(self):
+        self.assertEqual(drafting.wait_for(self.draft, timeout=5), "")      # no job: no waiting
+
+        jobs.enqueue("draft", pdf=self.outline.pdf, outline_id=self.outline.id)
+        started = time.monotonic()
+        self.assertEqual(drafting.wait_for(self.draft, timeout=0), "")
+        self.assertLess(time.monotonic() - started, 1)
+
+        BlogDraft.objects.filter(pk=self.draft.pk).update(content="done")
+        self.assertEqual(drafting.wait_for(self.draft, timeout=5), "done")
+
+
+class DraftSectionViewTests(TestCase):
+    def setUp(self):
+        self.outline = _outline(1)
+        ExtractedContent.objects.create(pdf=self.outline.pdf, text="paper")
+        self.draft = self.outline.drafts.get()
+        self.url = reverse("draft-section", args=[self.outline.id])
+        for patcher in (
+            mock.patch.object(views.context_cache, "for_pdf", return_value="ctx"),
+            mock.patch.object(views.writer, "draft_section", return_value="fresh body"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.llm = views.writer.draft_section
+
+    def test_get_serves_the_background_draft(self):
+        BlogDraft.objects.filter(pk=self.draft.pk).update(content="drafted by the job")
+        resp = APIClient().get(self.url, {"section_id": self.draft.id})
+        self.assertEqual(resp.json()["content"], "drafted by the job")
+        self.llm.assert_not_called()
+
+    def test_get_drafts_an_empty_section_without_a_job(self):
+        resp = APIClient().get(self.url, {"section_id": self.draft.id})
+        self.assertEqual(resp.json()["content"], "fresh body")
+        self.assertEqual(BlogDraft.objects.get(pk=self.draft.pk).content, "fresh body")
+
+    def test_post_regenerates_a_drafted_section(self):
+        BlogDraft.objects.filter(pk=self.draft.pk).update(content="drafted by the job")
+        resp = APIClient().post(self.url, {"section_id": self.draft.id}, format="json")
+        self.assertEqual(resp.json()["content"], "fresh body")
+        self.llm.assert_called_once()
+
+    def test_section_id_is_required(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 400)
+        self.assertEqual(APIClient().post(self.url, {}, format="json").status_code, 400)
@@ -0,0 +1,65 @@
+# researcher_app/tests/test_embedding_cache.py
+
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from researcher_app.models import EmbeddingCacheEntry
+from researcher_app.services.embeddings import EmbeddingClient, EmbeddingCache
+
+
+class EmbeddingCacheTests(TestCase):
+    def setUp(self):
+        self.cache  = EmbeddingCache(max_entries=3)
+        self.embedder = EmbeddingClient("http://clip.test/text", "http://clip.test/image",
+                                       cache=self.cache, model_id="clip-a")
+        self.sent = []
+
+        def run(url, field, items, batch_size, allow_partial):
+            self.sent.append(list(items))
+            return [None if x == "bad" else [float(len(x)), 0.5] for x in items]
+
+        patcher = mock.patch.object(self.embedder, "_run", side_effect=run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_missing_inputs_are_fetched_once(self):
+        first = self.embedder.embed_texts(["aa", "b", "aa"])
+        second = self.embedder.embed_texts(["b", "ccc"])
+
+        self.assertEqual(first, [[2.0, 0.5], [1.0, 0.5], [2.0, 0.5]])
+        self.assertEqual(second, [[1.0, 0.5], [3.0, 0.5]])
+        self.assertEqual(self.sent, [["aa", "b"], ["ccc"]])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 4))
+
+    def test_key_depends_on_model_and_kind(self):
+        key = EmbeddingCache.key("clip-a", "text", b"x")
+        self.assertNotEqual(key, EmbeddingCache.key("clip-b", "text", b"x"))
+        self.assertNotEqual(key, EmbeddingCache.key("clip-a", "image", b"x"))
+
+    def test_failed_inputs_are_not_cached(self):
+        self.assertEqual(self.embedder.embed_texts(["bad"], allow_partial=True), [None])
+        self.assertFalse(EmbeddingCacheEntry.objects.exists())
+        self.embedder.embed_texts(["bad"], allow_partial=True)
+        self.assertEqual(self.sent, [["bad"], ["bad"]])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.embedder.embed_texts(["a", "bb", "ccc"])
+        EmbeddingCacheEntry.objects.update(last_used_at="2000-01-01T00:00:00Z")
+        self.embedder.embed_texts(["a"])               # refreshes "a"
+        self.embedder.embed_texts(["dddd"])             # over the bound: drops "bb"
+
+        self.assertEqual(EmbeddingCacheEntry.objects.count(), 3)
+        self.sent.clear()
+        self.embedder.embed_texts(["a", "bb", "ccc", "dddd"])
+        self.assertEqual(self.sent, [["bb"]])
+
+    def test_stats_are_served(self):
+        self.embedder.embed_texts(["a", "a"])
+        with mock.patch("researcher_app.services.embeddings.client", self.embedder):
+            resp = APIClient().get(reverse("cache-stats"))
+        self.assertEqual(resp.status_code, 200)
+        stats = resp.json()["embeddings"]
+        self.assertEqual((stats["entries"], stats["misses"]), (1, 2))
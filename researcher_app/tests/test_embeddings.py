@@ -0,0 +1,117 @@
+# researcher_app/tests/test_embeddings.py
+
+import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from researcher_app.services.embeddings import EmbeddingClient, EmbeddingError
+
+
+def _response(status, body=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp.url = "http://clip.test/embed"
+    resp._content = json.dumps(body or {}).encode("utf-8")
+    return resp
+
+
+class FakeEndpoint:
+    """
+    Session stand-in: embeds each input as [len(input)], or answers with
+    whatever `respond(batch)` returns / raises.
+    """
+    def __init__(self, respond=None):
+        self.respond  = respond
+        self.requests = []
+        self._lock    = threading.Lock()
+
+    def post(self, url, json, timeout):
+        batch = next(iter(json.values()))
+        with self._lock:
+            self.requests.append(list(batch))
+        if self.respond is not None:
+            result = self.respond(batch)
+            if result is not None:
+                return result
+        return _response(200, {"embeddings": [[float(len(x))] for x in batch]})
+
+
+class EmbeddingClientTests(SimpleTestCase):
+    def _client(self, endpoint, **kwargs):
+        client = EmbeddingClient("http://clip.test/text", "http://clip.test/image",
+                                 backoff=0, **{"text_batch": 2, "max_retries": 2, **kwargs})
+        pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        patcher = mock.patch.object(client, "_resources", return_value=(endpoint, pool))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return client
+
+    def test_inputs_are_batched_and_order_is_kept(self):
+        endpoint = FakeEndpoint()
+        vecs = self._client(endpoint).embed_texts(["a", "bb", "ccc", "dddd", "eeeee"])
+
+        self.assertEqual(vecs, [[1.0], [2.0], [3.0], [4.0], [5.0]])
+        self.assertEqual(sorted(endpoint.requests), [["a", "bb"], ["ccc", "dddd"], ["eeeee"]])
+
+    def test_transient_errors_are_retried(self):
+        failures = iter([_response(503), requests.ConnectionError("reset")])
+
+        def respond(batch):
+            nxt = next(failures, None)
+            if isinstance(nxt, Exception):
+                raise nxt
+            return nxt
+
+        endpoint = FakeEndpoint(respond)
+        self.assertEqual(self._client(endpoint, text_batch=8).embed_texts(["a", "bb"]), [[1.0], [2.0]])
+        self.assertEqual(len(endpoint.requests), 3)
+
+    def test_rejected_input_is_isolated_by_bisection(self):
+        endpoint = FakeEndpoint(lambda batch: _response(422) if "bad" in batch else None)
+        client = self._client(endpoint, text_batch=4)
+
+        with self.assertLogs("researcher_app.services.embeddings", "WARNING"):
+            vecs = client.embed_texts(["a", "bad", "ccc", "dddd"], allow_partial=True)
+        self.assertEqual(vecs, [[1.0], None, [3.0], [4.0]])
+
+        with self.assertRaises(EmbeddingError):
+            client.embed_texts(["a", "bad"])
+
+    def test_wrong_embedding_count_is_bisected(self):
+        endpoint = FakeEndpoint(
+            lambda batch: _response(200, {"embeddings": [[0.0]]}) if len(batch) > 1 else None
+        )
+        self.assertEqual(self._client(endpoint).embed_texts(["a", "bb"]), [[1.0], [2.0]])
+        self.assertEqual(endpoint.requests, [["a", "bb"], ["a"], ["bb"]])
+
+    def test_service_down_fails_fast_without_bisecting(self):
+        def down(batch):
+            raise requests.ConnectionError("refused")
+
+        for respond in (down, lambda batch: _response(503)):
+            endpoint = FakeEndpoint(respond)
+            with self.assertRaises(EmbeddingError):
+                self._client(endpoint, text_batch=8).embed_texts(["a", "bb", "ccc", "dddd"], allow_partial=True)
+            self.assertEqual(len(endpoint.requests), 3)      # 1 try + 2 retries, one batch
+
+    def test_unreadable_image_is_dropped_when_partial(self):
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+            f.write(b"png bytes")
+        self.addCleanup(os.remove, f.name)
+        endpoint = FakeEndpoint()
+        client = self._client(endpoint)
+
+        with self.assertLogs("researcher_app.services.embeddings", "ERROR"):
+            vecs = client.embed_images([f.name, "/missing.png"], allow_partial=True)
+        self.assertEqual(len(vecs), 2)
+        self.assertIsNotNone(vecs[0])
+        self.assertIsNone(vecs[1])
+        with self.assertRaises(FileNotFoundError):
+            client.embed_images(["/missing.png"])
@@ -0,0 +1,88 @@
+# researcher_app/tests/test_index_cache.py
+
+from unittest import mock
+
+import faiss
+from django.test import SimpleTestCase, TestCase
+
+from researcher_app.models import UploadedPDF, ExtractedContent
+from researcher_app.services import index_cache as index_cache_module
+from researcher_app.services.index_cache import IndexCache, index_cache, index_version
+from researcher_app.services.rag_service import RAGService
+from .helpers import TempMediaMixin, FakeEmbeddings
+
+
+def _index():
+    return faiss.IndexFlatL2(4)
+
+
+class IndexCacheTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(index_cache_module, "_estimate_private_bytes", return_value=100)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hits_misses_and_version_replacement(self):
+        cache = IndexCache(max_bytes=1000, max_entries=10)
+        index, store = _index(), object()
+
+        self.assertIsNone(cache.get(1, "v1"))
+        cache.put(1, "v1", index, store)
+        self.assertEqual(cache.get(1, "v1"), (index, store))
+
+        cache.put(1, "v2", _index(), store)          # a rebuild replaces the old version
+        self.assertIsNone(cache.get(1, "v1"))
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (1, 2))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = IndexCache(max_bytes=250, max_entries=10)
+        cache.put(1, "v", _index(), None)
+        cache.put(2, "v", _index(), None)
+        cache.get(1, "v")
+        cache.put(3, "v", _index(), None)            # over the byte budget: drops 2
+
+        self.assertIsNotNone(cache.get(1, "v"))
+        self.assertIsNone(cache.get(2, "v"))
+        self.assertIsNotNone(cache.get(3, "v"))
+        self.assertEqual(cache.stats()["bytes"], 200)
+
+        small = IndexCache(max_bytes=10_000, max_entries=1)
+        small.put(1, "v", _index(), None)
+        small.put(2, "v", _index(), None)
+        self.assertIsNone(small.get(1, "v"))
+
+    def test_oversized_index_and_invalidation(self):
+        cache = IndexCache(max_bytes=50, max_entries=10)
+        cache.put(1, "v", _index(), None)
+        self.assertIsNone(cache.get(1, "v"))
+
+        cache = IndexCache(max_bytes=1000, max_entries=10)
+        cache.put(1, "v", _index(), None)
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1, "v"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+
+class RAGServiceIndexCacheTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        ExtractedContent.objects.create(pdf=self.pdf, text="sparse attention lowers memory use")
+        index_cache.invalidate(self.pdf.id)
+
+    def test_readers_share_the_loaded_index_until_it_is_rebuilt(self):
+        with FakeEmbeddings():
+            RAGService(self.pdf.id).build_index(persist=True)
+            first = RAGService(self.pdf.id)
+            first.retrieve("attention")
+            second = RAGService(self.pdf.id)
+            second.retrieve("memory")
+            self.assertIs(second.index, first.index)
+
+            RAGService(self.pdf.id).build_index(persist=True)     # save drops the cached entry
+            third = RAGService(self.pdf.id)
+            third.retrieve("attention")
+
+        self.assertIsNot(third.index, first.index)
+        self.assertEqual(index_cache.get(self.pdf.id, index_version(third.index_path))[0], third.index)
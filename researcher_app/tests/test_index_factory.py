@@ -0,0 +1,86 @@
+# researcher_app/tests/test_index_factory.py
+
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from researcher_app.services import index_factory
+
+
+def _vectors(n, d=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, d)).astype("float32")
+
+
+class ChooseParamsTests(SimpleTestCase):
+    @override_settings(INDEX_FLAT_MAX_VECTORS=1000)
+    def test_type_follows_size_and_memory_budget(self):
+        self.assertEqual(index_factory.choose_params(500, 512, budget_bytes=10**9)["type"], "flat")
+        self.assertEqual(index_factory.choose_params(5000, 512, budget_bytes=10**9)["type"], "hnsw")
+
+        params = index_factory.choose_params(100_000, 512, budget_bytes=64 * 1024 * 1024)
+        self.assertEqual(params["type"], "ivfpq")
+        self.assertEqual(512 % params["m"], 0)
+        self.assertLessEqual(params["nprobe"], params["nlist"])
+        self.assertLessEqual(index_factory.estimate_bytes(params, 100_000, 512), 64 * 1024 * 1024)
+
+
+class BuildAndSearchTests(SimpleTestCase):
+    def test_every_type_finds_an_indexed_vector(self):
+        base = _vectors(2000)
+        for params in (
+            index_factory.FLAT,
+            {"type": "hnsw", "M": 16, "ef_construction": 100, "ef_search": 16},
+            index_factory.ivfpq_params(2000, 16, nprobe=8),
+        ):
+            index = index_factory.build(base, params)
+            _, ids = index_factory.search(index, params, base[7:8], k=5)
+            self.assertIn(7, ids[0].tolist(), params)
+
+    def test_id_mapped_search_respects_the_filter(self):
+        base = _vectors(50)
+        ids = np.arange(100, 150)
+        index = index_factory.build(base, index_factory.FLAT, ids=ids)
+        self.assertTrue(index_factory.is_id_map(index))
+
+        _, found = index_factory.search(index, index_factory.FLAT, base[0:1], k=3, ids=[120, 130])
+        self.assertEqual(sorted(i for i in found[0].tolist() if i >= 0), [120, 130])
+
+        vecs, stored = index_factory.vectors_and_ids(index)
+        self.assertEqual(stored.tolist(), ids.tolist())
+        np.testing.assert_allclose(vecs, base)
+
+    def test_pq_codes_are_not_reconstructed(self):
+        index = index_factory.build(_vectors(1000), index_factory.ivfpq_params(1000, 16, nprobe=4))
+        self.assertIsNone(index_factory.reconstruct_all(index))
+        self.assertEqual(index_factory.read_flags(index_factory.FLAT), index_factory.MMAP_FLAGS)
+        self.assertEqual(index_factory.read_flags({"type": "ivfpq"}), 0)
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    def _run(self, *args):
+        out = StringIO()
+        call_command("benchmark_index", *args, "--dim", "8", "--queries", "20",
+                     "--hnsw-m", "8", "--ef-search", "16,32", stdout=out)
+        return out.getvalue()
+
+    def test_reused_builds_report_their_build_time(self):
+        # every clock read advances 5s, so each build measures exactly 5s
+        ticks = iter(range(0, 10_000, 5))
+        with mock.patch("researcher_app.management.commands.benchmark_index.time.perf_counter",
+                        side_effect=lambda: next(ticks)):
+            out = self._run("--synthetic", "600", "--nprobe", "2,4")
+
+        rows = [line for line in out.splitlines() if line.startswith("type=hnsw")]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual([r.split()[-5] for r in rows], ["5.00", "5.00"])
+        self.assertEqual(sum(line.startswith("type=ivfpq") for line in out.splitlines()), 2)
+
+    def test_ivfpq_is_skipped_for_small_sets(self):
+        out = self._run("--synthetic", "200")
+        self.assertIn("Skipping IVF-PQ", out)
+        self.assertFalse(any(line.startswith("type=ivfpq") for line in out.splitlines()))
+        self.assertTrue(any(line.startswith("type=flat") for line in out.splitlines()))
@@ -0,0 +1,115 @@
+# researcher_app/tests/test_ingest.py
+
+import os
+
+from django.test import TestCase, override_settings
+
+from researcher_app.models import UploadedPDF, ExtractedContent, ExtractedPage
+from researcher_app.services import ingest, pdf_extractor
+from researcher_app.services.rag_service import RAGService
+from .helpers import TempMediaMixin, FakeEmbeddings, make_pdf
+
+PAGES = [
+    "Alpha introduces sparse attention",
+    "Bravo describes the training data",
+    "Charlie reports ablation results",
+    "Delta compares against baselines",
+    "Echo concludes the paper",
+]
+
+
+@override_settings(PDF_EXTRACT_WORKERS=1, INGEST_BATCH_PAGES=2, INGEST_QUEUE_DEPTH=1)
+class IncrementalIngestTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = make_pdf(os.path.join(self.media, "paper.pdf"), PAGES)
+        self.pdf  = UploadedPDF.objects.create(file="uploads/paper.pdf", sha256="a" * 64)
+
+    def test_pages_become_searchable_batch_by_batch(self):
+        seen = []
+
+        def progress(stage, **counters):
+            seen.append((
+                stage,
+                counters["pages_indexed"],
+                ExtractedPage.objects.filter(pdf=self.pdf, is_indexed=True).count(),
+                ExtractedContent.objects.filter(pdf=self.pdf).exists(),
+            ))
+
+        with FakeEmbeddings():
+            ingest.ingest_pdf(self.pdf.id, self.path, progress=progress)
+
+        extracting = [s for s in seen if s[0] == "extracting"]
+        self.assertEqual([s[1] for s in extracting], [0, 2, 4, 5])
+        self.assertEqual([s[2] for s in extracting], [0, 2, 4, 5])
+        self.assertFalse(any(s[3] for s in seen[:-1]))      # content is written last
+        self.assertEqual(seen[-1][0], "done")
+
+        content = ExtractedContent.objects.get(pdf=self.pdf)
+        self.assertIn("Charlie reports ablation results", content.text)
+        self.assertEqual(self.pdf.pages.count(), 5)
+        self.assertEqual(UploadedPDF.objects.get(pk=self.pdf.pk).page_count, 5)
+        self.assertTrue(RAGService(self.pdf.id).index_exists())
+
+    def test_partial_index_is_searchable_while_ingesting(self):
+        hits = []
+
+        def progress(stage, **counters):
+            if stage == "extracting" and counters["pages_indexed"] == 2 and not hits:
+                svc = RAGService(self.pdf.id)
+                hits.extend(svc.retrieve("sparse attention", k=5))
+                self.assertFalse(svc.coverage()["complete"])
+
+        with FakeEmbeddings():
+            ingest.ingest_pdf(self.pdf.id, self.path, progress=progress)
+
+        self.assertTrue(hits)
+        self.assertEqual({h["page"] for h in hits}, {1, 2})
+
+    def test_batch_that_keeps_failing_is_left_unindexed(self):
+        with FakeEmbeddings(fail_on="Charlie"):
+            with self.assertLogs(ingest.logger, "ERROR") as logs:
+                ingest.ingest_pdf(self.pdf.id, self.path)
+
+        self.assertIn("could not be indexed", "\n".join(logs.output))
+        self.assertTrue(ExtractedContent.objects.filter(pdf=self.pdf).exists())
+        indexed = dict(self.pdf.pages.values_list("page_number", "is_indexed"))
+        self.assertEqual(indexed, {1: True, 2: True, 3: False, 4: False, 5: True})
+
+    def test_resumed_ingest_only_redoes_pages_after_the_indexed_prefix(self):
+        with FakeEmbeddings():
+            ingest.ingest_pdf(self.pdf.id, self.path)
+        before = RAGService(self.pdf.id)
+        before._load_index(cached=False)
+
+        # a worker died after indexing pages 1-2
+        ExtractedContent.objects.filter(pdf=self.pdf).delete()
+        self.pdf.pages.filter(page_number__gt=2).update(is_indexed=False)
+
+        with FakeEmbeddings() as fake:
+            ingest.ingest_pdf(self.pdf.id, self.path, resume=True)
+
+        self.assertFalse(any("Alpha" in c or "Bravo" in c for c in fake.calls))
+        self.assertTrue(any("Charlie" in c for c in fake.calls))
+        after = RAGService(self.pdf.id)
+        after._load_index(cached=False)
+        self.assertEqual(
+            sorted(m["content"] for m in after.metadatas if m),
+            sorted(m["content"] for m in before.metadatas if m),
+        )
+        self.assertFalse(self.pdf.pages.filter(is_indexed=False).exists())
+
+    def test_resumed_ingest_still_drops_running_headers(self):
+        os.remove(self.path)
+        make_pdf(self.path, [f"Proceedings HEADER\n{page}" for page in PAGES])
+        with FakeEmbeddings():
+            ingest.ingest_pdf(self.pdf.id, self.path)
+        ExtractedContent.objects.filter(pdf=self.pdf).delete()
+        self.pdf.pages.filter(page_number__gt=2).update(is_indexed=False)
+
+        with FakeEmbeddings():
+            ingest.ingest_pdf(self.pdf.id, self.path, resume=True)
+
+        text = ExtractedContent.objects.get(pdf=self.pdf).text
+        self.assertNotIn("HEADER", text)
+        self.assertEqual(text, pdf_extractor.extract_pdf(self.path, doc_key="a" * 64)["text"])
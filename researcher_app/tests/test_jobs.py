@@ -0,0 +1,101 @@
+# researcher_app/tests/test_jobs.py
+
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from researcher_app.models import UploadedPDF, BackgroundJob
+from researcher_app.services import jobs
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_BACKOFF=30, JOB_STALE_AFTER=300)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+
+    def test_claims_oldest_runnable_job_once(self):
+        first  = jobs.enqueue("ingest", pdf=self.pdf)
+        later  = jobs.enqueue("ingest", pdf=self.pdf)
+        backoff = jobs.enqueue("corpus", pdf=self.pdf)
+        BackgroundJob.objects.filter(pk=backoff.pk).update(run_after=timezone.now() + timedelta(hours=1))
+
+        claimed = jobs.claim_next("w1")
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual((claimed.status, claimed.locked_by, claimed.attempts), ("running", "w1", 1))
+        self.assertEqual(jobs.claim_next("w2").pk, later.pk)
+        self.assertIsNone(jobs.claim_next("w3"))     # the corpus job is backing off
+
+    def test_success_records_status_and_stage_timings(self):
+        def handler(job, report):
+            report("extracting", pages_total=3)
+            report("finalizing")
+
+        jobs.enqueue("ingest", pdf=self.pdf)
+        with mock.patch.dict(jobs.HANDLERS, {"ingest": handler}):
+            self.assertTrue(jobs.run_job(jobs.claim_next("w")))
+
+        job = BackgroundJob.objects.get()
+        self.assertEqual((job.status, job.stage, job.error), ("succeeded", "done", ""))
+        self.assertEqual(job.progress, {"pages_total": 3})
+        self.assertIn("stage:extracting", job.timings)
+        self.assertIn("run", job.timings)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        handler = mock.Mock(side_effect=RuntimeError("extractor crashed"))
+        jobs.enqueue("ingest", pdf=self.pdf)
+
+        with mock.patch.dict(jobs.HANDLERS, {"ingest": handler}):
+            self.assertFalse(jobs.run_job(jobs.claim_next("w")))
+            job = BackgroundJob.objects.get()
+            self.assertEqual(job.status, "queued")
+            self.assertIn("extractor crashed", job.error)
+            self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=20))
+
+            BackgroundJob.objects.update(run_after=timezone.now())
+            self.assertFalse(jobs.run_job(jobs.claim_next("w")))
+
+        job = BackgroundJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertIsNone(jobs.claim_next("w"))
+
+    def test_stale_running_jobs_are_requeued_or_failed(self):
+        old = timezone.now() - timedelta(seconds=600)
+        retry = jobs.enqueue("ingest", pdf=self.pdf)
+        spent = jobs.enqueue("ingest", pdf=self.pdf)
+        alive = jobs.enqueue("ingest", pdf=self.pdf)
+        BackgroundJob.objects.filter(pk=retry.pk).update(status="running", attempts=1, heartbeat_at=old)
+        BackgroundJob.objects.filter(pk=spent.pk).update(status="running", attempts=2, heartbeat_at=old)
+        BackgroundJob.objects.filter(pk=alive.pk).update(status="running", attempts=1,
+                                                         heartbeat_at=timezone.now())
+
+        jobs.requeue_stale()
+
+        status = dict(BackgroundJob.objects.values_list("pk", "status"))
+        self.assertEqual(status, {retry.pk: "queued", spent.pk: "failed", alive.pk: "running"})
+
+    def test_later_ingest_attempts_resume(self):
+        job = jobs.enqueue("ingest", pdf=self.pdf)
+        with mock.patch.object(jobs.ingest, "ingest_pdf") as ingest_pdf:
+            BackgroundJob.objects.filter(pk=job.pk).update(attempts=2)
+            job.refresh_from_db()
+            jobs._run_ingest(job, lambda *a, **k: None)
+
+        self.assertTrue(ingest_pdf.call_args.kwargs["resume"])
+        self.assertEqual(
+            sorted(BackgroundJob.objects.filter(status="queued").values_list("kind", flat=True)),
+            ["corpus", "digest", "ingest"],
+        )
+
+    def test_burst_worker_drains_the_queue(self):
+        done = []
+        for _ in range(3):
+            jobs.enqueue("ingest", pdf=self.pdf)
+        with mock.patch.dict(jobs.HANDLERS, {"ingest": lambda job, report: done.append(job.pk)}):
+            jobs.work_loop("w", threading.Event(), poll_interval=0, burst=True)
+
+        self.assertEqual(len(done), 3)
+        self.assertFalse(BackgroundJob.objects.exclude(status="succeeded").exists())
@@ -0,0 +1,100 @@
+# researcher_app/tests/test_llm_providers.py
+
+import time
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from researcher_app.services import api_handler
+from researcher_app.services.api_handler import LLMError, StubProvider
+
+
+class CountingStub(StubProvider):
+    name = "counting"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.clients_made = 0
+
+    def _make_client(self):
+        self.clients_made += 1
+        return object()
+
+
+def _providers(**providers):
+    return mock.patch.dict(api_handler.PROVIDERS, providers, clear=True)
+
+
+class ProviderClientTests(SimpleTestCase):
+    def test_client_is_shared_within_a_process_and_rebuilt_after_fork(self):
+        provider = CountingStub()
+        first = provider._client()
+        self.assertIs(provider._client(), first)
+
+        with mock.patch.object(api_handler.os, "getpid", return_value=-1):
+            self.assertIsNot(provider._client(), first)
+        self.assertEqual(provider.clients_made, 2)
+
+    def test_client_is_usable_from_many_threads(self):
+        provider = CountingStub()
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(provider._client())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(provider.clients_made, 1)
+        self.assertEqual(len({id(c) for c in clients}), 1)
+
+    def test_missing_api_key_makes_the_provider_unavailable(self):
+        provider = CountingStub(api_key="")
+        self.assertFalse(provider.available)
+        with self.assertRaisesRegex(LLMError, "API key missing"):
+            provider._client()
+        self.assertEqual(provider.clients_made, 0)
+
+    def test_request_slots_bound_concurrency(self):
+        provider = StubProvider(max_concurrency=1)
+        provider.slots.acquire()
+        self.addCleanup(provider.slots.release)
+
+        with self.assertRaisesRegex(LLMError, "no free request slot"):
+            api_handler._call_with_retry(provider, "hi", "stub-1", {}, time.monotonic() + 0.05)
+        self.assertEqual(provider.calls, [])
+
+    def test_openai_content_carries_inline_images(self):
+        image = SimpleNamespace(inline_data=SimpleNamespace(data=b"\x89PNG", mime_type="image/png"))
+        content = api_handler._openai_content(["Describe:", image])
+        self.assertEqual(content[0], {"type": "text", "text": "Describe:"})
+        self.assertEqual(content[1]["image_url"]["url"], "data:image/png;base64,iVBORw==")
+        self.assertEqual(api_handler._openai_content("plain"), "plain")
+
+
+@override_settings(LLM_MAX_RETRIES=0)
+class CallLLMRoutingTests(SimpleTestCase):
+    def test_preferred_provider_answers(self):
+        stub, other = StubProvider(), CountingStub()
+        with _providers(stub=stub, counting=other):
+            text = api_handler.call_llm("hello", preferred="stub", temperature=0.2)
+
+        self.assertTrue(text.startswith("[stub:stub-1] 5 prompt chars"))
+        self.assertEqual(stub.calls[0]["params"], {"temperature": 0.2})
+        self.assertEqual(other.calls, [])
+
+    def test_unavailable_or_failing_provider_falls_back_once(self):
+        broken, backup = StubProvider(), CountingStub()
+        with _providers(stub=broken, counting=backup), \
+             mock.patch.object(broken, "generate", side_effect=LLMError("bad request")), \
+             self.assertLogs(api_handler.logger, "WARNING"):
+            api_handler.call_llm("hello", preferred="stub")
+        self.assertEqual(len(backup.calls), 1)
+
+        with _providers(stub=StubProvider(api_key=""), counting=CountingStub(api_key="")):
+            with self.assertRaisesRegex(LLMError, "API key missing"):
+                api_handler.call_llm("hello", preferred="stub")
+
+    def test_unknown_provider_is_rejected(self):
+        with self.assertRaises(ValueError):
+            api_handler.call_llm("hello", preferred="nope")
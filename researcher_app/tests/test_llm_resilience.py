@@ -0,0 +1,196 @@
+# researcher_app/tests/test_llm_resilience.py
+
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from researcher_app.services import api_handler, outline, writer
+from researcher_app.services.api_handler import CircuitBreaker, LLMError, StubProvider
+
+
+class APIStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class BackupStub(StubProvider):
+    name = "backup"
+
+
+def _providers(**providers):
+    return mock.patch.dict(api_handler.PROVIDERS, providers, clear=True)
+
+
+def _failing(provider, *errors):
+    """Make `provider` raise `errors` in turn, then answer normally."""
+    errors = list(errors)
+    real = provider.generate
+
+    def generate(*args, **kwargs):
+        if errors:
+            raise errors.pop(0)
+        return real(*args, **kwargs)
+    return mock.patch.object(provider, "generate", side_effect=generate)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures_and_lets_one_trial_through(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state(), "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state(), "open")
+
+        self.assertTrue(breaker.allow())             # cool-down over: the trial
+        self.assertFalse(breaker.allow())            # only one at a time
+        self.assertEqual(breaker.state(), "half-open")
+        breaker.record_failure()                     # failed trial re-opens at once
+        self.assertEqual(breaker.state(), "open")
+
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state(), breaker.failures), ("closed", 0))
+
+    def test_open_circuit_waits_for_the_cooldown(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=60)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_released_trial_can_be_retaken(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertEqual(breaker.state(), "open")
+        self.assertTrue(breaker.allow())
+
+
+@override_settings(LLM_MAX_RETRIES=2, LLM_RETRY_BACKOFF=0)
+class RetryTests(SimpleTestCase):
+    def setUp(self):
+        self.provider = StubProvider()
+
+    def _call(self, deadline=5):
+        return api_handler._call_with_retry(self.provider, "hi", "stub-1", {}, time.monotonic() + deadline)
+
+    def test_transient_errors_are_retried(self):
+        with _failing(self.provider, APIStatusError(503), ConnectionError("reset")):
+            self.assertTrue(self._call().startswith("[stub"))
+        self.assertEqual(self.provider.breaker.failures, 0)
+        self.assertEqual(len(self.provider._latencies), 1)
+
+    def test_exhausted_retries_count_toward_the_breaker(self):
+        with _failing(self.provider, *[APIStatusError(429)] * 3) as generate:
+            with self.assertRaises(APIStatusError):
+                self._call()
+        self.assertEqual(generate.call_count, 3)
+        self.assertEqual(self.provider.breaker.failures, 1)
+
+    def test_rejected_requests_are_not_retried_or_counted(self):
+        self.provider.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        self.provider.breaker.record_failure()
+        self.assertTrue(self.provider.breaker.allow())          # this call is the trial
+
+        with _failing(self.provider, APIStatusError(400)) as generate:
+            with self.assertRaises(APIStatusError):
+                self._call()
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(self.provider.breaker.failures, 1)
+        self.assertTrue(self.provider.breaker.allow())
+
+    def test_slot_timeout_does_not_wedge_a_half_open_breaker(self):
+        self.provider.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        self.provider.breaker.record_failure()
+        self.assertTrue(self.provider.breaker.allow())
+
+        with mock.patch.object(self.provider.slots, "acquire", return_value=False):
+            with self.assertRaisesRegex(LLMError, "no free request slot"):
+                self._call(deadline=0.01)
+        self.assertTrue(self.provider.breaker.allow())
+
+
+@override_settings(LLM_MAX_RETRIES=0)
+class CallLLMBoundsTests(SimpleTestCase):
+    def test_deadline_returns_while_a_request_is_in_flight(self):
+        slow = StubProvider()
+        real = slow.generate
+
+        def generate(*args, **kwargs):
+            time.sleep(0.5)
+            return real(*args, **kwargs)
+
+        started = time.monotonic()
+        with _providers(stub=slow), mock.patch.object(slow, "generate", side_effect=generate):
+            with self.assertRaisesRegex(LLMError, "deadline"):
+                api_handler.call_llm("hi", preferred="stub", deadline=0.1)
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_open_circuit_skips_the_provider(self):
+        down, backup = StubProvider(), BackupStub()
+        down.breaker = CircuitBreaker(threshold=1, cooldown=60)
+        down.breaker.record_failure()
+
+        with _providers(stub=down, backup=backup):
+            api_handler.call_llm("hi", preferred="stub")
+        self.assertEqual((len(down.calls), len(backup.calls)), (0, 1))
+
+        backup.breaker = down.breaker
+        with _providers(stub=down, backup=backup):
+            with self.assertRaisesRegex(LLMError, "circuit open"):
+                api_handler.call_llm("hi", preferred="stub")
+
+    def test_slow_request_is_hedged_to_the_other_provider(self):
+        slow, fast = StubProvider(), BackupStub()
+        for _ in range(20):
+            slow.record_latency(0.01)
+        real = slow.generate
+
+        def generate(*args, **kwargs):
+            time.sleep(0.5)
+            return real(*args, **kwargs)
+
+        with _providers(stub=slow, backup=fast), \
+             mock.patch.object(slow, "generate", side_effect=generate), \
+             self.assertLogs(api_handler.logger, "INFO") as logs:
+            text = api_handler.call_llm("hi", preferred="stub", hedge=True)
+
+        self.assertTrue(text.startswith("[stub:stub-1]"))
+        self.assertEqual((len(slow.calls), len(fast.calls)), (0, 1))     # the slow one is still running
+        self.assertIn("hedging", "\n".join(logs.output))
+
+
+class HedgeSettingTests(TestCase):
+    def test_prompt_builders_leave_hedging_to_the_setting(self):
+        slow, fast = StubProvider(), BackupStub()
+        for _ in range(20):
+            slow.record_latency(0.01)
+        real = slow.generate
+
+        def generate(*args, **kwargs):
+            time.sleep(0.2)
+            return real(*args, **kwargs)
+
+        with _providers(stub=slow, backup=fast), mock.patch.object(slow, "generate", side_effect=generate):
+            writer.draft_section({"title": "Intro", "description": "d"}, "ctx", preferred="stub")
+            outline.refine_outline({"sections": []}, "shorter", preferred="stub")
+            self.assertEqual(fast.calls, [])
+
+            with override_settings(LLM_HEDGE=True):
+                writer.draft_section({"title": "Intro", "description": "d"}, "ctx", preferred="stub", fresh=True)
+            self.assertEqual(len(fast.calls), 1)
+
+    def test_provider_health_is_served_with_the_cache_stats(self):
+        down = StubProvider()
+        down.breaker = CircuitBreaker(threshold=1, cooldown=60)
+        down.breaker.record_failure()
+        for _ in range(20):
+            down.record_latency(0.25)
+
+        with _providers(stub=down):
+            resp = APIClient().get(reverse("cache-stats"))
+        self.assertEqual(resp.json()["llm_providers"]["stub"],
+                         {"available": True, "circuit": "open", "failures": 1, "p95_s": 0.25})
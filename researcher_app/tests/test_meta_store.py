@@ -0,0 +1,90 @@
+# researcher_app/tests/test_meta_store.py
+
+import os
+import json
+import sqlite3
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+
+from researcher_app.models import UploadedPDF, ExtractedContent
+from researcher_app.services.meta_store import MetaStore
+from researcher_app.services.rag_service import RAGService
+from .helpers import TempMediaMixin, FakeEmbeddings
+
+METAS = [
+    {"type": "text", "content": "see Figure 2 for results", "page": 1, "refs": {"figure": [2]}},
+    None,
+    {"type": "table", "content": "Table p2: []", "page": 2, "url": "t.csv"},
+    {"type": "image", "page": 3, "path": "fig.png"},
+]
+
+
+class MetaStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "doc.faiss.meta.sqlite")
+
+    def _store(self, metas=METAS, info=None):
+        MetaStore.write(self.path, metas, info=info)
+        store = MetaStore(self.path)
+        self.addCleanup(store.close)
+        return store
+
+    def test_lookups_by_id_reference_and_field(self):
+        store = self._store(info={"content_version": 4})
+
+        self.assertEqual(store.get_many([3, 1, 0, 99]), [METAS[3], None, METAS[0], None])
+        self.assertEqual(store.ids_referencing("figure", 2), [0])
+        self.assertEqual(store.ids_referencing("table", 2), [])
+        self.assertEqual(store.ids_where("type", ["table", "image"]), [2, 3])
+        self.assertEqual(store.info()["content_version"], 4)
+        self.assertEqual(store.count(), 3)
+
+    def test_all_keeps_removed_ids_including_trailing_ones(self):
+        store = self._store(METAS + [None, None])
+        self.assertEqual(store.all(), METAS + [None, None])
+
+    def test_store_is_read_only_and_replaced_atomically(self):
+        store = self._store()
+        with self.assertRaises(sqlite3.OperationalError):
+            store._conn.execute("DELETE FROM meta")
+
+        MetaStore.write(self.path, METAS[:1])
+        self.assertEqual(store.count(), 3)            # an open reader keeps its snapshot
+        fresh = MetaStore(self.path)
+        self.addCleanup(fresh.close)
+        self.assertEqual(fresh.count(), 1)
+
+    def test_legacy_json_metadata_is_converted(self):
+        legacy = self.path.replace(".sqlite", "")
+        with open(legacy, "w") as f:
+            json.dump(METAS, f)
+        store = MetaStore.from_legacy_json(self.path, legacy)
+        self.addCleanup(store.close)
+        self.assertEqual(store.all(), METAS)
+
+
+class SharedIndexTests(TempMediaMixin, TestCase):
+    def test_reader_answers_from_the_sidecar_and_writer_keeps_the_id_space(self):
+        pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        ExtractedContent.objects.create(pdf=pdf, text="sparse attention " * 400)
+        with FakeEmbeddings():
+            writer = RAGService(pdf.id)
+            writer.build_index(persist=True)
+            total = len(writer.metadatas)
+            writer.remove([total - 1])
+            writer.save_index()
+
+            reader = RAGService(pdf.id)
+            hits = reader.retrieve("sparse attention", k=2)
+
+        self.assertIsNone(reader.metadatas)
+        self.assertIsNotNone(reader.meta_store)
+        self.assertTrue(hits)
+
+        reloaded = RAGService(pdf.id)
+        reloaded._load_index(cached=False)
+        self.assertEqual(len(reloaded.metadatas), total)
+        self.assertIsNone(reloaded.metadatas[-1])
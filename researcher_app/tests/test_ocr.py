@@ -0,0 +1,54 @@
+# researcher_app/tests/test_ocr.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import fitz                       # PyMuPDF
+from django.test import SimpleTestCase, override_settings
+
+from researcher_app.services import ocr
+from .helpers import TempMediaMixin, make_pdf
+
+
+class AdaptiveDpiTests(SimpleTestCase):
+    @override_settings(OCR_TARGET_PIXELS=8_500_000)
+    def test_dpi_follows_page_area_within_bounds(self):
+        letter = ocr.adaptive_dpi(fitz.Rect(0, 0, 612, 792))
+        self.assertTrue(250 <= letter <= 350, letter)
+        self.assertEqual(ocr.adaptive_dpi(fitz.Rect(0, 0, 2384, 3370)), ocr.MIN_DPI)   # A0 poster
+        self.assertEqual(ocr.adaptive_dpi(fitz.Rect(0, 0, 144, 144)), ocr.MAX_DPI)
+        self.assertEqual(ocr.adaptive_dpi(fitz.Rect(0, 0, 0, 0)), 300)
+
+
+class OcrPagesTests(TempMediaMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = make_pdf(os.path.join(self.media, "scan.pdf"), ["First scan", "", "Third scan"])
+        # one tesseract thread, so pages reach it in submission order
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        patcher = mock.patch.object(ocr, "_get_pool", return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_is_ocrd_once_then_served_from_cache(self):
+        with mock.patch.object(ocr, "_run_tesseract", side_effect=["one", "three"]) as tess:
+            self.assertEqual(ocr.ocr_pages(self.path, [1, 3]), {1: "one", 3: "three"})
+        self.assertEqual(tess.call_count, 2)
+
+        with mock.patch.object(ocr, "_run_tesseract") as tess:
+            self.assertEqual(ocr.ocr_pages(self.path, [1, 3]), {1: "one", 3: "three"})
+        tess.assert_not_called()
+
+    def test_failed_page_is_skipped_and_not_cached(self):
+        with mock.patch.object(ocr, "_run_tesseract", side_effect=[RuntimeError("boom"), "three"]):
+            with self.assertLogs(ocr.logger, "ERROR"):
+                self.assertEqual(ocr.ocr_pages(self.path, [1, 3]), {3: "three"})
+
+        with mock.patch.object(ocr, "_run_tesseract", return_value="one") as tess:
+            self.assertEqual(ocr.ocr_pages(self.path, [1, 3]), {1: "one", 3: "three"})
+        tess.assert_called_once()
+
+    def test_no_pages(self):
+        self.assertEqual(ocr.ocr_pages(self.path, []), {})
@@ -0,0 +1,75 @@
+# researcher_app/tests/test_pdf_extractor.py
+
+import os
+from concurrent.futures import Future
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from researcher_app.services import pdf_extractor
+from .helpers import TempMediaMixin, make_pdf
+
+PAGES = ["Alpha one", "Bravo two", "Charlie three", "Delta four", "Echo five"]
+
+
+class _DeadPool:
+    """
+    ProcessPoolExecutor stand-in whose workers always crash.
+    """
+    def __init__(self, max_workers=None, mp_context=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        fut = Future()
+        fut.set_exception(RuntimeError("worker died"))
+        return fut
+
+
+class ParallelExtractionTests(TempMediaMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = make_pdf(os.path.join(self.media, "doc.pdf"), PAGES)
+
+    def test_sharded_extraction_matches_in_process_order(self):
+        serial   = list(pdf_extractor.iter_pages(self.path, workers=1))
+        parallel = list(pdf_extractor.iter_pages(self.path, workers=2, pages_per_task=2))
+
+        self.assertEqual([p["page"] for p in parallel], [1, 2, 3, 4, 5])
+        self.assertEqual([p["text"] for p in parallel], [p["text"] for p in serial])
+        self.assertEqual([p["text"] for p in parallel], PAGES)
+
+    def test_start_page_skips_pages_already_handled(self):
+        pages = list(pdf_extractor.iter_pages(self.path, workers=1, pages_per_task=2, start_page=3))
+        self.assertEqual([p["page"] for p in pages], [4, 5])
+
+    def test_crashed_worker_range_is_retried_in_process(self):
+        with mock.patch.object(pdf_extractor, "ProcessPoolExecutor", _DeadPool):
+            pages = list(pdf_extractor.iter_pages(self.path, workers=2, pages_per_task=2))
+        self.assertEqual([p["text"] for p in pages], PAGES)
+
+    def test_extract_pdf_merges_pages_and_marks_empty_ones(self):
+        path = make_pdf(os.path.join(self.media, "blank.pdf"), ["Alpha one", "", "Charlie three"])
+        with mock.patch.object(pdf_extractor.ocr, "ocr_pages", return_value={}) as ocr_pages:
+            result = pdf_extractor.extract_pdf(path, workers=1)
+
+        ocr_pages.assert_called_once_with(path, [2])
+        self.assertEqual(result["text"], "Alpha one [Page 2: no text] Charlie three")
+        self.assertEqual(result["images"], [])
+        self.assertEqual(result["tables"], [])
+
+    def test_unreadable_input(self):
+        with self.assertRaises(ValueError):
+            pdf_extractor.extract_pdf(42)
+
+        junk = os.path.join(self.media, "junk.pdf")
+        with open(junk, "wb") as f:
+            f.write(b"not a pdf")
+        with self.assertLogs(pdf_extractor.logger, "ERROR"):
+            self.assertEqual(pdf_extractor.get_page_count(junk), 0)
+            self.assertEqual(list(pdf_extractor.iter_pages(junk)), [])
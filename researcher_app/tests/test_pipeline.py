@@ -0,0 +1,86 @@
+# researcher_app/tests/test_pipeline.py
+
+import os
+import time
+import threading
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from researcher_app.models import UploadedPDF, ExtractedContent
+from researcher_app.services import ingest, pdf_extractor, pipeline
+from .helpers import TempMediaMixin, FakeEmbeddings, make_pdf
+
+
+class PipelineStreamTests(SimpleTestCase):
+    def test_stages_run_in_order(self):
+        out = list(pipeline.stream(
+            range(20),
+            lambda it: (x * 2 for x in it),
+            lambda it: (f"#{x}" for x in it),
+            depth=2,
+        ))
+        self.assertEqual(out, [f"#{x * 2}" for x in range(20)])
+
+    def test_stage_error_is_raised_in_the_caller(self):
+        def explode(it):
+            for x in it:
+                if x == 3:
+                    raise ValueError("bad page 3")
+                yield x
+
+        seen = []
+        with self.assertRaisesRegex(ValueError, "bad page 3"):
+            for x in pipeline.stream(range(10), explode):
+                seen.append(x)
+        self.assertEqual(seen, [0, 1, 2])
+
+    def test_slow_consumer_bounds_the_producer(self):
+        produced = []
+
+        def source():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        out = pipeline.stream(source(), lambda it: (x for x in it), depth=1)
+        self.assertEqual(next(out), 0)
+        time.sleep(0.3)
+        # one item per queue plus one held by each thread, not the whole source
+        self.assertLess(len(produced), 8)
+        out.close()
+
+    def test_abandoned_stream_closes_the_source(self):
+        closed = threading.Event()
+
+        def source():
+            try:
+                for i in range(1000):
+                    yield i
+            finally:
+                closed.set()
+
+        out = pipeline.stream(source(), depth=1)
+        next(out)
+        out.close()
+        self.assertTrue(closed.wait(timeout=3))
+
+
+@override_settings(PDF_EXTRACT_WORKERS=1, INGEST_BATCH_PAGES=2, INGEST_QUEUE_DEPTH=1)
+class StreamedIngestTests(TempMediaMixin, TestCase):
+    def test_text_is_cleaned_like_extract_pdf(self):
+        path = make_pdf(os.path.join(self.media, "paper.pdf"), [
+            f"Journal of Stuff 2024 HEADER\n{body}\nPage footer" for body in (
+                "Alpha introduces sparse atten-\ntion", "Bravo describes the data",
+                "Charlie reports results", "Delta concludes",
+            )
+        ])
+        pdf = UploadedPDF.objects.create(file="uploads/paper.pdf", sha256="c" * 64)
+
+        with FakeEmbeddings() as fake:
+            ingest.ingest_pdf(pdf.id, path)
+
+        text = ExtractedContent.objects.get(pdf=pdf).text
+        self.assertEqual(text, pdf_extractor.extract_pdf(path, doc_key="c" * 64)["text"])
+        self.assertNotIn("HEADER", text)
+        self.assertIn("sparse attention", text)
+        self.assertIn("Alpha introduces sparse attention", "\n".join(fake.calls))     # chunks normalized
@@ -0,0 +1,80 @@
+# researcher_app/tests/test_prompt_parts.py
+
+import io
+import os
+from unittest import mock
+
+from PIL import Image
+from django.test import SimpleTestCase
+
+from researcher_app.services import prompt_parts
+from researcher_app.services.prompt_parts import PromptPartCache
+from .helpers import TempMediaMixin
+
+
+class PromptPartCacheTests(TempMediaMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = PromptPartCache(max_bytes=10**6, image_max_side=64)
+
+    def _csv(self, name="t.csv", rows=8):
+        path = os.path.join(self.media, name)
+        with open(path, "w") as f:
+            f.write("step,loss\n" + "".join(f"{i},{1 / (i + 1):.3f}\n" for i in range(rows)))
+        return path
+
+    def _image(self, name, size, mode="RGB", fmt="PNG"):
+        path = os.path.join(self.media, name)
+        Image.new(mode, size, "red").save(path, format=fmt)
+        return path
+
+    def test_table_part_is_prepared_once_and_reused(self):
+        path = self._csv()
+        md = self.cache.table(path)
+        self.assertIn("loss", md)
+        self.assertEqual(md.count("\n"), 6)                 # header, rule, first 5 rows
+        self.assertEqual(self.cache.table(path), md)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        # another process finds the prepared markdown on disk
+        with mock.patch.object(prompt_parts.pd, "read_csv", side_effect=AssertionError):
+            self.assertEqual(PromptPartCache(max_bytes=10**6).table(path), md)
+
+    def test_images_are_downscaled_with_their_real_type(self):
+        data, mime = self.cache.image(self._image("big.png", (256, 128)))
+        self.assertEqual(mime, "image/jpeg")
+        self.assertEqual(Image.open(io.BytesIO(data)).size, (64, 32))
+
+        data, mime = self.cache.image(self._image("alpha.png", (256, 128), mode="RGBA"))
+        self.assertEqual(mime, "image/png")
+
+        small = self._image("small.png", (16, 16))
+        data, mime = self.cache.image(small)
+        self.assertEqual(mime, "image/png")
+        with open(small, "rb") as f:
+            self.assertEqual(data, f.read())
+
+    def test_memory_is_bounded_least_recently_used_first(self):
+        cache = PromptPartCache(max_bytes=250)
+        a, b, c = (self._csv(f"{n}.csv") for n in "abc")
+        md = cache.table(a)
+        self.assertLess(len(md), 250)
+        self.assertGreater(len(md) * 2, 250)               # room for one table only
+
+        cache.table(b)
+        cache.table(a)
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], 250)
+        self.assertEqual(cache.misses, 3)
+
+    def test_warm_skips_unreadable_artifacts(self):
+        table = self._csv()
+        with self.assertLogs(prompt_parts.logger, "ERROR"):
+            self.cache.warm(
+                images=[{"path": os.path.join(self.media, "missing.png")}],
+                tables=[{"path": table}, {"url": "http://only-a-url"}],
+            )
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertTrue(os.path.exists(prompt_parts._derived_path(table, "md")))
+        with self.assertRaises(FileNotFoundError):
+            self.cache.table(os.path.join(self.media, "missing.csv"))
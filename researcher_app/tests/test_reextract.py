@@ -0,0 +1,94 @@
+# researcher_app/tests/test_reextract.py
+
+import os
+
+from django.test import TestCase, override_settings
+
+from researcher_app.models import UploadedPDF, ExtractedContent
+from researcher_app.services import ingest, pdf_extractor
+from researcher_app.services.embeddings import EmbeddingError
+from researcher_app.services.rag_service import RAGService
+from .helpers import TempMediaMixin, FakeEmbeddings, make_pdf
+
+PAGES = [
+    "Alpha introduces sparse attention",
+    "Bravo describes the training data",
+    "Charlie reports ablation results",
+]
+
+
+@override_settings(PDF_EXTRACT_WORKERS=1)
+class ReextractTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = make_pdf(os.path.join(self.media, "paper.pdf"), PAGES)
+        self.pdf  = UploadedPDF.objects.create(file="uploads/paper.pdf", sha256="b" * 64)
+        with FakeEmbeddings():
+            ingest.ingest_pdf(self.pdf.id, self.path)
+
+    def _rewrite(self, pages):
+        os.remove(self.path)
+        make_pdf(self.path, pages)
+
+    def _contents(self):
+        svc = RAGService(self.pdf.id)
+        svc._load_index(cached=False)
+        return [m["content"] for m in svc.metadatas if m]
+
+    def test_only_changed_chunks_are_embedded(self):
+        self._rewrite([PAGES[0], "Bravo describes a larger corpus", PAGES[2]])
+
+        with FakeEmbeddings() as fake:
+            content, stats = ingest.reextract_pdf(self.pdf.id, self.path)
+
+        self.assertEqual((stats["removed"], stats["added"]), (1, 1))
+        self.assertGreater(stats["kept"], 0)
+        self.assertTrue(fake.calls)
+        self.assertTrue(all("larger corpus" in c for c in fake.calls))
+        self.assertEqual(content.version, 2)
+        self.assertIn("larger corpus", content.text)
+
+        contents = "\n".join(self._contents())
+        self.assertIn("larger corpus", contents)
+        self.assertNotIn("training data", contents)
+
+    def test_content_text_matches_the_first_extraction(self):
+        self._rewrite([f"Running HEADER\n{page}" for page in PAGES])
+        with FakeEmbeddings():
+            ingest.ingest_pdf(self.pdf.id, self.path)
+        first = ExtractedContent.objects.get(pdf=self.pdf).text
+
+        with FakeEmbeddings():
+            content, _ = ingest.reextract_pdf(self.pdf.id, self.path)
+        self.assertEqual(content.text, first)
+        self.assertNotIn("HEADER", content.text)
+        self.assertEqual(content.text, pdf_extractor.extract_pdf(self.path, doc_key="b" * 64)["text"])
+
+    def test_unchanged_document_embeds_nothing(self):
+        with FakeEmbeddings() as fake:
+            _, stats = ingest.reextract_pdf(self.pdf.id, self.path)
+        self.assertEqual(fake.calls, [])
+        self.assertEqual((stats["removed"], stats["added"]), (0, 0))
+
+    def test_duplicate_uploads_follow_the_new_extraction(self):
+        dup = UploadedPDF.objects.create(file="uploads/copy.pdf", duplicate_of=self.pdf)
+        original = ExtractedContent.objects.get(pdf=self.pdf)
+        ExtractedContent.objects.create(pdf=dup, text=original.text, version=original.version)
+
+        self._rewrite([PAGES[0], PAGES[1], "Charlie reports new ablations"])
+        with FakeEmbeddings():
+            content, _ = ingest.reextract_pdf(self.pdf.id, self.path)
+
+        copy = ExtractedContent.objects.get(pdf=dup)
+        self.assertEqual((copy.text, copy.version), (content.text, content.version))
+
+    def test_failed_embedding_leaves_the_previous_version(self):
+        before = ExtractedContent.objects.get(pdf=self.pdf)
+        self._rewrite([PAGES[0], PAGES[1], "Charlie reports new ablations"])
+
+        with FakeEmbeddings(fail_on="new ablations"), self.assertRaises(EmbeddingError):
+            ingest.reextract_pdf(self.pdf.id, self.path)
+
+        after = ExtractedContent.objects.get(pdf=self.pdf)
+        self.assertEqual((after.text, after.version), (before.text, before.version))
+        self.assertIn("Charlie reports ablation results", "\n".join(self._contents()))
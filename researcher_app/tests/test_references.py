@@ -0,0 +1,104 @@
+# researcher_app/tests/test_references.py
+
+from unittest import mock
+
+import fitz                       # PyMuPDF
+from django.test import SimpleTestCase, TestCase
+
+from researcher_app.models import UploadedPDF, ExtractedContent
+from researcher_app.services import pdf_extractor, rag_service
+from researcher_app.services.index_cache import index_cache
+from researcher_app.services.rag_service import RAGService
+from .helpers import TempMediaMixin, FakeEmbeddings
+
+
+class CaptionTests(SimpleTestCase):
+    def _page(self, blocks):
+        doc = fitz.open()
+        self.addCleanup(doc.close)
+        page = doc.new_page()
+        for y, text in blocks:
+            page.insert_text((72, y), text)
+        return page
+
+    def test_captions_are_matched_to_the_nearest_artifact(self):
+        page = self._page([
+            (320, "Figure 2 shows the loss curve"),
+            (500, "Table 1: Hyper-parameters"),
+            (700, "Figure 4: A vector-drawn diagram"),
+        ])
+        images = [{"path": "fig.png", "bbox": [72, 100, 300, 300]}]
+        tables = [{"path": "t1.csv",  "bbox": [72, 510, 300, 600]}]
+
+        caps = pdf_extractor.find_captions(page, 3, images, tables)
+        by_key = {(c["kind"], c["number"]): c for c in caps}
+
+        self.assertEqual(by_key[("figure", 2)]["path"], "fig.png")
+        self.assertEqual(by_key[("table", 1)]["path"], "t1.csv")
+        self.assertEqual(by_key[("table", 1)]["caption"], "Table 1: Hyper-parameters")
+        self.assertIsNone(by_key[("figure", 4)]["path"])
+        self.assertEqual({c["page"] for c in caps}, {3})
+
+    def test_body_text_without_an_artifact_is_not_a_caption(self):
+        page = self._page([(320, "Figure 2 shows the loss curve")])
+        self.assertEqual(pdf_extractor.find_captions(page, 1, [], []), [])
+
+    def test_merge_prefers_the_first_caption_unless_a_later_one_has_an_artifact(self):
+        catalog = {}
+        pdf_extractor.merge_captions(catalog, [
+            {"kind": "figure", "number": 1, "caption": "Figure 1: first", "path": None},
+            {"kind": "table",  "number": 1, "caption": "Table 1: first",  "path": "a.csv"},
+        ])
+        pdf_extractor.merge_captions(catalog, [
+            {"kind": "figure", "number": 1, "caption": "Figure 1: second", "path": "f.png"},
+            {"kind": "table",  "number": 1, "caption": "Table 1: second",  "path": "b.csv"},
+        ])
+        self.assertEqual(catalog["figure"]["1"]["caption"], "Figure 1: second")
+        self.assertEqual(catalog["table"]["1"]["caption"], "Table 1: first")
+
+    def test_find_refs(self):
+        self.assertEqual(
+            pdf_extractor.find_refs("As Fig. 3 and Figures 1 show, Table 2 (see table 2) …"),
+            {"figure": [1, 3], "table": [2]},
+        )
+        self.assertEqual(pdf_extractor.find_refs("no references here"), {})
+
+
+class ReferenceRetrievalTests(TempMediaMixin, TestCase):
+    CATALOG = {"figure": {"2": {
+        "kind": "figure", "number": 2, "page": 4,
+        "caption": "Figure 2: Accuracy against depth", "path": "media/fig2.png",
+    }}}
+
+    def setUp(self):
+        super().setUp()
+        self.pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        ExtractedContent.objects.create(pdf=self.pdf, text="…", catalog=self.CATALOG)
+        with FakeEmbeddings():
+            self.writer = RAGService(self.pdf.id)
+            self.writer.catalog = self.CATALOG
+            self.writer.add_pages([
+                {"page": 3, "text": "accuracy grows with depth, as Figure 2 shows"},
+                {"page": 5, "text": "unrelated discussion of training cost"},
+            ], persist=True)
+        index_cache.invalidate(self.pdf.id)
+
+    def test_figure_questions_are_answered_from_the_catalog(self):
+        with mock.patch.object(rag_service, "embed_text_chunks") as embed:
+            hits = RAGService(self.pdf.id).retrieve("What does Figure 2 show?", k=3)
+        embed.assert_not_called()
+
+        self.assertEqual(hits[0], {"type": "text", "page": 4, "content": "Figure 2: Accuracy against depth"})
+        self.assertEqual(hits[1]["page"], 3)
+        self.assertEqual(hits[-1]["type"], "image")
+        self.assertEqual(hits[-1]["path"], "media/fig2.png")
+        self.assertEqual(len(hits), 3)
+
+        # a writer holding the metadata list answers the same way
+        self.assertEqual(self.writer._reference_hits("figure", 2, 3), hits)
+
+    def test_unknown_numbers_fall_back_to_search(self):
+        with FakeEmbeddings():
+            hits = RAGService(self.pdf.id).retrieve("Table 7 training cost", k=1)
+        self.assertEqual(len(hits), 1)
+        self.assertIn("score", hits[0])
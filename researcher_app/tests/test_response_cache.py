@@ -0,0 +1,92 @@
+# researcher_app/tests/test_response_cache.py
+
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from researcher_app.models import LLMResponseCacheEntry
+from researcher_app.services import api_handler
+from researcher_app.services.api_handler import ResponseCache, StubProvider
+
+
+class ResponseCacheTests(TestCase):
+    def test_memory_tier_then_database_tier(self):
+        cache = ResponseCache(ttl=60)
+        key = ResponseCache.key("stub", "stub-1", {}, "hello")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "stub", "stub-1", "hi there")
+        self.assertEqual(cache.get(key), "hi there")
+
+        other = ResponseCache(ttl=60)                 # another process: database only
+        self.assertEqual(other.get(key), "hi there")
+        self.assertEqual(other.get(key), "hi there")
+        self.assertEqual((other.db_hits, other.memory_hits), (1, 1))
+        self.assertEqual(LLMResponseCacheEntry.objects.get(key=key).hits, 1)
+
+    def test_expired_entries_are_not_served(self):
+        cache = ResponseCache(ttl=60)
+        key = ResponseCache.key("stub", "stub-1", {}, "hello")
+        cache.put(key, "stub", "stub-1", "answer")
+        LLMResponseCacheEntry.objects.filter(key=key).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(ResponseCache(ttl=60).get(key))
+
+        cache.put(key, "stub", "stub-1", "short-lived", ttl=0)
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(LLMResponseCacheEntry.objects.exists())       # purged on write
+
+    def test_key_covers_provider_model_params_and_prompt(self):
+        base = ResponseCache.key("gemini", "m", {"temperature": 0.2}, "p")
+        self.assertEqual(base, ResponseCache.key("gemini", "m", {"temperature": 0.2}, ["p"]))
+        for other in (
+            ResponseCache.key("openai", "m", {"temperature": 0.2}, "p"),
+            ResponseCache.key("gemini", "m2", {"temperature": 0.2}, "p"),
+            ResponseCache.key("gemini", "m", {"temperature": 0.7}, "p"),
+            ResponseCache.key("gemini", "m", {"temperature": 0.2}, "q"),
+        ):
+            self.assertNotEqual(base, other)
+
+    def test_both_tiers_are_bounded(self):
+        cache = ResponseCache(ttl=60, memory_entries=2, max_entries=3)
+        for n in range(5):
+            cache.put(f"k{n}", "stub", "stub-1", f"answer {n}")
+        self.assertEqual(list(cache._entries), ["k3", "k4"])
+        self.assertEqual(
+            sorted(LLMResponseCacheEntry.objects.values_list("key", flat=True)), ["k2", "k3", "k4"]
+        )
+
+
+class CallLLMCacheTests(TestCase):
+    def setUp(self):
+        self.stub = StubProvider()
+        for patcher in (
+            mock.patch.dict(api_handler.PROVIDERS, {"stub": self.stub}, clear=True),
+            mock.patch.object(api_handler, "response_cache", ResponseCache(ttl=60)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_identical_requests_are_answered_from_the_cache(self):
+        first = api_handler.call_llm("hello", preferred="stub", cache=True, temperature=0)
+        second = api_handler.call_llm("hello", preferred="stub", cache=True, temperature=0)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stub.calls), 1)
+
+        api_handler.call_llm("hello", preferred="stub", cache=True, temperature=0.5)
+        self.assertEqual(len(self.stub.calls), 2)
+
+    def test_fresh_skips_the_lookup_and_uncached_calls_store_nothing(self):
+        api_handler.call_llm("hello", preferred="stub", cache=True)
+        api_handler.call_llm("hello", preferred="stub", cache=True, fresh=True)
+        self.assertEqual(len(self.stub.calls), 2)
+
+        api_handler.call_llm("other", preferred="stub")
+        self.assertEqual(LLMResponseCacheEntry.objects.count(), 1)
+
+    def test_failed_calls_are_not_cached(self):
+        with mock.patch.object(self.stub, "generate", side_effect=api_handler.LLMError("down")), \
+             self.assertLogs(api_handler.logger, "WARNING"), \
+             self.assertRaises(api_handler.LLMError):
+            api_handler.call_llm("hello", preferred="stub", cache=True)
+        self.assertFalse(LLMResponseCacheEntry.objects.exists())
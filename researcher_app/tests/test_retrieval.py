@@ -0,0 +1,78 @@
+# researcher_app/tests/test_retrieval.py
+
+import time
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from researcher_app.models import UploadedPDF, ExtractedContent
+from researcher_app.services import rag_service
+from researcher_app.services.index_cache import index_cache
+from researcher_app.services.rag_service import RAGService
+from .helpers import TempMediaMixin, FakeEmbeddings, fake_vector
+
+PAGES = [
+    "zeolite catalysts speed up the cracking reaction",
+    "the reactor runs at a constant temperature",
+    "results are averaged over five random seeds",
+]
+
+
+class HybridRetrievalTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = UploadedPDF.objects.create(file="uploads/paper.pdf")
+        ExtractedContent.objects.create(pdf=self.pdf, text="\n".join(PAGES))
+        with FakeEmbeddings():
+            writer = RAGService(self.pdf.id)
+            writer.add_pages([{"page": n, "text": t} for n, t in enumerate(PAGES, 1)], persist=True)
+        index_cache.invalidate(self.pdf.id)
+
+        # every test starts with the embedding service considered up
+        patcher = mock.patch.object(rag_service, "_embed_down_until", 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _retrieve(self, query, k=3):
+        return RAGService(self.pdf.id).retrieve(query, k=k)
+
+    def test_lexical_and_vector_ranks_are_fused(self):
+        # the query vector lands exactly on page 2; its terms only match page 1
+        with mock.patch.object(rag_service, "embed_text_chunks", return_value=[fake_vector(PAGES[1])]):
+            hits = self._retrieve("zeolite", k=3)
+
+        # page 1 is first lexically and still on the vector list, so it beats page 2
+        self.assertEqual([h["page"] for h in hits], [1, 2, 3])
+        self.assertEqual(hits[1]["distance"], 0.0)
+        self.assertAlmostEqual(hits[1]["score"], 1 / (rag_service.RRF_K + 1), places=5)
+        self.assertGreater(hits[0]["score"], hits[1]["score"])
+
+    def test_a_hit_ranked_first_by_both_scores_highest(self):
+        with mock.patch.object(rag_service, "embed_text_chunks", return_value=[fake_vector(PAGES[0])]):
+            hits = self._retrieve("zeolite catalysts", k=3)
+
+        self.assertEqual(hits[0]["page"], 1)
+        self.assertAlmostEqual(hits[0]["score"], 2 / (rag_service.RRF_K + 1), places=5)
+
+    def test_embedding_failure_falls_back_to_lexical_and_cools_down(self):
+        with FakeEmbeddings(fail_on="seeds") as fake:
+            with self.assertLogs(rag_service.logger, "WARNING"):
+                hits = self._retrieve("random seeds")
+            self.assertEqual([(h["page"], h["distance"]) for h in hits], [(3, None)])
+
+            self._retrieve("reactor temperature")
+        self.assertNotIn("reactor temperature", fake.calls)      # skipped during the cool-down
+
+    @override_settings(RETRIEVE_EMBED_TIMEOUT=0.05)
+    def test_slow_embedding_does_not_block_retrieval(self):
+        def slow(texts, allow_partial=False):
+            time.sleep(0.5)
+            return [fake_vector(t) for t in texts]
+
+        started = time.monotonic()
+        with mock.patch.object(rag_service, "embed_text_chunks", side_effect=slow), \
+             self.assertLogs(rag_service.logger, "WARNING"):
+            hits = self._retrieve("reactor temperature")
+
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual([h["page"] for h in hits], [2])
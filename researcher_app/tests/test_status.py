@@ -0,0 +1,75 @@
+# researcher_app/tests/test_status.py
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from researcher_app.models import UploadedPDF, ExtractedContent, BackgroundJob
+from researcher_app.services import jobs
+
+
+class IngestStatusTests(TestCase):
+    def setUp(self):
+        self.pdf = UploadedPDF.objects.create(file="uploads/paper.pdf", page_count=10)
+
+    def _job(self, **fields):
+        return BackgroundJob.objects.create(kind="ingest", pdf=self.pdf, **fields)
+
+    def test_stage_and_percentage_follow_the_job(self):
+        self.assertEqual(jobs.ingest_status(self.pdf.id)["stage"], "pending")
+
+        job = self._job()
+        self.assertEqual(jobs.ingest_status(self.pdf.id)["stage"], "queued")
+
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status="running", stage="extracting",
+            progress={"pages_total": 10, "pages_extracted": 6, "pages_indexed": 5, "chunks_embedded": 40},
+        )
+        state = jobs.ingest_status(self.pdf.id)
+        self.assertEqual((state["stage"], state["progress"], state["ready"]), ("extracting", 45, False))
+        self.assertEqual((state["pages_extracted"], state["chunks_embedded"]), (6, 40))
+
+        BackgroundJob.objects.filter(pk=job.pk).update(stage="finalizing")
+        self.assertEqual(jobs.ingest_status(self.pdf.id)["progress"], 95)
+
+        ExtractedContent.objects.create(pdf=self.pdf, text="done")
+        state = jobs.ingest_status(self.pdf.id)
+        self.assertEqual((state["stage"], state["progress"], state["ready"]), ("ready", 100, True))
+        self.assertEqual(state["pages_indexed"], 10)
+
+    def test_failed_job_reports_the_last_error_line(self):
+        self._job(status="failed", attempts=3, error="Traceback …\nEmbeddingError: endpoint down\n")
+        state = jobs.ingest_status(self.pdf.id)
+        self.assertEqual((state["stage"], state["attempts"]), ("failed", 3))
+        self.assertEqual(state["error"], "EmbeddingError: endpoint down")
+
+    def test_endpoint_is_compact_and_404s_for_unknown_pdfs(self):
+        ExtractedContent.objects.create(pdf=self.pdf, text="x" * 10_000)
+        client = APIClient()
+
+        resp = client.get(reverse("parse-status", args=[self.pdf.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.data["ready"])
+        self.assertNotIn("text", resp.data)
+        self.assertLess(len(resp.content), 1000)
+
+        self.assertEqual(client.get(reverse("parse-status", args=[self.pdf.id + 1])).status_code, 404)
+        self.assertEqual(client.get(reverse("parse-status-events", args=[self.pdf.id + 1])).status_code, 404)
+
+    @override_settings(SSE_POLL_INTERVAL=0)
+    def test_event_stream_ends_with_ready(self):
+        ExtractedContent.objects.create(pdf=self.pdf, text="done")
+        resp = self.client.get(reverse("parse-status-events", args=[self.pdf.id]))
+
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        body = b"".join(resp.streaming_content).decode()
+        self.assertTrue(body.startswith("retry: 2000"))
+        self.assertIn("event: progress", body)
+        self.assertTrue(body.rstrip().split("\n\n")[-1].startswith("event: ready"))
+
+    @override_settings(SSE_POLL_INTERVAL=0)
+    def test_event_stream_ends_with_failed(self):
+        self._job(status="failed", error="boom")
+        resp = self.client.get(reverse("parse-status-events", args=[self.pdf.id]))
+        body = b"".join(resp.streaming_content).decode()
+        self.assertIn("event: failed", body)
@@ -0,0 +1,68 @@
+# researcher_app/tests/test_upload.py
+
+import hashlib
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from researcher_app.models import UploadedPDF, ExtractedContent, BackgroundJob
+from .helpers import TempMediaMixin
+
+PDF_BYTES = b"%PDF-1.4 same bytes every time"
+
+
+class UploadDedupTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def _upload(self, data=PDF_BYTES):
+        return self.client.post(
+            reverse("upload-pdf"),
+            {"file": SimpleUploadedFile("paper.pdf", data, content_type="application/pdf")},
+            format="multipart",
+        )
+
+    def test_first_upload_is_hashed_and_queued(self):
+        resp = self._upload()
+
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data["parse_status"], "pending")
+        pdf = UploadedPDF.objects.get(pk=resp.data["id"])
+        self.assertEqual(pdf.sha256, hashlib.sha256(PDF_BYTES).hexdigest())
+        self.assertIsNone(pdf.duplicate_of_id)
+        self.assertTrue(BackgroundJob.objects.filter(pk=resp.data["job_id"], kind="ingest", pdf=pdf).exists())
+
+    def test_identical_upload_reuses_the_original_extraction(self):
+        original = UploadedPDF.objects.get(pk=self._upload().data["id"])
+        ExtractedContent.objects.create(
+            pdf=original, text="paper text", catalog={"figure": {"1": {"page": 2}}}, version=3,
+        )
+
+        resp = self._upload()
+
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data["parse_status"], "ready")
+        self.assertEqual(resp.data["duplicate_of"], original.id)
+        dup = UploadedPDF.objects.get(pk=resp.data["id"])
+        self.assertEqual(dup.file.name, original.file.name)
+        self.assertEqual(dup.source_id, original.id)
+        copy = dup.content
+        self.assertEqual((copy.text, copy.catalog, copy.version),
+                         ("paper text", {"figure": {"1": {"page": 2}}}, 3))
+        self.assertEqual(BackgroundJob.objects.filter(kind="ingest").count(), 1)
+
+    def test_original_still_ingesting_is_not_reused(self):
+        self._upload()
+        resp = self._upload()
+
+        self.assertEqual(resp.data["parse_status"], "pending")
+        self.assertIsNone(UploadedPDF.objects.get(pk=resp.data["id"]).duplicate_of_id)
+        self.assertEqual(BackgroundJob.objects.filter(kind="ingest").count(), 2)
+
+    def test_missing_file(self):
+        resp = self.client.post(reverse("upload-pdf"), {}, format="multipart")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(UploadedPDF.objects.exists())
@@ -0,0 +1,29 @@
+# researcher_app/upload_handlers.py
+
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class SHA256UploadHandler(FileUploadHandler):
+    """
+    Pass-through upload handler that hashes each file while it streams in.
+    Install it first in request.upload_handlers; the regular memory/temp-file
+    handlers after it still build the UploadedFile.
+    """
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.digests = {}
+        self._hasher = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = self._hasher.hexdigest()
+        return None
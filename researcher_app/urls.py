@@ -4,7 +4,8 @@ from django.urls import path
 from .views import (
     UploadPDFView, ExtractPDFView, GenerateOutlineView,
     DraftSectionView, FormatBlogView, ChatWithPDFView,
-    NormalizationRuleView, MetaSectionView,
+    NormalizationRuleView, MetaSectionView, ParseStatusView,
+    CacheStatsView, CorpusSearchView, parse_status_events,
 )
 from django.conf import settings
 from django.conf.urls.static import static
@@ -13,14 +14,20 @@ urlpatterns = [
     # API endpoints (these are under /api/ in project urls.py)
     path('upload/', UploadPDFView.as_view(), name='upload-pdf'),
     path('extract/<int:pk>/', ExtractPDFView.as_view(), name='extract-pdf'),
+    path('status/<int:pk>/', ParseStatusView.as_view(), name='parse-status'),
+    path('status/<int:pk>/events/', parse_status_events, name='parse-status-events'),
     path('outline/<int:pk>/', GenerateOutlineView.as_view(), name='generate-outline'),
     path('write/<int:pk>/', DraftSectionView.as_view(), name='draft-section'),
     path('format/<int:pk>/', FormatBlogView.as_view(), name='format-blog'),
     path('meta/<int:pk>/', MetaSectionView.as_view(), name='meta-api'),
+    path('stats/caches/', CacheStatsView.as_view(), name='cache-stats'),
     
     # Chat-with-PDF endpoint (use pdf_id to match the view signature)
     path('chat/pdf/<int:pdf_id>/', ChatWithPDFView.as_view(), name='chat-with-pdf'),
     
+    # Search across all (or selected) uploaded PDFs
+    path('corpus/search/', CorpusSearchView.as_view(), name='corpus-search'),
+
     path('rules/', NormalizationRuleView.as_view(), name='normalization-rules'),
 ]
 
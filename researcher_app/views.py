@@ -13,67 +13,106 @@ from .serializers import (
     BlogOutlineSerializer, BlogDraftSerializer,
     ChatMessageSerializer, NormalizationRuleSerializer
 )
-from .services import pdf_extractor, outline, writer, formatter
+from .services import (
+    outline, writer, formatter, jobs, embeddings, corpus, ingest, api_handler, context_builder,
+    drafting, digest, context_cache,
+)
+from .services.index_cache import index_cache
+from .services.prompt_parts import cache as prompt_part_cache
 import tempfile
-import threading
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, FileResponse, Http404
+from django.http import HttpResponse, FileResponse, Http404, StreamingHttpResponse
+from django.db import close_old_connections
 from django import forms
 from researcher_app.services.rag_service import RAGService
-from .services.pdf_extractor import extract_pdf
+from .upload_handlers import SHA256UploadHandler
 from os.path import basename
 from django.urls import reverse
 from django.conf import settings
 import os
+import json
+import time
+import hashlib
 import mimetypes
 
 
 
-def parse_pdf_async(pdf_id, file_path):
-    try:
-        # 1) extract
-        result = extract_pdf(file_path)
-        pdf = UploadedPDF.objects.get(id=pdf_id)
-        ExtractedContent.objects.create(
-            pdf=pdf,
-            text=result["text"],
-            images=result["images"],
-            tables=result["tables"],
-        )
-        print("✅ Saved extracted content to DB")
+def _sha256_of(uploaded_file):
+    """
+    Fallback digest when the streaming hasher did not see the upload.
+    """
+    h = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        h.update(chunk)
+    uploaded_file.seek(0)
+    return h.hexdigest()
 
-        # 2) build & persist index once
-        svc = RAGService(pdf_id)
-        svc.build_index(persist=True)
-        print(f"✅ Built & cached FAISS index for PDF {pdf_id}")
-    except Exception as e:
-        print(f"❌ parse_pdf_async failed for PDF {pdf_id}: {e}")
+
+def _wants_fresh(request):
+    """
+    True when the client asks to regenerate (`fresh`) rather than reuse a
+    cached LLM response.
+    """
+    return str(request.data.get("fresh", "")).lower() in ("1", "true", "yes")
 
 
 class UploadPDFView(APIView):
     """
-    API to upload a PDF and parse in background.
+    API to upload a PDF and queue it for background ingestion.
     """
     parser_classes = [MultiPartParser, FormParser]
 
     def post(self, request, *args, **kwargs):
+        # hash the bytes as they stream in (must be installed before FILES is read)
+        hasher = SHA256UploadHandler(request)
+        request.upload_handlers.insert(0, hasher)
+
         uploaded_file = request.FILES.get('file')
         if not uploaded_file:
             return Response({"error": "No file provided."},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        digest = hasher.digests.get('file') or _sha256_of(uploaded_file)
+
+        # Identical bytes already extracted & indexed → reuse everything
+        original = (
+            UploadedPDF.objects
+            .filter(sha256=digest, duplicate_of__isnull=True, content__isnull=False)
+            .select_related('content')
+            .order_by('id')
+            .first()
+        )
+        if original:
+            pdf = UploadedPDF.objects.create(
+                file=original.file.name,
+                sha256=digest,
+                duplicate_of=original,
+            )
+            ExtractedContent.objects.create(
+                pdf=pdf,
+                text=original.content.text,
+                images=original.content.images,
+                tables=original.content.tables,
+                catalog=original.content.catalog,
+                version=original.content.version,
+            )
+            print(f"♻️ PDF {pdf.id} is a duplicate of PDF {original.id}; reusing extraction & index")
+            return Response({
+                "id": pdf.id,
+                "url": pdf.file.url,
+                "parse_status": "ready",
+                "duplicate_of": original.id,
+            }, status=status.HTTP_201_CREATED)
+
         serializer = UploadedPDFSerializer(data=request.data)
         if serializer.is_valid():
-            pdf = serializer.save()
-            threading.Thread(
-                target=parse_pdf_async,
-                args=(pdf.id, pdf.file.path),
-                daemon=True
-            ).start()
+            pdf = serializer.save(sha256=digest)
+            job = jobs.enqueue("ingest", pdf=pdf)
             return Response({
                 "id": pdf.id,
                 "url": pdf.file.url,
-                "parse_status": "pending"
+                "parse_status": "pending",
+                "job_id": job.id,
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -81,12 +120,21 @@ class UploadPDFView(APIView):
 class ExtractPDFView(APIView):
     """
     GET:  return existing extracted content.
-    POST: re-run extraction and update.
+    POST: re-run extraction, update it and diff-update the vector index.
     """
     def get(self, request, pk, *args, **kwargs):
         try:
             content_obj = ExtractedContent.objects.get(pdf__pk=pk)
         except ExtractedContent.DoesNotExist:
+            pdf = UploadedPDF.objects.filter(pk=pk).first()
+            if pdf and pdf.pages.exists():
+                # still ingesting: report how far along we are
+                return Response({
+                    "status": "processing",
+                    "page_count": pdf.page_count,
+                    "pages_extracted": pdf.pages.count(),
+                    "pages_indexed": pdf.pages.filter(is_indexed=True).count(),
+                }, status=status.HTTP_202_ACCEPTED)
             return Response(
                 {"error": "No extracted content found. Try POST to extract first."},
                 status=status.HTTP_404_NOT_FOUND
@@ -101,17 +149,94 @@ class ExtractPDFView(APIView):
             return Response({"error": "PDF not found."},
                             status=status.HTTP_404_NOT_FOUND)
 
-        result = pdf_extractor.extract_pdf(pdf.file.path)
-        content_obj, _ = ExtractedContent.objects.update_or_create(
-            pdf=pdf,
-            defaults={
-                "text": result['text'],
-                "images": result['images'],
-                "tables": result['tables']
-            }
-        )
-        serializer = ExtractedContentSerializer(content_obj)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if pdf.duplicate_of_id:
+            return Response({"error": "This upload reuses an earlier extraction; "
+                                      f"re-extract PDF {pdf.duplicate_of_id} instead."},
+                            status=status.HTTP_409_CONFLICT)
+
+        content_obj, reindex = ingest.reextract_pdf(pdf.id, pdf.file.path)
+        # the corpus copy and the digest of this document are replaced in the background
+        jobs.enqueue("corpus", pdf=pdf, replace=True)
+        jobs.enqueue("digest", pdf=pdf)
+
+        data = ExtractedContentSerializer(content_obj).data
+        data["reindex"] = reindex
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ParseStatusView(APIView):
+    """
+    GET: lightweight parse status (stage, percentage, counts) for polling clients.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        state = jobs.ingest_status(pk)
+        if state is None:
+            return Response({"error": "PDF not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(state, status=status.HTTP_200_OK)
+
+
+class CacheStatsView(APIView):
+    """
+    GET: hit/miss counters of the embedding and LLM response caches, the
+    provider-side context caches, and this worker's index and prompt-part caches,
+    plus each LLM provider's circuit state and p95 latency in this worker.
+    """
+    def get(self, request, *args, **kwargs):
+        return Response({
+            "embeddings":   embeddings.client.stats(),
+            "indexes":      index_cache.stats(),
+            "prompt_parts": prompt_part_cache.stats(),
+            "llm":          api_handler.response_cache.stats() if api_handler.response_cache else {},
+            "llm_context":  context_cache.manager.stats() if context_cache.manager else {},
+            "llm_providers": api_handler.stats(),
+        }, status=status.HTTP_200_OK)
+
+
+def parse_status_events(request, pk):
+    """
+    Server-sent events stream of parse progress. Emits a `progress` event on
+    every change (pages extracted, chunks embedded, …) and a final `ready` or
+    `failed` event. Streams are capped at SSE_MAX_DURATION seconds; browsers
+    reconnect automatically via EventSource.
+    """
+    if jobs.ingest_status(pk) is None:
+        raise Http404("PDF not found")
+
+    interval = getattr(settings, "SSE_POLL_INTERVAL", 1.0)
+    max_duration = getattr(settings, "SSE_MAX_DURATION", 60)
+
+    def _event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def _stream():
+        yield "retry: 2000\n\n"
+        last = None
+        last_sent = started = time.monotonic()
+        try:
+            while time.monotonic() - started < max_duration:
+                state = jobs.ingest_status(pk)
+                if state != last:
+                    last = state
+                    last_sent = time.monotonic()
+                    yield _event("progress", state)
+                    if state["ready"]:
+                        yield _event("ready", state)
+                        return
+                    if state["stage"] == "failed":
+                        yield _event("failed", state)
+                        return
+                elif time.monotonic() - last_sent > 15:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                time.sleep(interval)
+        finally:
+            close_old_connections()
+
+    response = StreamingHttpResponse(_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 class GenerateOutlineView(APIView):
@@ -123,9 +248,15 @@ class GenerateOutlineView(APIView):
         content = get_object_or_404(ExtractedContent, pdf=outline_obj.pdf)
         fb = request.data.get("feedback", None)
         if fb:
-            new_json = outline.refine_outline(outline_obj.outline_json, fb)
+            new_json = outline.refine_outline(outline_obj.outline_json, fb,
+                                              paper_digest=digest.text_for(outline_obj.pdf_id))
         else:
-            new_json = outline.generate_outline(content.text)
+            # long papers: the map-reduce digest instead of the raw text (or the
+            # whole text once, as a provider-side cached context)
+            paper = context_cache.for_pdf(
+                outline_obj.pdf_id, lambda: digest.text_for(outline_obj.pdf_id) or content.text
+            )
+            new_json = outline.generate_outline(paper, fresh=_wants_fresh(request))
 
         outline_obj.outline_json = new_json
         outline_obj.status = "finalized"
@@ -137,22 +268,27 @@ class GenerateOutlineView(APIView):
 class DraftSectionView(APIView):
     """
     API to draft or refine blog sections.
+
+    GET returns a section as the background draft job wrote it; a section
+    the job is still working on is waited for (DRAFT_WAIT_TIMEOUT), and one
+    that is still empty is drafted here. POST regenerates the section, or
+    refines it with `feedback`.
     """
-    def post(self, request, pk, *args, **kwargs):
-        outline_obj = get_object_or_404(BlogOutline, pk=pk)
-        draft_id = request.data.get("section_id")
-        if not draft_id:
-            return Response({"error": "`section_id` is required."},
-                            status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request, pk, *args, **kwargs):
+        outline_obj, draft_obj, sec_info, error = self._section(pk, request.query_params.get("section_id"))
+        if error:
+            return error
 
-        draft_obj = get_object_or_404(BlogDraft, pk=draft_id, outline=outline_obj)
-        context = get_object_or_404(ExtractedContent, pdf=outline_obj.pdf).text
-        sections = outline_obj.outline_json.get("sections", [])
-        try:
-            sec_info = sections[draft_obj.section_order]
-        except (IndexError, TypeError):
-            return Response({"error": "Invalid section_order on draft."},
-                            status=status.HTTP_400_BAD_REQUEST)
+        if not draft_obj.content:
+            new_body = drafting.wait_for(draft_obj) if drafting.active(outline_obj.id) else ""
+            draft_obj.content = new_body or self._draft(outline_obj, sec_info)
+            draft_obj.save()
+        return Response(BlogDraftSerializer(draft_obj).data, status=status.HTTP_200_OK)
+
+    def post(self, request, pk, *args, **kwargs):
+        outline_obj, draft_obj, sec_info, error = self._section(pk, request.data.get("section_id"))
+        if error:
+            return error
 
         raw_fb = request.data.get("feedback")
         feedback = (raw_fb or "").strip()
@@ -163,13 +299,39 @@ class DraftSectionView(APIView):
                 feedback
             )
         else:
-            new_body = writer.draft_section(sec_info, context)
+            new_body = self._draft(outline_obj, sec_info, fresh=_wants_fresh(request))
 
         draft_obj.content = new_body
         draft_obj.save()
         serializer = BlogDraftSerializer(draft_obj)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def _section(self, pk, draft_id):
+        """
+        (outline, draft, section info, error response) for a request.
+        """
+        outline_obj = get_object_or_404(BlogOutline, pk=pk)
+        if not draft_id:
+            return None, None, None, Response({"error": "`section_id` is required."},
+                                              status=status.HTTP_400_BAD_REQUEST)
+
+        draft_obj = get_object_or_404(BlogDraft, pk=draft_id, outline=outline_obj)
+        get_object_or_404(ExtractedContent.objects.only("id"), pdf=outline_obj.pdf)
+        sections = outline_obj.outline_json.get("sections", [])
+        try:
+            sec_info = sections[draft_obj.section_order]
+        except (IndexError, TypeError):
+            return None, None, None, Response({"error": "Invalid section_order on draft."},
+                                              status=status.HTTP_400_BAD_REQUEST)
+        return outline_obj, draft_obj, sec_info, None
+
+    def _draft(self, outline_obj, sec_info, fresh=False):
+        context = context_cache.for_pdf(
+            outline_obj.pdf_id,
+            lambda: context_builder.for_section(outline_obj.pdf_id, sec_info),
+        )
+        return writer.draft_section(sec_info, context, fresh=fresh)
+
 
 class FormatBlogView(APIView):
     """
@@ -202,13 +364,18 @@ class MetaSectionView(APIView):
     """
     def post(self, request, pk, *args, **kwargs):
         outline_obj = get_object_or_404(BlogOutline, pk=pk)
-        context = get_object_or_404(ExtractedContent, pdf=outline_obj.pdf).text
+        get_object_or_404(ExtractedContent.objects.only("id"), pdf=outline_obj.pdf)
+        context = context_cache.for_pdf(
+            outline_obj.pdf_id,
+            lambda: (digest.text_for(outline_obj.pdf_id)
+                     or context_builder.for_outline(outline_obj.pdf_id, outline_obj.outline_json)),
+        )
         raw_fb = request.data.get("feedback")
         fb = (raw_fb or "").strip()
         if fb:
             desc = writer.refine_description(outline_obj, fb, context)
         else:
-            desc = writer.generate_description(outline_obj, context)
+            desc = writer.generate_description(outline_obj, context, fresh=_wants_fresh(request))
         return Response({"description": desc}, status=status.HTTP_200_OK)
 
 
@@ -219,15 +386,61 @@ class ChatWithPDFView(APIView):
             return Response({"error": "No question provided."},
                             status=status.HTTP_400_BAD_REQUEST)
         try:
-            svc    = RAGService(pdf_id)
-            hits   = svc.retrieve(question, k=3)
+            svc      = RAGService(pdf_id)
+            coverage = svc.coverage()
+            hits     = svc.retrieve(question, k=3)
+            if not hits and not coverage["complete"]:
+                return Response({
+                    "answer": "⏳ This PDF is still being indexed. Please try again in a few seconds.",
+                    "hits": [],
+                    "coverage": coverage,
+                })
             answer = svc.ask_gemini(hits, question)
-            return Response({"answer": answer, "hits": hits})
+            return Response({"answer": answer, "hits": hits, "coverage": coverage})
         except Exception as e:
             print(f"❌ Chat error for PDF {pdf_id}: {e}")
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class CorpusSearchView(APIView):
+    """
+    POST: semantic search across all ingested PDFs, or only `pdf_ids`.
+    Body: {"query": str, "k": int (default 5), "pdf_ids": [int, …] (optional)}
+    """
+    def post(self, request, *args, **kwargs):
+        query = (request.data.get("query") or "").strip()
+        if not query:
+            return Response({"error": "No query provided."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            k = max(1, min(int(request.data.get("k", 5)), 50))
+            pdf_ids = request.data.get("pdf_ids")
+            if pdf_ids is not None:
+                # duplicate uploads are indexed under their original
+                pdf_ids = sorted({
+                    dup or pk for pk, dup in UploadedPDF.objects
+                    .filter(id__in=[int(p) for p in pdf_ids])
+                    .values_list("id", "duplicate_of_id")
+                })
+        except (TypeError, ValueError):
+            return Response({"error": "k and pdf_ids must be integers."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            hits = corpus.search(query, k=k, pdf_ids=pdf_ids)
+        except Exception as e:
+            return Response({"error": str(e)},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        names = dict(
+            (pk, basename(f)) for pk, f in UploadedPDF.objects
+            .filter(id__in={h["pdf_id"] for h in hits}).values_list("id", "file")
+        )
+        for h in hits:
+            h["filename"] = names.get(h["pdf_id"])
+        return Response({"results": hits}, status=status.HTTP_200_OK)
+
+
 class NormalizationRuleView(APIView):
     """
     API to list and add normalization rules.
@@ -280,9 +493,12 @@ def outline_refine(request, outline_id):
                     section_title=sec["title"],
                     content=""
                 )
+            # all sections are drafted in the background, in section order
+            jobs.enqueue("draft", pdf=outline_obj.pdf, outline_id=outline_obj.id)
             return redirect("section_write", outline_id=outline_obj.id)
         updated_outline = outline.refine_outline(
-            outline_obj.outline_json, feedback_text
+            outline_obj.outline_json, feedback_text,
+            paper_digest=digest.text_for(outline_obj.pdf_id)
         )
         outline_obj.outline_json = updated_outline
         outline_obj.save()
@@ -303,8 +519,6 @@ def section_write(request, outline_id):
     if not draft:
         return redirect("blog_meta", outline_id=outline_id)
 
-    full_text = get_object_or_404(ExtractedContent, pdf=outline_obj.pdf).text
-
     if request.method == "POST":
         fb = request.POST.get("feedback", "").strip()
         if fb.lower() in ("ok", "looks good", "no changes"):
@@ -317,11 +531,8 @@ def section_write(request, outline_id):
             draft.save()
         return redirect("section_write", outline_id=outline_id)
 
-    if not draft.content:
-        sec_info = outline_obj.outline_json["sections"][draft.section_order]
-        draft.content = writer.draft_section(sec_info, full_text)
-        draft.save()
-
+    # the page renders at once; the section's content (drafted by the
+    # background job, or on demand) is fetched from DraftSectionView
     feedbacks = outline_obj.feedbacks.filter(section_order=draft.section_order)
     return render(request, "blog/section_write.html", {
         "draft": draft,